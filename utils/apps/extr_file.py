@@ -1,28 +1,99 @@
 #!/usr/bin/env seiscomp-python
 
-from __future__ import print_function
+from __future__ import absolute_import, division, print_function
+
 import sys
+from getopt import gnu_getopt, GetoptError
+
 from seiscomp import mseedlite as mseed
+from seiscomp.mseedsds import SDSWriter, demultiplex
+
+
+# ------------------------------------------------------------------------------
+def usage():
+    print(
+        """Usage:
+  extr_file [options] file [file ...]
+
+Demultiplex miniSEED files into an SDS archive.
+
+Every record is appended to the day file of its stream and begin time,
+YEAR/NET/STA/CHA.D/NET.STA.LOC.CHA.D.YEAR.DOY below the output directory.
+With more than one job, the input files are demultiplexed in parallel and
+records of a day file coming from several input files are sorted by time.
+
+Options:
+  -h, --help            Display this help message
+  -j, --jobs            Number of worker processes (default: 1, 0 for the
+                        number of CPUs)
+  -o, --output          SDS root directory (default: current directory)
+  -n, --max-open        Maximum number of open files (default: 256)
+  -b, --buffer          Write buffer per file in kB (default: 64)
+
+Examples:
+Unpack a multiplexed request file into the SDS archive 'sds'
+  extr_file -o sds request.mseed
+
+Unpack a month of telemetry files using all CPUs
+  extr_file -j 0 -o sds 2024/01/*.mseed
+"""
+    )
+
+
+# ------------------------------------------------------------------------------
+def main():
+    root = "."
+    max_open = 256
+    bufsize = 1 << 16
+    jobs = 1
+
+    try:
+        opts, args = gnu_getopt(
+            sys.argv[1:],
+            "hj:o:n:b:",
+            ["help", "jobs=", "output=", "max-open=", "buffer="],
+        )
+    except GetoptError:
+        usage()
+        return 1
+
+    for flag, arg in opts:
+        if flag in ("-j", "--jobs"):
+            jobs = int(arg)
+        elif flag in ("-o", "--output"):
+            root = arg
+        elif flag in ("-n", "--max-open"):
+            max_open = int(arg)
+        elif flag in ("-b", "--buffer"):
+            bufsize = int(float(arg) * 1024)
+        else:
+            usage()
+            if flag in ("-h", "--help"):
+                return 0
+            return 1
 
-open_files = {}
+    if not args:
+        usage()
+        return 1
 
-if len(sys.argv) != 2:
-    print("Usage: extr_file FILE")
-    sys.exit(1)
+    try:
+        if jobs != 1 and len(args) > 1:
+            demultiplex(args, root, jobs or None, max_open, bufsize)
 
-for rec in mseed.Input(open(sys.argv[1], "rb")):
-    oname = "%s.%s.%s.%s" % (rec.sta, rec.net, rec.loc, rec.cha)
-    
-    if oname not in open_files:
-        postfix = ".D.%04d.%03d.%02d%02d" % (rec.begin_time.year,
-            rec.begin_time.timetuple()[7], rec.begin_time.hour,
-            rec.begin_time.minute)
+        else:
+            with SDSWriter(root, max_open, bufsize) as writer:
+                for path in args:
+                    with mseed.MappedInput(path) as inp:
+                        for rec in inp:
+                            writer.write(rec)
 
-        open_files[oname] = open(oname + postfix, "ab")
+    except (IOError, mseed.MSeedError) as e:
+        print(f"extr_file: {e}", file=sys.stderr)
+        return 1
 
-    ofile = open_files[oname]
-    ofile.write(rec.header + rec.data)
+    return 0
 
-for oname in open_files:
-    open_files[oname].close()
 
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env seiscomp-python
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+from getopt import gnu_getopt, GetoptError
+
+from seiscomp import mseedlite as mseed
+from seiscomp.mseedreblock import Reblocker
+
+
+# ------------------------------------------------------------------------------
+def rec_len_exp(rec):
+    """Exponent of the smallest record length holding rec."""
+    if rec.format == 2:
+        size = rec.size
+    else:
+        size = 64 + len(rec.payload)
+
+    return max(7, (size - 1).bit_length())
+
+
+# ------------------------------------------------------------------------------
+def usage():
+    print(
+        """Usage:
+  msreblock [options] file [file ...]
+
+Combine contiguous miniSEED records into maximally filled records.
+
+The records of every stream must be sorted by time, e.g. using 'mssort'.
+Streams may be multiplexed. By default the Steim frames of contiguous
+records are concatenated without decoding. Records which cannot be combined
+are written unchanged.
+
+Options:
+  -h, --help            Display this help message
+  -v, --verbose         Print record counts
+  -o, --output          Output file (default: standard output)
+  -r, --reclen          Output record length in bytes (default: 4096)
+      --repack          Decode and compress the samples again, filling all
+                        frames (requires NumPy)
+
+Examples:
+Combine 512-byte records into 4096-byte records
+  msreblock -o out.mseed data.mseed
+
+Repack an archive file into fully filled 512-byte records
+  msreblock -r 512 --repack data.mseed > out.mseed
+"""
+    )
+
+
+# ------------------------------------------------------------------------------
+def main():
+    verbosity = 0
+    output = None
+    reclen = 4096
+    repack = False
+
+    try:
+        opts, args = gnu_getopt(
+            sys.argv[1:], "hvo:r:", ["help", "verbose", "output=", "reclen=", "repack"]
+        )
+    except GetoptError:
+        usage()
+        return 1
+
+    for flag, arg in opts:
+        if flag in ("-v", "--verbose"):
+            verbosity += 1
+        elif flag in ("-o", "--output"):
+            output = arg
+        elif flag in ("-r", "--reclen"):
+            reclen = int(arg)
+        elif flag == "--repack":
+            repack = True
+        else:
+            usage()
+            if flag in ("-h", "--help"):
+                return 0
+            return 1
+
+    if not args:
+        usage()
+        return 1
+
+    try:
+        reblocker = Reblocker(reclen, repack)
+        if output is None:
+            out = sys.stdout.buffer
+        else:
+            out = open(output, "wb")
+
+        with mseed.RecordWriter(out) as writer:
+            for path in args:
+                with mseed.MappedInput(path) as inp:
+                    for rec in inp:
+                        for orec in reblocker.feed(rec):
+                            writer.write(orec, rec_len_exp(orec))
+
+            for orec in reblocker.flush():
+                writer.write(orec, rec_len_exp(orec))
+
+        if output is not None:
+            out.close()
+
+    except (IOError, ImportError, mseed.MSeedError) as e:
+        print(f"msreblock: {e}", file=sys.stderr)
+        return 1
+
+    if verbosity:
+        print(
+            f"{reblocker.records_in} records read, "
+            f"{reblocker.records_out} records written",
+            file=sys.stderr,
+        )
+
+    return 0
+
+
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,14 +4,21 @@ from __future__ import absolute_import, division, print_function
 
 import sys
 import os
+import asyncio
+import collections
+import concurrent.futures
+import heapq
+import itertools
+import threading
 import time
 import datetime
-import calendar
 import math
 import stat
 
 from getopt import gnu_getopt, GetoptError
 from seiscomp import mseedlite as mseed
+from seiscomp.mseedsds import sds_streams
+from seiscomp.slserver import SeedLinkServer
 
 
 # ------------------------------------------------------------------------------
@@ -33,31 +40,205 @@ def read_mseed_with_delays(delaydict, reciterable):
 
     This function will rearrange the iterable object which has been used as
     input for rt_simul() so that it can again be used by rt_simul but taking
-    artificial delays into account.
+    artificial delays into account. It yields tuples of the delayed end time
+    in nanoseconds and the record.
     """
-    import heapq  # pylint: disable=C0415
-
     heap = []
+    seq = 0
     min_delay = 0
-    default_delay = 0
-    if "default" in delaydict:
-        default_delay = delaydict["default"]
+    default_delay = int(delaydict.get("default", 0) * 1000000000)
+    delays_ns = {}
     for rec in reciterable:
-        rec_time = calendar.timegm(rec.end_time.timetuple())
-        delay_time = rec_time
+        rec_time = rec.end_ns
         stationname = f"{rec.net}.{rec.sta}"
-        if stationname in delaydict:
-            delay_time = rec_time + delaydict[stationname]
-        else:
-            delay_time = rec_time + default_delay
-        heapq.heappush(heap, (delay_time, rec))
+        delay = delays_ns.get(stationname)
+        if delay is None:
+            if stationname in delaydict:
+                delay = int(delaydict[stationname] * 1000000000)
+            else:
+                delay = default_delay
+            delays_ns[stationname] = delay
+
+        # the sequence number keeps the order of records with equal times
+        heapq.heappush(heap, (rec_time + delay, seq, rec))
+        seq += 1
         toprectime = heap[0][0]
         if toprectime - min_delay < rec_time:
-            topelement = heapq.heappop(heap)
-            yield topelement
+            (delay_time, _, rec) = heapq.heappop(heap)
+            yield (delay_time, rec)
     while heap:
-        topelement = heapq.heappop(heap)
-        yield topelement
+        (delay_time, _, rec) = heapq.heappop(heap)
+        yield (delay_time, rec)
+
+
+# ------------------------------------------------------------------------------
+class DriftStats(object):
+    """
+    Lateness of sent records relative to their scheduled deadlines.
+
+    Negative values mean that a record was sent early, because it was due
+    within the same tick as the first record of its batch.
+    """
+
+    label = "lateness"
+
+    def __init__(self):
+        self.records = 0
+        self.batches = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = None
+
+    def add(self, lateness_ns, count=1):
+        self.records += count
+        self.total_ns += lateness_ns * count
+        if self.min_ns is None or lateness_ns < self.min_ns:
+            self.min_ns = lateness_ns
+        if self.max_ns is None or lateness_ns > self.max_ns:
+            self.max_ns = lateness_ns
+
+    @property
+    def mean_ns(self):
+        return self.total_ns // self.records if self.records else 0
+
+    def __str__(self):
+        if not self.records:
+            return "no records sent"
+
+        return (
+            f"{self.records} records in {self.batches} batches, {self.label} "
+            f"mean {self.mean_ns / 1e6:.3f} ms, min {self.min_ns / 1e6:.3f} ms, "
+            f"max {self.max_ns / 1e6:.3f} ms"
+        )
+
+
+# ------------------------------------------------------------------------------
+def release_times(recs, delaydict=None, single_stream=False):
+    """
+    Iterate over tuples of the release time in nanoseconds and the record.
+
+    The release time is the end time of a record plus the artificial delay of
+    its station. The records of a single stream keep their order when
+    delayed, so they are shifted without buffering; multiplexed records are
+    reordered using read_mseed_with_delays.
+    """
+    if not delaydict:
+        return ((rec.end_ns, rec) for rec in recs)
+
+    if not single_stream:
+        return read_mseed_with_delays(delaydict, recs)
+
+    return _shifted(recs, delaydict)
+
+
+def _shifted(recs, delaydict):
+    default_delay = delaydict.get("default", 0)
+    delay = None
+    for rec in recs:
+        if delay is None:
+            delay = int(
+                delaydict.get(f"{rec.net}.{rec.sta}", default_delay) * 1000000000
+            )
+
+        yield (rec.end_ns + delay, rec)
+
+
+# ------------------------------------------------------------------------------
+def stream_records(paths, select=None):
+    """
+    Iterate lazily over the records of consecutive files of one stream
+
+    Only one file is mapped at a time.
+    """
+    for path in paths:
+        inp = mseed.MappedInput(path, lazy=True, select=select)
+        try:
+            for rec in inp:
+                yield rec
+        finally:
+            inp.close()
+
+
+# ------------------------------------------------------------------------------
+def merge_sources(sources):
+    """
+    Merge iterators over (release time, record) tuples by release time
+
+    Only the next record of every source is kept in memory.
+    """
+    if len(sources) == 1:
+        return sources[0]
+
+    return heapq.merge(*sources, key=lambda item: item[0])
+
+
+# ------------------------------------------------------------------------------
+def schedule(items, speed=1.0, jump=0.0, tick=0.01, stats=None):
+    """
+    Iterator over batches of records in "real-time"
+
+    items are tuples of the release time in nanoseconds and the record,
+    sorted by release time. Every record is due when its release time,
+    relative to the first record, has passed on the monotonic clock scaled
+    by speed. Deadlines are integer nanoseconds, so that no precision is lost
+    at high speed or sampling rates. All records due within tick seconds
+    after waking up are returned as one list. The lateness of every record is
+    added to stats, if given.
+    """
+    items = iter(items)
+    jump_ns = int(jump * 60000000000)
+    tick_ns = int(tick * 1000000000)
+    etime = None
+    for (rec_time, rec) in items:
+        if etime is None:
+            etime = rec_time
+
+        if rec_time - etime >= jump_ns:
+            break
+    else:
+        return
+
+    etime = rec_time
+    rtime = time.monotonic_ns()
+    pending = (rec_time, rec)
+    while pending is not None:
+        deadline = rtime + int((pending[0] - etime) / speed)
+        now = time.monotonic_ns()
+        if deadline > now:
+            time.sleep((deadline - now) / 1000000000)
+            now = time.monotonic_ns()
+
+        horizon = now + tick_ns
+        batch = []
+        while deadline <= horizon:
+            batch.append(pending[1])
+            if stats is not None:
+                stats.add(now - deadline)
+
+            pending = next(items, None)
+            if pending is None:
+                break
+
+            deadline = rtime + int((pending[0] - etime) / speed)
+
+        if stats is not None:
+            stats.batches += 1
+
+        yield batch
+
+
+# ------------------------------------------------------------------------------
+def rt_batches(f, speed=1.0, jump=0.0, delaydict=None, tick=0.01, stats=None):
+    """
+    Iterator over batches of records of a file or record iterable in
+    "real-time", see schedule()
+    """
+    if hasattr(f, "read"):
+        record_iterable = mseed.Input(f)
+    else:
+        record_iterable = f
+
+    return schedule(release_times(record_iterable, delaydict), speed, jump, tick, stats)
 
 
 # ------------------------------------------------------------------------------
@@ -71,74 +252,412 @@ def rt_simul(f, speed=1.0, jump=0.0, delaydict=None):
     demonstrating real-time processing using real data of past events.
 
     The data in the input file may be multiplexed, but *must* be sorted by
-    time, e.g. using 'mssort'.
+    time, e.g. using 'mssort'. Instead of a file, any iterable of records may
+    be passed, e.g. several inputs merged with mseedlite.merge_inputs.
     """
-    rtime = time.time()
-    etime = None
-    skipping = True
-    record_iterable = mseed.Input(f)
-    if delaydict:
-        record_iterable = read_mseed_with_delays(delaydict, record_iterable)
-    for rec in record_iterable:
-        if delaydict:
-            rec_time = rec[0]
-            rec = rec[1]
+    for batch in rt_batches(f, speed, jump, delaydict):
+        for rec in batch:
+            yield rec
+
+
+# ------------------------------------------------------------------------------
+def write_record(writer, rec):
+    """
+    Add a record to a RecordWriter
+
+    miniSEED 2 records are copied from their raw bytes with only the time
+    fields patched, instead of being serialized again.
+    """
+    if rec.format == 2:
+        writer.write_raw(rec)
+    else:
+        writer.write(rec, int(math.log2(rec.size)))
+
+
+# ------------------------------------------------------------------------------
+class OutputStats(DriftStats):
+    """
+    Lag of an output: time from the release of a batch until it is written
+    """
+
+    label = "lag"
+
+    def __init__(self, name):
+        DriftStats.__init__(self)
+        self.name = name
+        self.dropped = 0
+        self.max_queued = 0
+        self.error = None
+
+    def __str__(self):
+        text = (
+            f"{self.name}: {DriftStats.__str__(self)}, {self.dropped} records "
+            f"dropped, up to {self.max_queued} batches queued"
+        )
+        if self.error is not None:
+            text += f", failed: {self.error}"
+
+        return text
+
+
+# ------------------------------------------------------------------------------
+class FileOutput(object):
+    """
+    Write batches of records to a file or pipe, flushing after every batch
+
+    Writing may block, so it is done by a thread of its own.
+    """
+
+    def __init__(self, fd, name):
+        self.fd = fd
+        self.name = name
+        self.writer = mseed.RecordWriter(fd)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def start(self):
+        pass
+
+    async def send(self, recs):
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.write, recs
+        )
+
+    def write(self, recs):
+        for rec in recs:
+            write_record(self.writer, rec)
+
+        self.writer.flush()
+        self.fd.flush()
+
+    def finish(self):
+        self.writer.flush()
+        self.fd.flush()
+
+        # standard output stays open for the messages at exit
+        if self.fd not in (sys.stdout, getattr(sys.stdout, "buffer", None)):
+            self.fd.close()
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.finish)
+        self.executor.shutdown()
+
+
+# ------------------------------------------------------------------------------
+class SeedLinkOutput(object):
+    """
+    Serve batches of records to SeedLink clients
+    """
+
+    def __init__(self, port, host=None):
+        self.name = f"seedlink:{port}"
+        self.server = SeedLinkServer(host, port)
+
+    async def start(self):
+        await self.server.start()
+        self.name = f"seedlink:{self.server.port}"
+
+    async def send(self, recs):
+        self.server.publish(recs)
+
+    async def close(self):
+        await self.server.close()
+
+
+# ------------------------------------------------------------------------------
+class FanOut(object):
+    """
+    Deliver batches of records to several outputs concurrently
+
+    Every output has a writer task in an event loop running in a background
+    thread, fed by a queue of at most maxsize batches, so that a slow output
+    does not delay the others. When the queue of an output is full, the batch
+    is dropped for that output if policy is "drop"; with "block" the playback
+    waits for the output. The lag of every output is collected in stats.
+    """
+
+    def __init__(self, outputs, maxsize=100, policy="block"):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"invalid queue policy '{policy}'")
+
+        self.outputs = outputs
+        self.policy = policy
+        self.stats = None
+        self.loop = asyncio.new_event_loop()
+        self.queues = None
+        self.tasks = None
+        try:
+            self.loop.run_until_complete(self.__start(maxsize))
+        except Exception:
+            self.loop.close()
+            raise
+
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    async def __start(self, maxsize):
+        for output in self.outputs:
+            await output.start()
+
+        self.stats = [OutputStats(output.name) for output in self.outputs]
+        self.queues = [asyncio.Queue(maxsize) for _ in self.outputs]
+        self.tasks = [
+            asyncio.ensure_future(self.__run(output, queue, stats))
+            for (output, queue, stats) in zip(self.outputs, self.queues, self.stats)
+        ]
+
+    def write(self, recs):
+        """Queue a batch for all outputs; called from the playback thread."""
+        released = time.monotonic_ns()
+        if self.policy == "drop":
+            self.loop.call_soon_threadsafe(self.__offer, recs, released)
         else:
-            rec_time = calendar.timegm(rec.end_time.timetuple())
-        if etime is None:
-            etime = rec_time
+            asyncio.run_coroutine_threadsafe(
+                self.__put(recs, released), self.loop
+            ).result()
 
-        if skipping:
-            if (rec_time - etime) / 60.0 < jump:
+    def __offer(self, recs, released):
+        for (queue, stats) in zip(self.queues, self.stats):
+            try:
+                queue.put_nowait((recs, released))
+                stats.max_queued = max(stats.max_queued, queue.qsize())
+            except asyncio.QueueFull:
+                stats.dropped += len(recs)
+
+    async def __put(self, recs, released):
+        for (queue, stats) in zip(self.queues, self.stats):
+            await queue.put((recs, released))
+            stats.max_queued = max(stats.max_queued, queue.qsize())
+
+    async def __run(self, output, queue, stats):
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+
+            if stats.error is not None:
                 continue
 
-            etime = rec_time
-            skipping = False
+            (recs, released) = item
+            try:
+                await output.send(recs)
+            except Exception as e:
+                # keep draining the queue, so that the others are not blocked
+                stats.error = e
+                print(f"output {output.name} failed: {e}", file=sys.stderr)
+                continue
+
+            stats.add(time.monotonic_ns() - released, len(recs))
+            stats.batches += 1
+
+        try:
+            await output.close()
+        except Exception as e:
+            stats.error = e
+
+    async def __close(self):
+        for queue in self.queues:
+            await queue.put(None)
+
+        await asyncio.gather(*self.tasks)
+
+    def close(self):
+        """Write the queued batches and close all outputs."""
+        asyncio.run_coroutine_threadsafe(self.__close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+# ------------------------------------------------------------------------------
+class NullSink(object):
+    """
+    File-like object discarding all data written
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+
+    def flush(self):
+        pass
+
+
+# ------------------------------------------------------------------------------
+class BenchmarkStats(object):
+    """
+    Throughput of a benchmark run with the time spent in every stage
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.samples = 0
+        self.bytes = 0
+        self.stages = collections.OrderedDict(
+            (stage, 0) for stage in ("read", "shift", "write")
+        )
+
+    def __str__(self):
+        total = sum(self.stages.values()) / 1e9 or 1e-9
+        lines = [
+            f"{self.records} records, {self.samples} samples, "
+            f"{self.bytes / 1e6:.3f} MB in {total:.3f} s",
+            f"{self.records / total:.0f} records/s, "
+            f"{self.samples / total:.0f} samples/s, "
+            f"{self.bytes / 1e6 / total:.3f} MB/s",
+        ]
+        for (stage, ns) in self.stages.items():
+            lines.append(
+                f"  {stage: <6} {ns / 1e9: 8.3f} s {100.0 * ns / 1e9 / total: 6.1f} %"
+            )
+
+        return "\n".join(lines)
+
+
+# ------------------------------------------------------------------------------
+def benchmark(items, mode="realtime", ulimited=False, chunk=1000):
+    """
+    Replay records as fast as possible through the playback path
+
+    items are tuples of the release time and the record as for schedule().
+    Records are read in chunks, shifted to the current time in realtime
+    mode and written to a NullSink; the time of every stage is measured per
+    chunk. Returns a BenchmarkStats.
+    """
+    stats = BenchmarkStats()
+    sink = NullSink()
+    writer = mseed.RecordWriter(sink)
+    items = iter(items)
+    time_diff = None
+    clock = time.perf_counter_ns
+    while True:
+        t0 = clock()
+        batch = [
+            rec
+            for (_, rec) in itertools.islice(items, chunk)
+            if rec.size == 512 or ulimited
+        ]
+        t1 = clock()
+        if not batch:
+            stats.stages["read"] += t1 - t0
+            break
+
+        if mode == "realtime":
+            if time_diff is None:
+                time_diff = time.time_ns() - batch[0].end_ns
+
+            for rec in batch:
+                rec.begin_ns += time_diff
+
+        t2 = clock()
+        for rec in batch:
+            write_record(writer, rec)
+
+        writer.flush()
+        t3 = clock()
 
-        tmax = etime + speed * (time.time() - rtime)
-        ms = 1000000.0 * (rec.nsamp / rec.fsamp)
-        last_sample_time = rec.begin_time + datetime.timedelta(microseconds=ms)
-        last_sample_time = calendar.timegm(last_sample_time.timetuple())
-        if last_sample_time > tmax:
-            time.sleep((last_sample_time - tmax + 0.001) / speed)
-        yield rec
+        stats.stages["read"] += t1 - t0
+        stats.stages["shift"] += t2 - t1
+        stats.stages["write"] += t3 - t2
+        stats.records += len(batch)
+        stats.samples += sum(rec.nsamp for rec in batch)
+
+    stats.bytes = sink.bytes
+    return stats
+
+
+# ------------------------------------------------------------------------------
+def parse_time(value):
+    """Convert an ISO time string in UTC to nanoseconds since the epoch."""
+    t = datetime.datetime.fromisoformat(value.rstrip("Z"))
+    if t.tzinfo is not None:
+        t = t.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    return (
+        (t - datetime.datetime(1970, 1, 1)) // datetime.timedelta(microseconds=1) * 1000
+    )
 
 
 # ------------------------------------------------------------------------------
 def usage():
     print(
         """Usage:
-  msrtsimul [options] file
+  msrtsimul [options] file|directory [file|directory ...]
 
 miniSEED real-time playback and simulation
 
 msrtsimul reads sorted (and possibly multiplexed) miniSEED files and writes
-individual records in pseudo-real-time. This is useful e.g. for testing and
+individual records in pseudo-real-time. Several files, each sorted by time,
+are merged on the fly. A directory is read as SDS archive, with one reader
+per stream. This is useful e.g. for testing and
 simulating data acquisition. Output is
-$SEISCOMP_ROOT/var/run/seedlink/mseedfifo unless --seedlink or -c is used.
+$SEISCOMP_ROOT/var/run/seedlink/mseedfifo unless other outputs are chosen.
+Several outputs are written concurrently, each with a queue of its own.
 
 Verbosity:
   -h, --help            Display this help message
-  -v, --verbose         Verbose mode
+  -v, --verbose         Verbose mode. The timing accuracy of the playback is
+                        printed at the end.
 
 Playback:
   -j, --jump            Minutes to skip (float).
-  -c, --stdout          Write on standard output.
   -d, --delays          Seconds to add as artificial delays.
-      --seedlink        Choose the seedlink module name. Useful if a seedlink
-                        alias or non-standard names are used. Replaces
-                        'seedlink' in the standard mseedfifo path.
   -m  --mode            Choose between 'realtime' and 'historic'.
   -s, --speed           Speed factor (float).
+      --tick            Send all records due within this time in one batch
+                        (milliseconds, default: 10).
       --test            Test mode.
+      --benchmark       Play back the records as fast as possible to a null
+                        output and report the throughput.
   -u, --unlimited       Allow miniSEED records which are not 512 bytes
 
+Output:
+  -c, --stdout          Write on standard output.
+  -o, --output          Write to a file. May be repeated.
+  -p, --port            Serve the records to SeedLink clients on this TCP
+                        port. May be repeated.
+      --fifo            Write to the mseedfifo, also together with other
+                        outputs.
+      --seedlink        Choose the seedlink module name. Useful if a seedlink
+                        alias or non-standard names are used. Replaces
+                        'seedlink' in the standard mseedfifo path.
+      --queue           Maximum number of batches queued per output
+                        (default: 100).
+      --policy          What to do with a batch if the queue of an output is
+                        full: 'block' waits for the output (default), 'drop'
+                        drops the batch for this output.
+
+Selection:
+      --start           Start time of the records to play back, e.g.
+                        2024-01-01T12:00:00 (UTC).
+      --end             End time of the records to play back.
+      --streams         Comma-separated list of streams NET.STA.LOC.CHA to
+                        play back. Wildcards are supported.
+
 Examples:
 Play back miniSEED waveforms in real time with verbose output
   msrtsimul -v data.mseed
 
 Play back miniSEED waveforms in real time skipping the first 1.5 minutes
   msrtsimul -j 1.5 data.mseed
+
+Play back several sorted miniSEED files merged by time
+  msrtsimul -v station1.mseed station2.mseed
+
+Serve the records of a file to SeedLink clients on port 18001
+  msrtsimul -p 18001 data.mseed
+
+Feed seedlink, keep a copy of the played back records in a file and drop
+records for SeedLink clients on port 18001 which cannot keep up
+  msrtsimul --fifo -o copy.mseed -p 18001 --policy drop data.mseed
+
+Measure the throughput of the playback of a file
+  msrtsimul --benchmark data.mseed
+
+Play back one hour of the GE network from an SDS archive
+  msrtsimul --start 2024-01-01T12:00 --end 2024-01-01T13:00 --streams "GE.*" \
+    $SEISCOMP_ROOT/var/lib/archive
 """
     )
 
@@ -151,38 +670,66 @@ def main():
     verbosity = 0
     speed = 1.0
     jump = 0.0
+    tick = 0.01
     test = False
+    bench = False
     ulimited = False
     seedlink = "seedlink"
     mode = "realtime"
+    start_ns = None
+    end_ns = None
+    streams = None
 
     try:
         opts, args = gnu_getopt(
             sys.argv[1:],
-            "cd:s:j:vhm:u",
+            "cd:s:j:vhm:up:o:",
             [
                 "stdout",
                 "delays=",
                 "speed=",
                 "jump=",
                 "test",
+                "benchmark",
                 "verbose",
                 "help",
                 "mode=",
                 "seedlink=",
-                "unlimited"
+                "unlimited",
+                "tick=",
+                "start=",
+                "end=",
+                "streams=",
+                "port=",
+                "output=",
+                "fifo",
+                "queue=",
+                "policy=",
             ],
         )
     except GetoptError:
         usage()
         return 1
 
-    out_channel = None
+    outputs = []
+    fifo = False
+    maxqueued = 100
+    policy = "block"
     delays = None
 
     for flag, arg in opts:
         if flag in ("-c", "--stdout"):
-            out_channel = sys.stdout if py2 else sys.stdout.buffer
+            outputs.append(("stdout", None))
+        elif flag in ("-o", "--output"):
+            outputs.append(("file", arg))
+        elif flag in ("-p", "--port"):
+            outputs.append(("seedlink", int(arg)))
+        elif flag == "--fifo":
+            fifo = True
+        elif flag == "--queue":
+            maxqueued = int(arg)
+        elif flag == "--policy":
+            policy = arg
         elif flag in ("-d", "--delays"):
             delays = arg
         elif flag in ("-s", "--speed"):
@@ -195,6 +742,22 @@ def main():
             seedlink = arg
         elif flag in ("-v", "--verbose"):
             verbosity += 1
+        elif flag == "--tick":
+            tick = float(arg) / 1000.0
+        elif flag in ("--start", "--end"):
+            try:
+                if flag == "--start":
+                    start_ns = parse_time(arg)
+                else:
+                    end_ns = parse_time(arg)
+            except ValueError:
+                print(f"invalid time for {flag}: '{arg}'", file=sys.stderr)
+                usage()
+                return 1
+        elif flag == "--streams":
+            streams = arg.split(",")
+        elif flag == "--benchmark":
+            bench = True
         elif flag == "--test":
             test = True
         elif flag in ("-u", "--unlimited"):
@@ -205,21 +768,60 @@ def main():
                 return 0
             return 1
 
-    if len(args) == 1:
-        if args[0] != "-":
-            try:
-                ifile = open(args[0], "rb")
-            except IOError as e:
-                print(
-                    f"could not open input file '{args[0]}' for reading: {e}",
-                    file=sys.stderr,
-                )
-                sys.exit(1)
-    elif len(args) != 0:
-        usage()
+    delaydict = None
+    if delays:
+        delaydict = {}
+        try:
+            f = open(delays, "r")
+            for line in f:
+                content = line.split(":")
+                if len(content) != 2:
+                    raise ValueError(
+                        f"Could not parse a line in file {delays}: {line}\n"
+                    )
+                delaydict[content[0].strip()] = float(content[1].strip())
+        except Exception as e:
+            print(f"Error reading delay file {delays}: {e}", file=sys.stderr)
+
+    select = None
+    if start_ns is not None or end_ns is not None or streams is not None:
+        select = mseed.RecordFilter(streams, start_ns, end_ns)
+
+    sources = []
+    for arg in args or ["-"]:
+        try:
+            if arg == "-":
+                recs = mseed.Input(ifile, select=select)
+                sources.append(release_times(recs, delaydict))
+            elif os.path.isdir(arg):
+                for paths in sds_streams(arg, start_ns, end_ns, streams).values():
+                    recs = stream_records(paths, select)
+                    sources.append(release_times(recs, delaydict, True))
+            elif os.path.isfile(arg):
+                recs = mseed.MappedInput(arg, lazy=True, select=select)
+                sources.append(release_times(recs, delaydict))
+            else:
+                recs = mseed.Input(open(arg, "rb"), select=select)
+                sources.append(release_times(recs, delaydict))
+        except IOError as e:
+            print(
+                f"could not open input '{arg}' for reading: {e}",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+
+    if not sources:
+        print("no data found", file=sys.stderr)
         return 1
 
-    if out_channel is None:
+    if bench:
+        try:
+            print(benchmark(merge_sources(sources), mode, ulimited))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if fifo or not outputs:
         try:
             sc_root = os.environ["SEISCOMP_ROOT"]
         except KeyError:
@@ -251,75 +853,87 @@ Check if SeedLink is running and configured for real-time playback.
             )
             sys.exit(1)
 
+        outputs.insert(0, ("file", mseed_fifo))
+
+    targets = []
+    for (kind, arg) in outputs:
         try:
-            out_channel = open(mseed_fifo, "wb")
+            if kind == "stdout":
+                fd = sys.stdout if py2 else sys.stdout.buffer
+                targets.append(FileOutput(fd, kind))
+            elif kind == "seedlink":
+                targets.append(SeedLinkOutput(arg))
+            else:
+                targets.append(FileOutput(open(arg, "wb"), arg))
         except Exception as e:
             print(str(e), file=sys.stderr)
             sys.exit(1)
 
     try:
-        delaydict = None
-        if delays:
-            delaydict = {}
-            try:
-                f = open(delays, "r")
-                for line in f:
-                    content = line.split(":")
-                    if len(content) != 2:
-                        raise ValueError(
-                            f"Could not parse a line in file {delays}: {line}\n"
-                        )
-                    delaydict[content[0].strip()] = float(content[1].strip())
-            except Exception as e:
-                print(f"Error reading delay file {delays}: {e}", file=sys.stderr)
+        output = FanOut(targets, maxqueued, policy)
+    except (OSError, ValueError) as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    if verbosity:
+        for target in targets:
+            if isinstance(target, SeedLinkOutput):
+                print(f"serving SeedLink on port {target.server.port}", file=sys.stderr)
 
-        inp = rt_simul(ifile, speed=speed, jump=jump, delaydict=delaydict)
-        stime = time.time()
+    stats = DriftStats()
+    try:
+        batches = schedule(
+            merge_sources(sources), speed=speed, jump=jump, tick=tick, stats=stats
+        )
+        stime = time.monotonic_ns()
 
         time_diff = None
         print(
             f"Starting msrtsimul at {datetime.datetime.utcnow()}",
             file=sys.stderr,
         )
-        for rec in inp:
-            if rec.size != 512 and not ulimited:
-                print(
-                    f"Skipping record of {rec.net}.{rec.sta}.{rec.loc}.{rec.cha} \
+        for batch in batches:
+            out = []
+            for rec in batch:
+                if rec.size != 512 and not ulimited:
+                    print(
+                        f"Skipping record of {rec.net}.{rec.sta}.{rec.loc}.{rec.cha} \
 starting on {str(rec.begin_time)}: length != 512 Bytes.",
-                    file=sys.stderr,
-                )
-                continue
-            if time_diff is None:
-                ms = 1000000.0 * (rec.nsamp / rec.fsamp)
-                time_diff = (
-                    datetime.datetime.utcnow()
-                    - rec.begin_time
-                    - datetime.timedelta(microseconds=ms)
-                )
-            if mode == "realtime":
-                rec.begin_time += time_diff
-
-            if verbosity:
-                tdiff_to_start = time.time() - stime
-                tdiff_to_current = time.time() - calendar.timegm(
-                    rec.begin_time.timetuple()
-                )
-                nslc = f"{rec.net}.{rec.sta}.{rec.loc}.{rec.cha}"
-                print(
-                    f"{nslc: <17} \
+                        file=sys.stderr,
+                    )
+                    continue
+                if time_diff is None:
+                    time_diff = time.time_ns() - rec.end_ns
+                if mode == "realtime":
+                    rec.begin_ns += time_diff
+
+                if verbosity:
+                    tdiff_to_start = (time.monotonic_ns() - stime) / 1e9
+                    tdiff_to_current = (time.time_ns() - rec.begin_ns) / 1e9
+                    nslc = f"{rec.net}.{rec.sta}.{rec.loc}.{rec.cha}"
+                    print(
+                        f"{nslc: <17} \
 {tdiff_to_start: 7.2f} {str(rec.begin_time)} {tdiff_to_current: 7.2f}",
-                    file=sys.stderr,
-                )
+                        file=sys.stderr,
+                    )
+
+                out.append(rec)
 
-            if not test:
-                rec.write(out_channel, int(math.log2(rec.size)))
-                out_channel.flush()
+            if out and not test:
+                output.write(out)
 
     except KeyboardInterrupt:
         pass
     except Exception as e:
         print(f"Exception: {str(e)}", file=sys.stderr)
         return 1
+    finally:
+        output.close()
+
+    if verbosity:
+        print(f"Timing: {stats}", file=sys.stderr)
+        for output_stats in output.stats:
+            print(f"Output {output_stats}", file=sys.stderr)
 
     return 0
 
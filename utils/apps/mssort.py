@@ -0,0 +1,245 @@
+#!/usr/bin/env seiscomp-python
+
+from __future__ import absolute_import, division, print_function
+
+import heapq
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from getopt import gnu_getopt, GetoptError
+
+from seiscomp import mseedlite as mseed
+
+
+# ------------------------------------------------------------------------------
+def key_by_stream(rec):
+    """Sort key ordering records by stream and begin time."""
+    return (rec.net, rec.sta, rec.loc, rec.cha, rec.begin_ns, rec.end_ns)
+
+
+def key_by_time(rec):
+    """Sort key ordering records by end time, e.g. for msrtsimul."""
+    return (rec.end_ns, rec.net, rec.sta, rec.loc, rec.cha, rec.begin_ns)
+
+
+KEYS = {"stream": key_by_stream, "time": key_by_time}
+
+
+# ------------------------------------------------------------------------------
+def split_runs(paths, run_size):
+    """
+    Split the input files into runs of at most run_size bytes.
+
+    Only the record headers are scanned. Returns a list of (path, offsets)
+    tuples, where offsets is an array of record offsets in the file.
+    """
+    runs = []
+    for path in paths:
+        with mseed.MappedInput(path, lazy=True) as inp:
+            offsets = inp.offsets()
+            start = 0
+            first = 0
+            for (i, offset) in enumerate(offsets):
+                if offset - start >= run_size and i > first:
+                    runs.append((path, offsets[first:i]))
+                    first = i
+                    start = offset
+
+            if first < len(offsets):
+                runs.append((path, offsets[first:]))
+
+    return runs
+
+
+def _run_entry(buf, offset, keyfunc):
+    """Sort key, offset and size of the record at offset."""
+    rec = mseed.Record(buf, offset, lazy=True)
+    return (keyfunc(rec), offset, rec.size)
+
+
+def sort_run(path, offsets, key, tmpdir):
+    """
+    Sort the records at the given offsets of a file and spill them to a
+    temporary run file. Only (key, offset, size) tuples are kept in memory
+    and records are copied as raw bytes, so records with equal keys keep
+    their order. Returns the path of the run file.
+    """
+    keyfunc = KEYS[key]
+    with open(path, "rb") as fd:
+        buf = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        entries = sorted(_run_entry(buf, offset, keyfunc) for offset in offsets)
+
+        (fdout, runpath) = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+        with os.fdopen(fdout, "wb", buffering=1 << 20) as out:
+            for (_, offset, size) in entries:
+                out.write(buf[offset : offset + size])
+
+    finally:
+        try:
+            buf.close()
+        except BufferError:
+            # still referenced by the traceback of a failed record
+            pass
+
+    return runpath
+
+
+def merge_runs(runpaths, key, out):
+    """Merge sorted run files into the open file out."""
+    keyfunc = KEYS[key]
+    inputs = [mseed.MappedInput(p, lazy=True) for p in runpaths]
+    try:
+        for rec in heapq.merge(*inputs, key=keyfunc):
+            out.write(rec.raw)
+
+    finally:
+        for inp in inputs:
+            inp.close()
+
+
+def merge_to_run(runpaths, key, tmpdir):
+    """Merge sorted run files into a new run file and remove them."""
+    (fdout, runpath) = tempfile.mkstemp(suffix=".run", dir=tmpdir)
+    with os.fdopen(fdout, "wb", buffering=1 << 20) as out:
+        merge_runs(runpaths, key, out)
+
+    for p in runpaths:
+        os.remove(p)
+
+    return runpath
+
+
+def mssort(
+    paths, out, key="stream", run_size=256 << 20, fanin=64, workers=None, tmpdir=None
+):
+    """
+    Sort the records of the input files into out using an external merge
+    sort. Runs are sorted in a process pool, then merged k-way, in several
+    passes if there are more than fanin runs.
+    """
+    tmpdir = tempfile.mkdtemp(prefix="mssort-", dir=tmpdir)
+    try:
+        runs = split_runs(paths, run_size)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            runpaths = list(
+                pool.map(
+                    sort_run,
+                    [path for (path, _) in runs],
+                    [offsets for (_, offsets) in runs],
+                    [key] * len(runs),
+                    [tmpdir] * len(runs),
+                )
+            )
+
+            while len(runpaths) > fanin:
+                groups = [
+                    runpaths[i : i + fanin] for i in range(0, len(runpaths), fanin)
+                ]
+                runpaths = list(
+                    pool.map(
+                        merge_to_run,
+                        groups,
+                        [key] * len(groups),
+                        [tmpdir] * len(groups),
+                    )
+                )
+
+        merge_runs(runpaths, key, out)
+
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# ------------------------------------------------------------------------------
+def usage():
+    print(
+        """Usage:
+  mssort [options] file [file ...]
+
+Sort miniSEED records by stream and begin time (default) or by end time.
+
+Files of any size are sorted in runs: chunks of bounded size are sorted in
+parallel and spilled to temporary files, which are then merged. Records are
+copied as raw bytes, the data is not decoded.
+
+Options:
+  -h, --help            Display this help message
+  -E, --end-time        Sort by end time, e.g. for msrtsimul
+  -j, --jobs            Number of worker processes (default: number of CPUs)
+  -m, --memory          Size of a sorted run in MB (default: 256)
+  -o, --output          Output file (default: standard output)
+  -T, --tmpdir          Directory for temporary files
+
+Examples:
+Sort a multiplexed file by stream and time
+  mssort -o sorted.mseed data.mseed
+
+Sort files by end time for playback with msrtsimul
+  mssort -E day1.mseed day2.mseed | msrtsimul -
+"""
+    )
+
+
+# ------------------------------------------------------------------------------
+def main():
+    key = "stream"
+    workers = None
+    run_size = 256 << 20
+    output = None
+    tmpdir = None
+
+    try:
+        opts, args = gnu_getopt(
+            sys.argv[1:],
+            "hEj:m:o:T:",
+            ["help", "end-time", "jobs=", "memory=", "output=", "tmpdir="],
+        )
+    except GetoptError:
+        usage()
+        return 1
+
+    for flag, arg in opts:
+        if flag in ("-E", "--end-time"):
+            key = "time"
+        elif flag in ("-j", "--jobs"):
+            workers = int(arg)
+        elif flag in ("-m", "--memory"):
+            run_size = int(float(arg) * (1 << 20))
+        elif flag in ("-o", "--output"):
+            output = arg
+        elif flag in ("-T", "--tmpdir"):
+            tmpdir = arg
+        else:
+            usage()
+            if flag in ("-h", "--help"):
+                return 0
+            return 1
+
+    if not args:
+        usage()
+        return 1
+
+    try:
+        if output is None:
+            mssort(
+                args, sys.stdout.buffer, key, run_size, workers=workers, tmpdir=tmpdir
+            )
+        else:
+            with open(output, "wb", buffering=1 << 20) as out:
+                mssort(args, out, key, run_size, workers=workers, tmpdir=tmpdir)
+
+    except (IOError, mseed.MSeedError) as e:
+        print(f"mssort: {e}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+# ------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2686,6 +2686,7 @@ class _Timespan(object):
 class _WaveformData(object):
     def __init__(self):
         self.__fd = TemporaryFile()
+        self.__writer = mseed.RecordWriter(self.__fd)
         self.__recno = 0
         self.__cur_rec = None
         self.__cur_series = None
@@ -2758,13 +2759,13 @@ class _WaveformData(object):
                 else:
                     self.__cur_series = self.__get_time_series(rec)
 
-                self.__cur_rec.write(self.__fd, _RECLEN_EXP)
+                self.__writer.write(self.__cur_rec, _RECLEN_EXP)
                 self.__cur_rec = rec
 
         else:
             self.__recno += 1
             self.__cur_series = self.__get_time_series(rec)
-            self.__cur_rec.write(self.__fd, _RECLEN_EXP)
+            self.__writer.write(self.__cur_rec, _RECLEN_EXP)
             self.__cur_rec = rec
 
     def get_series_data(self):
@@ -2783,19 +2784,22 @@ class _WaveformData(object):
 
     def output_data(self, fd, data_start):
         if self.__cur_rec is not None:
-            self.__cur_rec.write(self.__fd, _RECLEN_EXP)
+            self.__writer.write(self.__cur_rec, _RECLEN_EXP)
             self.__cur_rec = None
             self.__cur_series = None
 
+        self.__writer.flush()
         self.__fd.seek(0)
         #copyfileobj(self.__fd, fd)
 
+        writer = mseed.RecordWriter(fd)
         i = 0
         for rec in mseed.Input(self.__fd):
             rec.recno = data_start + i
-            rec.write(fd, _RECLEN_EXP)
+            writer.write(rec, _RECLEN_EXP)
             i += 1
 
+        writer.flush()
         self.__fd.close()
 
 class _RecordBuilder(object):
@@ -0,0 +1,233 @@
+"""Data availability of Mini-SEED streams: segments, gaps and overlaps.
+
+Records are reduced to their time spans, which are merged into contiguous
+segments per stream without decoding any data. Segments are kept in arrays
+of integer nanoseconds, so that year-long archives can be analyzed in
+little memory. Summaries can be requested at any time while records are
+added.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+   :License:
+       GPLv3
+   :Platform:
+       Linux
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import array
+import bisect
+import collections
+
+from seiscomp.mseedlite import MappedInput, _GAP_TOLERANCE
+
+Summary = collections.namedtuple(
+    "Summary",
+    (
+        "net",
+        "sta",
+        "loc",
+        "cha",
+        "begin_ns",
+        "end_ns",
+        "segments",
+        "gaps",
+        "overlaps",
+        "coverage",
+        "records",
+        "samples",
+    ),
+)
+
+
+class StreamAvailability(object):
+    """Contiguous segments of one stream.
+
+    begins and ends are sorted arrays of the segment limits in nanoseconds.
+    overlaps counts the records overlapping data already seen by more than
+    the tolerance; tolerance_ns is the largest tolerance used so far.
+    """
+
+    def __init__(self, net, sta, loc, cha):
+        self.net = net
+        self.sta = sta
+        self.loc = loc
+        self.cha = cha
+        self.begins = array.array("q")
+        self.ends = array.array("q")
+        self.overlaps = 0
+        self.records = 0
+        self.samples = 0
+        self.tolerance_ns = 0
+
+    def add(self, begin_ns, end_ns, tolerance_ns):
+        """Add the time span of a record.
+
+        Spans separated by no more than tolerance_ns are merged.
+        """
+        begins = self.begins
+        ends = self.ends
+        if tolerance_ns > self.tolerance_ns:
+            self.tolerance_ns = tolerance_ns
+
+        # records in time order extend or follow the last segment
+        if begins and begin_ns >= begins[-1]:
+            if begin_ns <= ends[-1] + tolerance_ns:
+                if begin_ns < ends[-1] - tolerance_ns:
+                    self.overlaps += 1
+
+                if end_ns > ends[-1]:
+                    ends[-1] = end_ns
+
+            else:
+                begins.append(begin_ns)
+                ends.append(end_ns)
+
+            return
+
+        i = bisect.bisect_right(begins, begin_ns)
+        lo = i
+        if i > 0 and begin_ns <= ends[i - 1] + tolerance_ns:
+            lo = i - 1
+
+        hi = i
+        while hi < len(begins) and begins[hi] <= end_ns + tolerance_ns:
+            hi += 1
+
+        for j in range(lo, hi):
+            if min(end_ns, ends[j]) - max(begin_ns, begins[j]) > tolerance_ns:
+                self.overlaps += 1
+                break
+
+        if lo < hi:
+            begin_ns = min(begin_ns, begins[lo])
+            end_ns = max(end_ns, max(ends[lo:hi]))
+
+        begins[lo:hi] = array.array("q", (begin_ns,))
+        ends[lo:hi] = array.array("q", (end_ns,))
+
+    def update(self, other):
+        """Add the segments and counters of another StreamAvailability."""
+        tolerance_ns = max(self.tolerance_ns, other.tolerance_ns)
+        for (begin_ns, end_ns) in zip(other.begins, other.ends):
+            self.add(begin_ns, end_ns, tolerance_ns)
+
+        self.overlaps += other.overlaps
+        self.records += other.records
+        self.samples += other.samples
+
+    def summary(self, start_ns=None, end_ns=None):
+        """Summarize the availability within [start_ns, end_ns).
+
+        The window defaults to the span of the data. coverage is the
+        percentage of the window covered by data, gaps the number of
+        discontinuities between segments within the window. overlaps,
+        records and samples are totals of the stream, as single records
+        are not kept.
+        """
+        if start_ns is None:
+            start_ns = self.begins[0] if self.begins else 0
+
+        if end_ns is None:
+            end_ns = self.ends[-1] if self.ends else start_ns
+
+        lo = bisect.bisect_right(self.ends, start_ns)
+        hi = bisect.bisect_left(self.begins, end_ns)
+        covered = sum(
+            min(self.ends[j], end_ns) - max(self.begins[j], start_ns)
+            for j in range(lo, hi)
+        )
+
+        if end_ns > start_ns:
+            coverage = 100.0 * covered / (end_ns - start_ns)
+        else:
+            coverage = 0.0
+
+        return Summary(
+            self.net,
+            self.sta,
+            self.loc,
+            self.cha,
+            start_ns,
+            end_ns,
+            hi - lo,
+            max(hi - lo - 1, 0),
+            self.overlaps,
+            coverage,
+            self.records,
+            self.samples,
+        )
+
+
+class Availability(object):
+    """Availability of all streams of a record sequence.
+
+    Consecutive records are contiguous if the begin time of a record differs
+    from the end time of the previous one by no more than tolerance sample
+    periods, by default mseedlite._GAP_TOLERANCE.
+    """
+
+    def __init__(self, tolerance=_GAP_TOLERANCE):
+        self.tolerance = tolerance
+        self.streams = {}
+
+    def add(self, rec):
+        """Add a record."""
+        key = (rec.net, rec.sta, rec.loc, rec.cha)
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = self.streams[key] = StreamAvailability(*key)
+
+        if rec.samprate_num > 0:
+            tolerance_ns = int(
+                self.tolerance * 1000000000 * rec.samprate_denom // rec.samprate_num
+            )
+        else:
+            tolerance_ns = 0
+
+        stream.add(rec.begin_ns, rec.end_ns, tolerance_ns)
+        stream.records += 1
+        stream.samples += rec.nsamp
+
+    def add_records(self, recs):
+        """Add all records of an iterable."""
+        for rec in recs:
+            self.add(rec)
+
+    def update(self, other):
+        """Merge the streams of another Availability."""
+        for (key, stream) in other.streams.items():
+            mine = self.streams.get(key)
+            if mine is None:
+                # a copy, so that other is never changed through self
+                mine = self.streams[key] = StreamAvailability(*key)
+
+            mine.update(stream)
+
+    def summaries(self, start_ns=None, end_ns=None):
+        """Return a Summary per stream, sorted by stream."""
+        return [
+            self.streams[key].summary(start_ns, end_ns) for key in sorted(self.streams)
+        ]
+
+
+def file_availability(path, tolerance=_GAP_TOLERANCE):
+    """Availability of a file, for use with mseedscan.scan."""
+    avail = Availability(tolerance)
+    with MappedInput(path, lazy=True) as inp:
+        avail.add_records(inp)
+
+    return avail
+
+
+def merge_availability(acc, avail):
+    """Merge per-file results of file_availability, for mseedscan.scan."""
+    if acc is None:
+        return avail
+
+    acc.update(avail)
+    return acc
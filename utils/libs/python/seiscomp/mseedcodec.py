@@ -0,0 +1,462 @@
+"""Sample coding for mseedlite records (requires NumPy).
+
+Steim-1, Steim-2 and uncompressed integer and floating point encodings are
+decoded with NumPy. Frames of many records are decoded in one batch, and
+records can be assembled into contiguous per-stream segments with gap and
+overlap information. Integer sample streams can be compressed with Steim-1
+or Steim-2 and packed into new data records.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+   :License:
+       GPLv3
+   :Platform:
+       Linux
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import numpy as np
+
+from seiscomp.mseedlite import (
+    MSeedError,
+    Record,
+    _GAP_TOLERANCE,
+    _factmult,
+    _pack_header,
+    _span_ns,
+)
+
+ENC_INT16 = 1
+ENC_INT32 = 3
+ENC_FLOAT32 = 4
+ENC_FLOAT64 = 5
+ENC_STEIM1 = 10
+ENC_STEIM2 = 11
+
+_FRAME_LEN = 64
+_FRAME_WORDS = 16
+
+_UNCOMPRESSED = {
+    ENC_INT16: "i2",
+    ENC_INT32: "i4",
+    ENC_FLOAT32: "f4",
+    ENC_FLOAT64: "f8",
+}
+
+# Steim layouts: (nibble, dnib or None) -> (number of differences, bits)
+_STEIM1_LAYOUT = {
+    (1, None): (4, 8),
+    (2, None): (2, 16),
+    (3, None): (1, 32),
+}
+
+_STEIM2_LAYOUT = {
+    (1, None): (4, 8),
+    (2, 1): (1, 30),
+    (2, 2): (2, 15),
+    (2, 3): (3, 10),
+    (3, 0): (5, 6),
+    (3, 1): (6, 5),
+    (3, 2): (7, 4),
+}
+
+_MAX_DIFFS = 7
+
+# Steim word layouts for encoding, most differences first:
+# (number of differences, bits, nibble, dnib or None)
+_STEIM1_WORDS = (
+    (4, 8, 1, None),
+    (2, 16, 2, None),
+    (1, 32, 3, None),
+)
+
+_STEIM2_WORDS = (
+    (7, 4, 3, 2),
+    (6, 5, 3, 1),
+    (5, 6, 3, 0),
+    (4, 8, 1, None),
+    (3, 10, 2, 3),
+    (2, 15, 2, 2),
+    (1, 30, 2, 1),
+)
+
+_HEAD_LEN = 64
+
+# largest sample count of the 16-bit header field
+_MAX_NSAMP = 65535
+
+
+def _byteorder(rec):
+    return ">" if rec.byteorder else "<"
+
+
+def _nslc(rec):
+    return f"{rec.net}.{rec.sta}.{rec.loc}.{rec.cha}"
+
+
+def _frames(rec):
+    """Steim frames of a record as an (nframes, 16) array of uint32."""
+    payload = rec.payload
+    nframes = min(rec.nframes, len(payload) // _FRAME_LEN)
+    words = np.frombuffer(
+        payload, dtype=_byteorder(rec) + "u4", count=nframes * _FRAME_WORDS
+    )
+    return words.reshape(nframes, _FRAME_WORDS)
+
+
+def _steim_diffs(frames, layout):
+    """Differences contained in Steim frames.
+
+    Returns the differences of all data words in frame order, and the number
+    of differences per data word.
+    """
+    ctrl = frames[:, :1].astype(np.int64)
+    shifts = np.arange(30, -2, -2, dtype=np.int64)[1:]
+    nib = ((ctrl >> shifts) & 0x3).ravel()
+    words = frames[:, 1:].astype(np.int64).ravel()
+    dnib = (words >> 30) & 0x3
+
+    diffs = np.zeros((len(words), _MAX_DIFFS), dtype=np.int64)
+    counts = np.zeros(len(words), dtype=np.int64)
+
+    for (n, d), (k, bits) in layout.items():
+        sel = nib == n
+        if d is not None:
+            sel &= dnib == d
+
+        if not sel.any():
+            continue
+
+        fields = (words[sel, None] >> (bits * np.arange(k - 1, -1, -1))) & (
+            (1 << bits) - 1
+        )
+        fields -= (fields >> (bits - 1)) << bits
+        diffs[sel, :k] = fields
+        counts[sel] = k
+
+    return (diffs[np.arange(_MAX_DIFFS) < counts[:, None]], counts)
+
+
+def _decode_steim(recs, layout, check):
+    """Decode a batch of records sharing one Steim encoding."""
+    frames = [_frames(rec) for rec in recs]
+    nframes = np.array([len(f) for f in frames], dtype=np.int64)
+    (diffs, counts) = _steim_diffs(np.concatenate(frames), layout)
+
+    # number of differences per record
+    wrec = np.repeat(np.arange(len(recs)), nframes * (_FRAME_WORDS - 1))
+    ndiffs = np.bincount(wrec, weights=counts, minlength=len(recs))
+    ndiffs = ndiffs.astype(np.int64)
+    starts = np.cumsum(ndiffs) - ndiffs
+
+    # X[i] = X0 + d[1] + ... + d[i]; the first difference refers to X[-1]
+    csum = np.cumsum(diffs)
+    result = []
+    for i, rec in enumerate(recs):
+        nsamp = min(rec.nsamp, ndiffs[i])
+        if nsamp == 0:
+            result.append(np.zeros(0, dtype=np.int32))
+            continue
+
+        start = starts[i]
+        samples = csum[start : start + nsamp] - csum[start] + rec.X0
+
+        if check and (nsamp != rec.nsamp or samples[-1] != rec.Xn):
+            raise MSeedError(
+                f"Steim integrity check failed at {_nslc(rec)} {rec.begin_time}"
+            )
+
+        result.append(samples.astype(np.int32))
+
+    return result
+
+
+def decode_records(recs, check=True):
+    """Decode the samples of a sequence of records.
+
+    Records with the same encoding are decoded in one batch. Returns a list
+    of NumPy arrays in the order of recs. If check is True, the number of
+    samples and the last sample of Steim records are verified against the
+    header and the X[n] integrity constant.
+    """
+    recs = list(recs)
+    result = [None] * len(recs)
+    batches = {}
+
+    for i, rec in enumerate(recs):
+        if rec.encoding in (ENC_STEIM1, ENC_STEIM2):
+            batches.setdefault(rec.encoding, []).append(i)
+
+        elif rec.encoding in _UNCOMPRESSED:
+            dtype = np.dtype(_byteorder(rec) + _UNCOMPRESSED[rec.encoding])
+            payload = rec.payload
+            if len(payload) < rec.nsamp * dtype.itemsize:
+                raise MSeedError(
+                    f"data section too short at {_nslc(rec)} {rec.begin_time}"
+                )
+
+            samples = np.frombuffer(payload, dtype=dtype, count=rec.nsamp)
+            result[i] = samples.astype(samples.dtype.newbyteorder("="))
+
+        else:
+            raise MSeedError(
+                f"unsupported encoding {rec.encoding} at {_nslc(rec)} {rec.begin_time}"
+            )
+
+    for encoding, idx in batches.items():
+        layout = _STEIM1_LAYOUT if encoding == ENC_STEIM1 else _STEIM2_LAYOUT
+        decoded = _decode_steim([recs[i] for i in idx], layout, check)
+        for i, samples in zip(idx, decoded):
+            result[i] = samples
+
+    return result
+
+
+def decode(rec, check=True):
+    """Decode the samples of a single record."""
+    return decode_records([rec], check)[0]
+
+
+def _duration_ns(nsamp, fsamp):
+    """Duration of nsamp samples at fsamp Hz in nanoseconds."""
+    if fsamp == 0:
+        return 0
+
+    return int(round(nsamp * 1e9 / fsamp))
+
+
+class Segment(object):
+    """Contiguous samples of one stream."""
+
+    def __init__(self, begin_ns, fsamp, samples):
+        self.begin_ns = begin_ns
+        self.fsamp = fsamp
+        self.samples = samples
+
+    @property
+    def end_ns(self):
+        """Time of the sample following the last one in nanoseconds."""
+        return self.begin_ns + _duration_ns(len(self.samples), self.fsamp)
+
+
+class Stream(object):
+    """Decoded samples of one stream, split into contiguous segments.
+
+    gaps holds one (end_ns, begin_ns) tuple per discontinuity between
+    consecutive segments; begin_ns < end_ns denotes an overlap.
+    """
+
+    def __init__(self, net, sta, loc, cha):
+        self.net = net
+        self.sta = sta
+        self.loc = loc
+        self.cha = cha
+        self.segments = []
+        self.gaps = []
+
+    @property
+    def overlaps(self):
+        """Discontinuities where the next segment starts before the end."""
+        return [(e, b) for (e, b) in self.gaps if b < e]
+
+
+def decode_streams(recs, tolerance=_GAP_TOLERANCE, check=True):
+    """Decode records into contiguous per-stream segments.
+
+    Records are grouped by stream and sorted by start time. A new segment is
+    started whenever the sample rate changes or the start time of a record
+    differs from the expected time by more than tolerance sample periods.
+    Returns a dict mapping (net, sta, loc, cha) to Stream.
+    """
+    recs = sorted(
+        recs, key=lambda rec: (rec.net, rec.sta, rec.loc, rec.cha, rec.begin_ns)
+    )
+    streams = {}
+    seg = None
+    parts = []
+    nparts = 0
+
+    for rec, samples in zip(recs, decode_records(recs, check)):
+        key = (rec.net, rec.sta, rec.loc, rec.cha)
+        stream = streams.get(key)
+        if stream is None:
+            stream = streams[key] = Stream(*key)
+
+        else:
+            end_ns = seg.begin_ns + _duration_ns(nparts, seg.fsamp)
+            if seg.fsamp == rec.fsamp and abs(
+                rec.begin_ns - end_ns
+            ) <= tolerance * _duration_ns(1, rec.fsamp):
+                parts.append(samples)
+                nparts += len(samples)
+                continue
+
+            stream.gaps.append((end_ns, rec.begin_ns))
+
+        if seg is not None:
+            seg.samples = np.concatenate(parts)
+
+        seg = Segment(rec.begin_ns, rec.fsamp, None)
+        stream.segments.append(seg)
+        parts = [samples]
+        nparts = len(samples)
+
+    if seg is not None:
+        seg.samples = np.concatenate(parts)
+
+    return streams
+
+
+def _steim_words(diffs, layout):
+    """Compress differences into Steim data words.
+
+    The number of differences per word is selected greedily, as many as
+    fit. Returns the words, their nibbles and the index of the first
+    difference of every word.
+    """
+    n = len(diffs)
+    ok = np.zeros((len(layout), n), dtype=bool)
+    for i, (k, bits, _, _) in enumerate(layout):
+        fits = (diffs >= -(1 << (bits - 1))) & (diffs < (1 << (bits - 1)))
+        if k > n:
+            continue
+
+        if k == 1:
+            ok[i] = fits
+        else:
+            ok[i, : n - k + 1] = np.lib.stride_tricks.sliding_window_view(
+                fits, k
+            ).all(axis=1)
+
+    if not ok.any(axis=0).all():
+        raise MSeedError("difference too large for Steim compression")
+
+    choice = np.argmax(ok, axis=0)
+    counts = np.array([k for (k, _, _, _) in layout], dtype=np.int64)[choice]
+
+    # the greedy walk is the only sequential step
+    starts = []
+    pos = 0
+    while pos < n:
+        starts.append(pos)
+        pos += counts[pos]
+
+    starts = np.array(starts, dtype=np.int64)
+    choice = choice[starts]
+    words = np.zeros(len(starts), dtype=np.int64)
+    nibs = np.zeros(len(starts), dtype=np.int64)
+
+    for i, (k, bits, nib, dnib) in enumerate(layout):
+        sel = choice == i
+        if not sel.any():
+            continue
+
+        fields = diffs[starts[sel, None] + np.arange(k)] & ((1 << bits) - 1)
+        word = (fields << (bits * np.arange(k - 1, -1, -1))).sum(axis=1)
+        if dnib is not None:
+            word |= dnib << 30
+
+        words[sel] = word
+        nibs[sel] = nib
+
+    return (words, nibs, starts)
+
+
+def pack_records(
+    net,
+    sta,
+    loc,
+    cha,
+    fsamp,
+    begin_ns,
+    samples,
+    encoding=ENC_STEIM2,
+    reclen=512,
+    recno=1,
+    X_minus1=None,
+    rectype="D",
+):
+    """Compress integer samples and pack them into new data records.
+
+    Records of reclen bytes are filled completely except for the last one.
+    X_minus1 is the last sample of the preceding record, if known. Yields
+    Record objects with sequence numbers starting at recno.
+    """
+    if encoding == ENC_STEIM1:
+        layout = _STEIM1_WORDS
+    elif encoding == ENC_STEIM2:
+        layout = _STEIM2_WORDS
+    else:
+        raise MSeedError(f"unsupported encoding {encoding} for packing")
+
+    rec_len_exp = reclen.bit_length() - 1
+    if reclen != 1 << rec_len_exp or reclen < 2 * _HEAD_LEN:
+        raise MSeedError(f"invalid record length {reclen}")
+
+    samples = np.asarray(samples, dtype=np.int64)
+    if len(samples) == 0:
+        return
+
+    if X_minus1 is None:
+        X_minus1 = samples[0]
+
+    diffs = np.diff(samples, prepend=X_minus1)
+    (words, nibs, starts) = _steim_words(diffs, layout)
+    ends = np.append(starts[1:], len(samples))
+
+    (sr_factor, sr_mult, num, denom) = _factmult(fsamp)
+    nframes = (reclen - _HEAD_LEN) // _FRAME_LEN
+
+    # data word slots of a record; words 1 and 2 of frame 0 hold X0 and Xn
+    slots = np.arange(nframes * _FRAME_WORDS)
+    slots = slots[(slots % _FRAME_WORDS != 0) & (slots >= 3)]
+    shifts = np.arange(30, -2, -2, dtype=np.int64)
+
+    first = 0
+    while first < len(words):
+        last = min(first + len(slots), len(words))
+        if ends[last - 1] - starts[first] > _MAX_NSAMP:
+            # the sample count of the header is a 16-bit field
+            last = int(np.searchsorted(ends, starts[first] + _MAX_NSAMP, "right"))
+
+        start = starts[first]
+        end = ends[last - 1]
+        used = (slots[last - first - 1] // _FRAME_WORDS) + 1
+
+        frames = np.zeros(nframes * _FRAME_WORDS, dtype=np.int64)
+        nibarr = np.zeros(nframes * _FRAME_WORDS, dtype=np.int64)
+        frames[slots[: last - first]] = words[first:last]
+        nibarr[slots[: last - first]] = nibs[first:last]
+        frames[1] = samples[start]
+        frames[2] = samples[end - 1]
+        frames[::_FRAME_WORDS] = (
+            nibarr.reshape(nframes, _FRAME_WORDS) << shifts
+        ).sum(axis=1)
+
+        header = _pack_header(
+            recno,
+            rectype,
+            net,
+            sta,
+            loc,
+            cha,
+            begin_ns + _span_ns(int(start), num, denom),
+            int(end - start),
+            sr_factor,
+            sr_mult,
+            encoding,
+            rec_len_exp,
+            used,
+        )
+        recno += 1
+        first = last
+
+        yield Record(
+            header
+            + (frames & 0xFFFFFFFF).astype(">u4").tobytes()
+            + bytes(reclen - _HEAD_LEN - nframes * _FRAME_LEN)
+        )
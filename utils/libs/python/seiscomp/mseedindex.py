@@ -0,0 +1,275 @@
+"""Persistent record index (sidecar file) for Mini-SEED files.
+
+The index stores offset, stream, begin and end time and number of samples of
+every data record in a compact binary file next to the Mini-SEED file, so
+that the records of a time window can be found by binary search and read
+directly instead of scanning the whole file.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+   :License:
+       GPLv3
+   :Platform:
+       Linux
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import array
+import bisect
+import fnmatch
+import os
+import struct
+import sys
+
+from seiscomp.mseedlite import MappedInput, MSeedError, Record
+
+_MAGIC = b"MSIX"
+_VERSION = 1
+
+# magic, version, reserved, file size, file mtime in ns, streams, records
+_IDXHEAD = struct.Struct("<4sHHqqII")
+_STRLEN = struct.Struct("<H")
+
+# columns of the record table in file order
+_COLUMNS = (
+    ("offsets", "q"),
+    ("begin_ns", "q"),
+    ("end_ns", "q"),
+    ("nsamp", "i"),
+    ("stream", "i"),
+)
+
+
+def index_path(path):
+    """Return the path of the sidecar index of a Mini-SEED file."""
+    return path + ".idx"
+
+
+def _file_stamp(path):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns)
+
+
+class RecordIndex(object):
+    """Index of the data records of one Mini-SEED file.
+
+    Entries are sorted by stream and begin time. Columns are kept in arrays:
+    offsets, begin_ns, end_ns, nsamp and stream (index into streams, a list
+    of (net, sta, loc, cha) tuples).
+    """
+
+    def __init__(self, streams, columns, size=-1, mtime_ns=-1):
+        self.streams = streams
+        self.size = size
+        self.mtime_ns = mtime_ns
+        for (name, typecode) in _COLUMNS:
+            setattr(self, name, columns.get(name, array.array(typecode)))
+
+        # first entry of every stream, plus the number of entries
+        self.__first = [0] * (len(streams) + 1)
+        for i in self.stream:
+            self.__first[i + 1] += 1
+
+        for i in range(len(streams)):
+            self.__first[i + 1] += self.__first[i]
+
+        # running maximum of the end time within each stream, which is
+        # sorted even if records overlap
+        self.__max_end = array.array("q", self.end_ns)
+        for i in range(len(streams)):
+            for j in range(self.__first[i] + 1, self.__first[i + 1]):
+                if self.__max_end[j] < self.__max_end[j - 1]:
+                    self.__max_end[j] = self.__max_end[j - 1]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, path):
+        """Scan a Mini-SEED file and create its index."""
+        (size, mtime_ns) = _file_stamp(path)
+        keys = {}
+        entries = []
+        with MappedInput(path, lazy=True) as inp:
+            for (offset, rec) in inp.items():
+                key = (rec.net, rec.sta, rec.loc, rec.cha)
+                entries.append((key, rec.begin_ns, offset, rec.end_ns, rec.nsamp))
+                keys[key] = None
+
+        streams = sorted(keys)
+        for (i, key) in enumerate(streams):
+            keys[key] = i
+
+        entries.sort()
+        columns = dict((name, array.array(typecode)) for (name, typecode) in _COLUMNS)
+        for (key, begin_ns, offset, end_ns, nsamp) in entries:
+            columns["offsets"].append(offset)
+            columns["begin_ns"].append(begin_ns)
+            columns["end_ns"].append(end_ns)
+            columns["nsamp"].append(nsamp)
+            columns["stream"].append(keys[key])
+
+        return cls(streams, columns, size, mtime_ns)
+
+    @classmethod
+    def load(cls, idxpath):
+        """Read an index from a sidecar file."""
+        with open(idxpath, "rb") as fd:
+            data = fd.read()
+
+        try:
+            (magic, version, _, size, mtime_ns, nstreams, nrecords) = (
+                _IDXHEAD.unpack_from(data)
+            )
+            if magic != _MAGIC or version != _VERSION:
+                raise MSeedError(f"{idxpath}: not a record index")
+
+            pos = _IDXHEAD.size
+            streams = []
+            for _ in range(nstreams):
+                (n,) = _STRLEN.unpack_from(data, pos)
+                pos += _STRLEN.size
+                key = tuple(data[pos : pos + n].decode("utf-8").split("."))
+                if len(key) != 4:
+                    raise ValueError
+
+                streams.append(key)
+                pos += n
+
+            columns = {}
+            for (name, typecode) in _COLUMNS:
+                col = array.array(typecode)
+                n = nrecords * col.itemsize
+                col.frombytes(data[pos : pos + n])
+                if len(col) != nrecords:
+                    raise ValueError
+
+                if sys.byteorder == "big":
+                    col.byteswap()
+
+                columns[name] = col
+                pos += n
+
+        except (struct.error, ValueError):
+            raise MSeedError(f"{idxpath}: corrupt record index")
+
+        return cls(streams, columns, size, mtime_ns)
+
+    def save(self, idxpath):
+        """Write the index to a sidecar file.
+
+        The file is replaced atomically.
+        """
+        tmppath = idxpath + ".tmp"
+        with open(tmppath, "wb") as fd:
+            fd.write(
+                _IDXHEAD.pack(
+                    _MAGIC,
+                    _VERSION,
+                    0,
+                    self.size,
+                    self.mtime_ns,
+                    len(self.streams),
+                    len(self),
+                )
+            )
+            for key in self.streams:
+                name = ".".join(key).encode("utf-8")
+                fd.write(_STRLEN.pack(len(name)))
+                fd.write(name)
+
+            for (name, _) in _COLUMNS:
+                col = getattr(self, name)
+                if sys.byteorder == "big":
+                    col = array.array(col.typecode, col)
+                    col.byteswap()
+
+                fd.write(col.tobytes())
+
+        os.replace(tmppath, idxpath)
+
+    def is_stale(self, path):
+        """Check if the file was modified since the index was built."""
+        try:
+            return _file_stamp(path) != (self.size, self.mtime_ns)
+
+        except OSError:
+            return True
+
+    def select(self, net="*", sta="*", loc="*", cha="*"):
+        """Return the stream numbers matching the given wildcard patterns."""
+        return [
+            i
+            for (i, key) in enumerate(self.streams)
+            if all(
+                fnmatch.fnmatchcase(code, pat)
+                for (code, pat) in zip(key, (net, sta, loc, cha))
+            )
+        ]
+
+    def query(self, start_ns=None, end_ns=None, net="*", sta="*", loc="*", cha="*"):
+        """Return the offsets of the records overlapping a time window.
+
+        The window is [start_ns, end_ns); None means unbounded. Streams are
+        selected by wildcard patterns. Offsets are returned in file order.
+        """
+        offsets = []
+        for i in self.select(net, sta, loc, cha):
+            (lo, hi) = (self.__first[i], self.__first[i + 1])
+            if start_ns is not None:
+                lo = bisect.bisect_right(self.__max_end, start_ns, lo, hi)
+
+            if end_ns is not None:
+                hi = bisect.bisect_left(self.begin_ns, end_ns, lo, hi)
+
+            offsets.extend(
+                self.offsets[j]
+                for j in range(lo, hi)
+                if start_ns is None or self.end_ns[j] > start_ns
+            )
+
+        offsets.sort()
+        return offsets
+
+
+def open_index(path, save=True):
+    """Return the index of a Mini-SEED file.
+
+    The sidecar index is used if it exists and is up to date. Otherwise the
+    index is rebuilt and, if save is True, written to the sidecar file if
+    the directory is writable.
+    """
+    idxpath = index_path(path)
+    try:
+        idx = RecordIndex.load(idxpath)
+        if not idx.is_stale(path):
+            return idx
+
+    except (OSError, MSeedError):
+        pass
+
+    idx = RecordIndex.build(path)
+    if save:
+        try:
+            idx.save(idxpath)
+
+        except OSError:
+            pass
+
+    return idx
+
+
+def read_window(path, start_ns=None, end_ns=None, net="*", sta="*", loc="*", cha="*"):
+    """Iterate over the records of a file overlapping a time window.
+
+    Only the records found in the index are read from the file.
+    """
+    offsets = open_index(path).query(start_ns, end_ns, net, sta, loc, cha)
+    with open(path, "rb") as fd:
+        for offset in offsets:
+            fd.seek(offset)
+            yield Record(fd)
@@ -17,18 +17,73 @@ any later version.
 
 from __future__ import absolute_import, division, print_function
 
+import array
+import bisect
 import datetime
+import fnmatch
+import heapq
+import json
+import mmap
+import os
+import re
 import struct
 import sys
-from io import BytesIO
+from fractions import Fraction
 
 _FIXHEAD_LEN = 48
 _BLKHEAD_LEN = 4
 _BLK1000_LEN = 4
 _BLK1001_LEN = 4
-_MAX_RECLEN = 4096
-
-_doy = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334, 365)
+_MIN_RECLEN_EXP = 7
+_MAX_RECLEN_EXP = 16
+_MAX_RECLEN = 1 << _MAX_RECLEN_EXP
+_DEFAULT_RECLEN = 4096
+_FRAME_LEN = 64
+_FRAMEHEAD_LEN = 16
+
+_FIXHEAD = struct.Struct(">6scx5s2s3s2s2H3Bx2H2h4Bl2H")
+_FIXHEAD_OUT = struct.Struct(">6s2c5s2s3s2s2H3Bx2H2h4Bl2H")
+_BLKHEAD = struct.Struct(">2H")
+_BLK1000 = struct.Struct(">3Bx")
+_BLK1001 = struct.Struct(">BbxB")
+_PTRS = struct.Struct(">2H")
+_FRAMEHEAD = struct.Struct(">L2lL")
+_X0XN = struct.Struct(">2l")
+_BYTE = struct.Struct(">b")
+_UBYTE = struct.Struct(">B")
+
+_ZEROS = bytes(_MAX_RECLEN)
+
+_BTIME = struct.Struct(">2H3BxH")
+_NSAMP_RATE = struct.Struct(">H2h")
+_HEADER_RX = re.compile(rb"[0-9 ]{6}[DRQM][ \x00]|MS\x03")
+
+# miniSEED 3 fixed header, little endian
+_MS3HEAD = struct.Struct("<2sBBIHHBBBBdIIBBHI")
+_MS3HEAD_LEN = 40
+_MS3_MAX_RECLEN = 1 << 24
+_MS3_CRC_IDX = 28
+_MS3TAIL = struct.Struct("<BHI")
+_UINT32LE = struct.Struct("<I")
+_UINT16 = struct.Struct(">H")
+
+# miniSEED 3 publication version by SEED 2 data quality indicator
+_PUBVERSION = {"R": 1, "D": 2, "Q": 3, "M": 4}
+_QUALITY = dict((v, k) for (k, v) in _PUBVERSION.items())
+
+_STEIM_ENCODINGS = (10, 11)
+
+# largest time difference of contiguous records in sample periods, the rule
+# of fseed._min_data_gap
+_GAP_TOLERANCE = 0.1
+_SAMPLE_SIZE = {1: "h", 3: "i", 4: "f", 5: "d"}
+_RESYNC_CHUNK = 1 << 16
+
+_BUFFER_TYPES = (bytes, bytearray, memoryview, mmap.mmap)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_ORDINAL = _EPOCH.toordinal()
+_ONE_MICROSECOND = datetime.timedelta(microseconds=1)
 
 
 def _is_leap(y):
@@ -36,32 +91,502 @@ def _is_leap(y):
     return (y % 400 == 0) or (y % 4 == 0 and y % 100 != 0)
 
 
-def _ldoy(y, m):
-    """The day of the year of the first day of month m, in year y.
+def _days_before(y):
+    """Days from the epoch to January 1st of year y."""
+    return 365 * (y - 1970) + _leaps(y - 1) - _leaps(1969)
+
+
+def _leaps(y):
+    """Number of leap years in [1, y]."""
+    return y // 4 - y // 100 + y // 400
+
+
+# Days from the epoch to January 1st for the years covered by the lookup
+# table, plus one sentinel entry for the following year.
+_YEAR_MIN = 1900
+_YEAR_MAX = 2100
+_YEAR_DAYS = tuple(_days_before(y) for y in range(_YEAR_MIN, _YEAR_MAX + 2))
+
+
+def _btime2ns(year, doy, hour, minute, second, tms):
+    """Convert a BTIME to nanoseconds since the epoch."""
+    if _YEAR_MIN <= year <= _YEAR_MAX:
+        days = _YEAR_DAYS[year - _YEAR_MIN] + doy - 1
+    else:
+        days = _days_before(year) + doy - 1
+
+    return (
+        (days * 86400 + hour * 3600 + minute * 60 + second) * 1000000000
+        + tms * 100000
+    )
+
+
+def _span_ns(nsamp, num, denom):
+    """Duration of nsamp samples at num/denom Hz in nanoseconds."""
+    if nsamp == 0 or num == 0:
+        return 0
+
+    return (2 * nsamp * 1000000000 * denom + num) // (2 * num)
+
+
+def _ns2dt(ns):
+    """Convert nanoseconds since the epoch to datetime (microsecond rounded)."""
+    return _EPOCH + datetime.timedelta(microseconds=(ns + 500) // 1000)
+
+
+def _dt2ns(dt):
+    """Convert a datetime to nanoseconds since the epoch."""
+    return ((dt - _EPOCH) // _ONE_MICROSECOND) * 1000
+
+
+def _ns2btime(ns):
+    """Convert nanoseconds since the epoch to BTIME fields and microseconds.
+
+    Returns (year, doy, hour, minute, second, tms, micros), truncated to
+    microseconds.
+    """
+    (days, ns) = divmod(ns, 86400000000000)
+    i = bisect.bisect_right(_YEAR_DAYS, days) - 1
+    if 0 <= i <= _YEAR_MAX - _YEAR_MIN:
+        year = _YEAR_MIN + i
+        doy = days - _YEAR_DAYS[i] + 1
+    else:
+        year = datetime.date.fromordinal(_EPOCH_ORDINAL + days).year
+        doy = days - _days_before(year) + 1
+
+    (second, ns) = divmod(ns, 1000000000)
+    (minute, second) = divmod(second, 60)
+    (hour, minute) = divmod(minute, 60)
+    (tms, micros) = divmod(ns // 1000, 100)
+    return (year, doy, hour, minute, second, tms, micros)
+
+
+def _pack_header(
+    recno,
+    rectype,
+    net,
+    sta,
+    loc,
+    cha,
+    begin_ns,
+    nsamp,
+    sr_factor,
+    sr_mult,
+    encoding,
+    rec_len_exp,
+    nframes,
+    byteorder=1,
+    flags=(0, 0, 0),
+    time_quality=0,
+):
+    """Fixed header with blockettes 1000 and 1001 for a new data record.
+
+    The data section starts at offset 64 directly after the blockettes.
+    flags are the activity, I/O and data quality flags.
+    """
+    (bt_year, bt_doy, bt_hour, bt_minute, bt_second, bt_tms, micros) = _ns2btime(
+        begin_ns
+    )
+    pblk = _FIXHEAD_LEN
+    pdata = pblk + 2 * _BLKHEAD_LEN + _BLK1000_LEN + _BLK1001_LEN
+
+    return (
+        _FIXHEAD_OUT.pack(
+            ("%06d" % (recno % 1000000,)).encode("utf-8"),
+            rectype.encode("utf-8"),
+            b" ",
+            ("%-5.5s" % (sta,)).encode("utf-8"),
+            ("%-2.2s" % (loc,)).encode("utf-8"),
+            ("%-3.3s" % (cha,)).encode("utf-8"),
+            ("%-2.2s" % (net,)).encode("utf-8"),
+            bt_year,
+            bt_doy,
+            bt_hour,
+            bt_minute,
+            bt_second,
+            bt_tms,
+            nsamp,
+            sr_factor,
+            sr_mult,
+            flags[0],
+            flags[1],
+            flags[2],
+            2,
+            0,
+            pdata,
+            pblk,
+        )
+        + _BLKHEAD.pack(1000, pblk + _BLKHEAD_LEN + _BLK1000_LEN)
+        + _BLK1000.pack(encoding, byteorder, rec_len_exp)
+        + _BLKHEAD.pack(1001, 0)
+        + _BLK1001.pack(time_quality, micros, _frame_count(nframes))
+    )
+
+
+def _crc32c_table():
+    table = []
+    for i in range(256):
+        c = i
+        for _ in range(8):
+            c = (c >> 1) ^ 0x82F63B78 if c & 1 else c >> 1
+
+        table.append(c)
+
+    return tuple(table)
+
+
+_CRC32C_TABLE = _crc32c_table()
+_CRC32C_CHUNK = struct.Struct("<II")
+_crc32c_wide = []
+
+
+def _crc32c_wide_tables():
+    """Tables for slicing-by-8 with 16-bit indices, built on first use.
+
+    Table k maps bytes 2k and 2k + 1 of an 8-byte chunk to their
+    contribution to the CRC after the chunk.
+    """
+    if not _crc32c_wide:
+        tables = [_CRC32C_TABLE]
+        for _ in range(7):
+            tables.append(tuple((c >> 8) ^ _CRC32C_TABLE[c & 0xFF] for c in tables[-1]))
+
+        for k in range(0, 8, 2):
+            (lo, hi) = (tables[7 - k], tables[6 - k])
+            _crc32c_wide.append(
+                array.array("I", [lo[x & 0xFF] ^ hi[x >> 8] for x in range(65536)])
+            )
+
+    return _crc32c_wide
+
 
-    Note: for January, m=1; for December, m=12.
-    Examples:
-    _ldoy(1900, 4) = 90
-    _ldoy(1900, 1) = 0
-    _ldoy(1999, 4) = 90
-    _ldoy(2004, 4) = 91
-    _ldoy(2000, 4) = 91
+def _crc32c_py(data, value=0):
+    """CRC-32C (Castagnoli) checksum of data, as used by miniSEED 3.
 
+    value is the checksum of preceding data, so that the checksum of
+    concatenated pieces can be computed one piece after another.
     """
-    return _doy[m - 1] + (_is_leap(y) and m >= 3)
+    (t01, t23, t45, t67) = _crc32c_wide_tables()
+    table = _CRC32C_TABLE
+    data = memoryview(data).cast("B")
+    n = len(data) & ~7
+    crc = value ^ 0xFFFFFFFF
+    # eight bytes per step
+    for (lo, hi) in _CRC32C_CHUNK.iter_unpack(data[:n]):
+        crc ^= lo
+        crc = t01[crc & 0xFFFF] ^ t23[crc >> 16] ^ t45[hi & 0xFFFF] ^ t67[hi >> 16]
+
+    for b in data[n:]:
+        crc = table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+
+    return crc ^ 0xFFFFFFFF
 
 
-def _dy2mdy(doy, year):
-    month = 1
-    while doy > _ldoy(year, month + 1):
-        month += 1
+try:
+    # native implementation, if installed
+    from crc32c import crc32c as _crc32c
 
-    mday = doy - _ldoy(year, month)
-    return (month, mday)
+except ImportError:
+    _crc32c = _crc32c_py
 
 
-def _mdy2dy(month, day, year):
-    return _ldoy(year, month) + day
+def _factmult(fsamp):
+    """Sample rate factor and multiplier for fsamp.
+
+    Returns (sr_factor, sr_mult, num, denom), where num / denom is the
+    sample rate as represented in the header.
+    """
+    if fsamp == 0:
+        return (0, 0, 0, 1)
+
+    if fsamp >= 1 and fsamp == int(fsamp) and fsamp <= 32767:
+        return (int(fsamp), 1, int(fsamp), 1)
+
+    if fsamp < 1 and 1 / fsamp == int(1 / fsamp) and 1 / fsamp <= 32767:
+        return (-int(1 / fsamp), 1, 1, int(1 / fsamp))
+
+    frac = Fraction(fsamp).limit_denominator(32767)
+    if frac.numerator > 32767:
+        raise MSeedError(f"cannot represent sample rate {fsamp}")
+
+    return (frac.numerator, -frac.denominator, frac.numerator, frac.denominator)
+
+
+def _split_sid(sid):
+    """Split an FDSN source identifier into (net, sta, loc, cha)."""
+    if sid.startswith("FDSN:"):
+        parts = sid[5:].split("_")
+        if len(parts) == 6:
+            if all(len(p) == 1 for p in parts[3:]):
+                cha = "".join(parts[3:])
+            else:
+                cha = "_".join(parts[3:])
+
+            return (parts[0], parts[1], parts[2], cha)
+
+    return ("", "", "", sid)
+
+
+def _samprate(sr_factor, sr_mult):
+    """Sample rate as (numerator, denominator) from factor and multiplier."""
+    if (sr_factor > 0) and (sr_mult > 0):
+        return (sr_factor * sr_mult, 1)
+
+    if (sr_factor > 0) and (sr_mult < 0):
+        return (sr_factor, -sr_mult)
+
+    if (sr_factor < 0) and (sr_mult > 0):
+        return (sr_mult, -sr_factor)
+
+    if (sr_factor < 0) and (sr_mult < 0):
+        return (1, sr_factor * sr_mult)
+
+    return (0, 1)
+
+
+def _frame_count(nframes):
+    """Frame count for blockette 1001, 0 (unknown) if it does not fit."""
+    return nframes if nframes <= 0xFF else 0
+
+
+def _fill(buf, fd, n):
+    """Make sure that buf holds at least n bytes.
+
+    If fd is given, missing bytes are appended to buf (a bytearray) with a
+    single read. Returns False if not enough data is available.
+    """
+    if fd is not None and len(buf) < n:
+        buf += fd.read(n - len(buf))
+
+    return len(buf) >= n
+
+
+def _steim_d0(encoding, c3, w3):
+    """The first difference of a Steim frame, given nibble c3 and word w3."""
+    d0 = None
+
+    if encoding == 10:
+        # """STEIM (1) Compression?"""
+        if c3 == 1:
+            d0 = (w3 >> 24) & 0xFF
+            if d0 > 0x7F:
+                d0 -= 0x100
+        elif c3 == 2:
+            d0 = (w3 >> 16) & 0xFFFF
+            if d0 > 0x7FFF:
+                d0 -= 0x10000
+        elif c3 == 3:
+            d0 = w3 & 0xFFFFFFFF
+            if d0 > 0x7FFFFFFF:
+                d0 -= 0xFFFFFFFF
+                d0 -= 1
+
+    elif encoding == 11:
+        # """STEIM (2) Compression?"""
+        if c3 == 1:
+            d0 = (w3 >> 24) & 0xFF
+            if d0 > 0x7F:
+                d0 -= 0x100
+        elif c3 == 2:
+            dnib = (w3 >> 30) & 0x3
+            if dnib == 1:
+                d0 = w3 & 0x3FFFFFFF
+                if d0 > 0x1FFFFFFF:
+                    d0 -= 0x40000000
+            elif dnib == 2:
+                d0 = (w3 >> 15) & 0x7FFF
+                if d0 > 0x3FFF:
+                    d0 -= 0x8000
+            elif dnib == 3:
+                d0 = (w3 >> 20) & 0x3FF
+                if d0 > 0x1FF:
+                    d0 -= 0x400
+        elif c3 == 3:
+            dnib = (w3 >> 30) & 0x3
+            if dnib == 0:
+                d0 = (w3 >> 24) & 0x3F
+                if d0 > 0x1F:
+                    d0 -= 0x40
+            elif dnib == 1:
+                d0 = (w3 >> 25) & 0x1F
+                if d0 > 0xF:
+                    d0 -= 0x20
+            elif dnib == 2:
+                d0 = (w3 >> 24) & 0xF
+                if d0 > 0x7:
+                    d0 -= 0x10
+
+    return d0
+
+
+def _record_length(buf, offset):
+    """Length of the record at offset, taken from the header only.
+
+    Returns a tuple (rectype, length) where length is None if the record has
+    no blockette 1000 or the header is inconsistent.
+    """
+    if len(buf) - offset >= _MS3HEAD_LEN and buf[offset : offset + 3] == b"MS\x03":
+        (sidlen, extralen, datalen) = _MS3TAIL.unpack_from(buf, offset + 33)
+        return ("D", _MS3HEAD_LEN + sidlen + extralen + datalen)
+
+    if len(buf) - offset < _FIXHEAD_LEN:
+        return (None, None)
+
+    rectype = chr(buf[offset + 6])
+    (pdata, pblk) = _PTRS.unpack_from(buf, offset + 44)
+
+    pos = pblk
+    while _FIXHEAD_LEN <= pos and pos + _BLKHEAD_LEN <= len(buf) - offset:
+        (blktype, nextblk) = _BLKHEAD.unpack_from(buf, offset + pos)
+        if blktype == 1000:
+            if pos + _BLKHEAD_LEN + _BLK1000_LEN > len(buf) - offset:
+                break
+
+            (_, _, rec_len_exp) = _BLK1000.unpack_from(
+                buf, offset + pos + _BLKHEAD_LEN
+            )
+            if (
+                rec_len_exp < _MIN_RECLEN_EXP
+                or rec_len_exp > _MAX_RECLEN_EXP
+                or (1 << rec_len_exp) < max(pdata, _FIXHEAD_LEN)
+            ):
+                break
+
+            return (rectype, 1 << rec_len_exp)
+
+        if nextblk <= pos:
+            break
+
+        pos = nextblk
+
+    return (rectype, None)
+
+
+def _plausible_header(buf, offset):
+    """True if a plausible data record header starts at offset."""
+    if len(buf) - offset < _FIXHEAD_LEN or not _HEADER_RX.match(buf, offset):
+        return False
+
+    if buf[offset : offset + 3] == b"MS\x03":
+        (_, _, _, nanosec, year, doy, hour, minute, second) = _MS3HEAD.unpack_from(
+            buf, offset
+        )[:9]
+        tms = nanosec // 100000
+    else:
+        (year, doy, hour, minute, second, tms) = _BTIME.unpack_from(
+            buf, offset + 20
+        )
+
+    return (
+        _YEAR_MIN <= year <= _YEAR_MAX
+        and 1 <= doy <= 366
+        and hour < 24
+        and minute < 60
+        and second <= 60
+        and tms < 10000
+    )
+
+
+def _find_header(buf, start, limit):
+    """Offset of the first plausible data record header in [start, limit]."""
+    m = _HEADER_RX.search(buf, start)
+    while m is not None and m.start() <= limit:
+        if _plausible_header(buf, m.start()):
+            return m.start()
+
+        m = _HEADER_RX.search(buf, m.start() + 1)
+
+    return None
+
+
+def _resync(src, fd, lazy, stats, select=None):
+    """Iterate over (offset, record) pairs, skipping over corrupt data.
+
+    src is the initial buffer and fd an optional file to read more data
+    from. After a corrupt record, parsing resumes at the next plausible
+    fixed header. The skipped_bytes and skipped_records counters of stats
+    are updated. Records rejected by the RecordFilter select are skipped
+    and counted in filtered_records.
+    """
+    buf = src
+    pos = 0
+    base = 0
+    eof = fd is None
+
+    while True:
+        if not eof and len(buf) - pos < _MAX_RECLEN:
+            chunk = fd.read(_RESYNC_CHUNK)
+            eof = len(chunk) == 0
+            base += pos
+            buf = bytes(buf[pos:]) + chunk
+            pos = 0
+            continue
+
+        (_, length) = _record_length(memoryview(buf), pos)
+        if (
+            not eof
+            and length is not None
+            and len(buf) - pos < length <= _MS3_MAX_RECLEN
+        ):
+            chunk = fd.read(length - (len(buf) - pos))
+            eof = len(chunk) == 0
+            base += pos
+            buf = bytes(buf[pos:]) + chunk
+            pos = 0
+            continue
+
+        if pos >= len(buf):
+            return
+
+        if select is not None and not select.accept(buf, pos):
+            if length is not None and pos + length <= len(buf):
+                stats.filtered_records += 1
+                pos += length
+                continue
+
+        try:
+            rec = Record(buf, pos, lazy)
+
+        except MSeedNoData:
+            (_, length) = _record_length(memoryview(buf), pos)
+            if length is not None and pos + length <= len(buf):
+                pos += length
+                continue
+
+            stats.skipped_records += 1
+
+        except MSeedError:
+            stats.skipped_records += 1
+
+        else:
+            if select is None or select.match(rec):
+                yield (base + pos, rec)
+            else:
+                stats.filtered_records += 1
+
+            pos += rec.size
+            continue
+
+        while True:
+            limit = len(buf) - _FIXHEAD_LEN
+            nxt = _find_header(buf, pos + 1, limit)
+            if nxt is not None:
+                stats.skipped_bytes += nxt - pos
+                pos = nxt
+                break
+
+            if eof:
+                stats.skipped_bytes += len(buf) - pos
+                return
+
+            # keep the tail, it may hold the start of a header
+            nxt = max(pos + 1, limit + 1)
+            stats.skipped_bytes += nxt - pos
+            chunk = fd.read(_RESYNC_CHUNK)
+            eof = len(chunk) == 0
+            base += nxt
+            buf = bytes(buf[nxt:]) + chunk
+            pos = 0
 
 
 class EndOfData(Exception):
@@ -79,24 +604,46 @@ class MSeedNoData(MSeedError):
 class Record(object):
     """Mini-SEED record."""
 
-    def __init__(self, src):
-        """Create a Mini-SEED record from a file handle or a bitstream."""
-        if type(src) == bytes:
-            fd = BytesIO(src)
+    def __init__(self, src, offset=0, lazy=False):
+        """Create a Mini-SEED record from a file handle or a bitstream.
+
+        A bitstream may be any object supporting the buffer protocol (bytes,
+        bytearray, memoryview, mmap). In that case the record is parsed in
+        place starting at offset, without copying the underlying data.
+
+        Times are kept as integer nanoseconds (begin_ns, end_ns); the
+        begin_time and end_time datetimes are computed on first access. If
+        lazy is True, only the header is decoded and the payload and Steim
+        frame fields are computed on first access as well.
+
+        Both SEED 2.x and miniSEED 3 records are accepted; the format is
+        detected per record and stored in the format attribute.
+        """
+        if isinstance(src, _BUFFER_TYPES):
+            fd = None
+            buf = memoryview(src)[offset:]
+            if len(buf) == 0:
+                raise EndOfData
+
         elif hasattr(src, "read"):
             fd = src
+            buf = bytearray(fd.read(_MS3HEAD_LEN))
+            if len(buf) == 0:
+                # FIXME Check if there is no better option, but NOT StopIteration!
+                raise EndOfData
+
         else:
             raise TypeError("argument is neither bytes nor a file object")
 
-        # self.header = ""
-        self.header = bytes()
-        fixhead = fd.read(_FIXHEAD_LEN)
+        if buf[:3] == b"MS\x03":
+            self.__init_v3(buf, fd, lazy)
+            return
 
-        if len(fixhead) == 0:
-            # FIXME Check if there is no better option, but NOT StopIteration!
-            raise EndOfData
+        self.format = 2
+        self.__sid = None
+        self.__extra = None
 
-        if len(fixhead) < _FIXHEAD_LEN:
+        if not _fill(buf, fd, _FIXHEAD_LEN):
             raise MSeedError("unexpected end of header")
 
         (
@@ -122,9 +669,9 @@ class Record(object):
             self.time_correction,
             self.__pdata,
             self.__pblk,
-        ) = struct.unpack(">6scx5s2s3s2s2H3Bx2H2h4Bl2H", fixhead)
+        ) = _FIXHEAD.unpack_from(buf)
 
-        if sys.version_info[0] > 2:
+        try:
             recno_str = recno_str.decode("utf-8")
             self.rectype = self.rectype.decode("utf-8")
             sta = sta.decode("utf-8")
@@ -132,10 +679,12 @@ class Record(object):
             cha = cha.decode("utf-8")
             net = net.decode("utf-8")
 
-        self.header += fixhead
+        except UnicodeDecodeError:
+            raise MSeedError("invalid header")
 
         if self.rectype not in ("D", "R", "Q", "M"):
-            fd.read(_MAX_RECLEN - _FIXHEAD_LEN)
+            if fd is not None:
+                fd.read(_DEFAULT_RECLEN - _FIXHEAD_LEN)
             raise MSeedNoData("non-data record")
 
         if self.__pdata >= _MAX_RECLEN:
@@ -151,16 +700,8 @@ class Record(object):
                 f"invalid pointer at {net.strip()}.{sta.strip()}.{loc.strip()}.{cha.strip()}"
             )
 
-        if self.__pblk == 0:
-            blklen = 0
-        else:
-            blklen = self.__pdata - self.__pblk
-            gaplen = self.__pblk - _FIXHEAD_LEN
-            gap = fd.read(gaplen)
-            if len(gap) < gaplen:
-                raise MSeedError("unexpected end of data")
-
-            self.header += gap
+        if not _fill(buf, fd, self.__pdata):
+            raise MSeedError("unexpected end of data")
 
         # defaults
         self.encoding = 11
@@ -173,95 +714,59 @@ class Record(object):
         self.__micros_idx = None
         self.__nframes_idx = None
 
-        pos = 0
-        while pos < blklen:
-            blkhead = fd.read(_BLKHEAD_LEN)
-            if len(blkhead) < _BLKHEAD_LEN:
-                raise MSeedError(f"unexpected end of blockettes at{pos}{len(blkhead)}")
+        pos = self.__pblk
+        while 0 < pos < self.__pdata:
+            if pos + _BLKHEAD_LEN > self.__pdata:
+                raise MSeedError("corrupt record")
 
-            (blktype, nextblk) = struct.unpack(">2H", blkhead)
-            self.header += blkhead
+            (blktype, nextblk) = _BLKHEAD.unpack_from(buf, pos)
             pos += _BLKHEAD_LEN
 
             if blktype == 1000:
-                blk1000 = fd.read(_BLK1000_LEN)
-                if len(blk1000) < _BLK1000_LEN:
-                    raise MSeedError(
-                        f"unexpected end of blockettes at {pos}{len(blk1000)}"
-                    )
+                if pos + _BLK1000_LEN > self.__pdata:
+                    raise MSeedError("corrupt record")
 
-                (self.encoding, self.byteorder, rec_len_exp) = struct.unpack(
-                    ">3Bx", blk1000
+                (self.encoding, self.byteorder, rec_len_exp) = _BLK1000.unpack_from(
+                    buf, pos
                 )
 
-                self.__rec_len_exp_idx = self.__pblk + pos + 2
-                self.header += blk1000
+                self.__rec_len_exp_idx = pos + 2
                 pos += _BLK1000_LEN
 
             elif blktype == 1001:
-                blk1001 = fd.read(_BLK1001_LEN)
-                if len(blk1001) < _BLK1001_LEN:
-                    raise MSeedError(
-                        f"unexpected end of blockettes at {pos}{len(blk1001)}"
-                    )
+                if pos + _BLK1001_LEN > self.__pdata:
+                    raise MSeedError("corrupt record")
 
-                (self.time_quality, micros, self.nframes) = struct.unpack(
-                    ">BbxB", blk1001
+                (self.time_quality, micros, self.nframes) = _BLK1001.unpack_from(
+                    buf, pos
                 )
 
-                self.__micros_idx = self.__pblk + pos + 1
-                self.__nframes_idx = self.__pblk + pos + 3
-                self.header += blk1001
+                self.__micros_idx = pos + 1
+                self.__nframes_idx = pos + 3
                 pos += _BLK1001_LEN
 
             if nextblk == 0:
                 break
 
-            if nextblk < self.__pblk + pos or nextblk >= self.__pdata:
+            if nextblk < pos or nextblk >= self.__pdata:
                 raise MSeedError("invalid pointers")
 
-            gaplen = nextblk - (self.__pblk + pos)
-            gap = fd.read(gaplen)
-            if len(gap) < gaplen:
-                raise MSeedError("unexpected end of data")
-
-            self.header += gap
-            pos += gaplen
+            pos = nextblk
 
-        if pos > blklen:
-            raise MSeedError("corrupt record")
-
-        gaplen = self.__pdata - len(self.header)
-        gap = fd.read(gaplen)
-        if len(gap) < gaplen:
-            raise MSeedError("unexpected end of data")
+        try:
+            self.recno = int(recno_str)
 
-        self.header += gap
-        pos += gaplen
+        except ValueError:
+            raise MSeedError(f"invalid sequence number '{recno_str}'")
 
-        self.recno = int(recno_str)
         self.net = net.strip()
         self.sta = sta.strip()
         self.loc = loc.strip()
         self.cha = cha.strip()
 
-        if (self.sr_factor > 0) and (self.sr_mult > 0):
-            self.samprate_num = self.sr_factor * self.sr_mult
-            self.samprate_denom = 1
-        elif (self.sr_factor > 0) and (self.sr_mult < 0):
-            self.samprate_num = self.sr_factor
-            self.samprate_denom = -self.sr_mult
-        elif (self.sr_factor < 0) and (self.sr_mult > 0):
-            self.samprate_num = self.sr_mult
-            self.samprate_denom = -self.sr_factor
-        elif (self.sr_factor < 0) and (self.sr_mult < 0):
-            self.samprate_num = 1
-            self.samprate_denom = self.sr_factor * self.sr_mult
-        else:
-            self.samprate_num = 0
-            self.samprate_denom = 1
-
-        self.fsamp = float(self.samprate_num) / float(self.samprate_denom)
+        (self.samprate_num, self.samprate_denom) = _samprate(
+            self.sr_factor, self.sr_mult
+        )
 
         # quick fix to avoid exception from datetime
         if bt_second > 59:
@@ -270,156 +775,403 @@ class Record(object):
         else:
             self.leap = 0
 
-        try:
-            (month, day) = _dy2mdy(bt_doy, bt_year)
-            self.begin_time = datetime.datetime(
-                bt_year, month, day, bt_hour, bt_minute, bt_second
+        if (
+            bt_year < 1
+            or bt_year > 9999
+            or bt_doy < 1
+            or bt_doy > 365 + _is_leap(bt_year)
+            or bt_hour > 23
+            or bt_minute > 59
+            or bt_tms > 9999
+        ):
+            raise MSeedError(
+                f"invalid time: {bt_year},{bt_doy},"
+                f"{bt_hour:02d}:{bt_minute:02d}:{bt_second:02d}.{bt_tms:04d}"
             )
 
-            self.begin_time += datetime.timedelta(microseconds=bt_tms * 100 + micros)
+        self.__begin_ns = (
+            _btime2ns(bt_year, bt_doy, bt_hour, bt_minute, bt_second, bt_tms)
+            + micros * 1000
+        )
+        self.__end_ns = self.__begin_ns + _span_ns(
+            self.nsamp, self.samprate_num, self.samprate_denom
+        )
+        self.__begin_time = None
+        self.__end_time = None
 
-            if (self.nsamp != 0) and (self.fsamp != 0):
-                msAux = 1000000 * self.nsamp / self.fsamp
-                self.end_time = self.begin_time + datetime.timedelta(microseconds=msAux)
-            else:
-                self.end_time = self.begin_time
+        self.size = 1 << rec_len_exp
+        if (
+            (self.size < self.__pdata)
+            or (rec_len_exp < _MIN_RECLEN_EXP)
+            or (rec_len_exp > _MAX_RECLEN_EXP)
+        ):
+            raise MSeedError("invalid record size")
 
-        except ValueError as e:
-            raise MSeedError(f"invalid time: {str(e)}")
+        if self.size - self.__pdata < _FRAMEHEAD_LEN or not _fill(buf, fd, self.size):
+            raise MSeedError("unexpected end of data")
 
-        self.size = 1 << rec_len_exp
-        if (self.size < len(self.header)) or (self.size > _MAX_RECLEN):
+        # The record keeps a view on its own bytes only; header and data are
+        # materialized on first access.
+        self.__rec = memoryview(buf)[: self.size]
+        self.__header = None
+        self.__data = None
+        self.__frame = None
+
+        if (self.nframes is None) or (self.nframes == 0):
+            self.nframes = (self.size - self.__pdata) // _FRAME_LEN
+            pos = self.__pdata + self.nframes * _FRAME_LEN
+            # count the Steim frames up to the last one that is not zero
+            # padding; samples of other encodings may well be zero
+            while (
+                self.encoding in _STEIM_ENCODINGS
+                and self.nframes > 1
+                and self.__rec[pos - _FRAME_LEN : pos] == _ZEROS[:_FRAME_LEN]
+            ):
+                self.nframes -= 1
+                pos -= _FRAME_LEN
+
+        if not lazy:
+            self.__decode_frame()
+
+    def __init_v3(self, buf, fd, lazy):
+        """Parse a miniSEED 3 record."""
+        if not _fill(buf, fd, _MS3HEAD_LEN):
+            raise MSeedError("unexpected end of header")
+
+        (
+            _,
+            _,
+            flags,
+            nanosec,
+            year,
+            doy,
+            hour,
+            minute,
+            second,
+            self.encoding,
+            rate,
+            self.nsamp,
+            _,
+            pubversion,
+            sidlen,
+            extralen,
+            datalen,
+        ) = _MS3HEAD.unpack_from(buf)
+
+        self.format = 3
+        self.__pdata = _MS3HEAD_LEN + sidlen + extralen
+        self.__pblk = 0
+        self.size = self.__pdata + datalen
+        if self.size > _MS3_MAX_RECLEN:
             raise MSeedError("invalid record size")
 
-        datalen = self.size - self.__pdata
-        self.data = fd.read(datalen)
-        if len(self.data) < datalen:
+        if not _fill(buf, fd, self.size):
             raise MSeedError("unexpected end of data")
 
-        if len(self.header) + len(self.data) != self.size:
-            raise MSeedError("internal error")
-
-        (self.X0, self.Xn) = struct.unpack(">ll", self.data[4:12])
-
-        (w0,) = struct.unpack(">L", self.data[:4])
-        (w3,) = struct.unpack(">L", self.data[12:16])
-        c3 = (w0 >> 24) & 0x3
-        d0 = None
-
-        if self.encoding == 10:
-            # """STEIM (1) Compression?"""
-            if c3 == 1:
-                d0 = (w3 >> 24) & 0xFF
-                if d0 > 0x7F:
-                    d0 -= 0x100
-            elif c3 == 2:
-                d0 = (w3 >> 16) & 0xFFFF
-                if d0 > 0x7FFF:
-                    d0 -= 0x10000
-            elif c3 == 3:
-                d0 = w3 & 0xFFFFFFFF
-                if d0 > 0x7FFFFFFF:
-                    d0 -= 0xFFFFFFFF
-                    d0 -= 1
-
-        elif self.encoding == 11:
-            # """STEIM (2) Compression?"""
-            if c3 == 1:
-                d0 = (w3 >> 24) & 0xFF
-                if d0 > 0x7F:
-                    d0 -= 0x100
-            elif c3 == 2:
-                dnib = (w3 >> 30) & 0x3
-                if dnib == 1:
-                    d0 = w3 & 0x3FFFFFFF
-                    if d0 > 0x1FFFFFFF:
-                        d0 -= 0x40000000
-                elif dnib == 2:
-                    d0 = (w3 >> 15) & 0x7FFF
-                    if d0 > 0x3FFF:
-                        d0 -= 0x8000
-                elif dnib == 3:
-                    d0 = (w3 >> 20) & 0x3FF
-                    if d0 > 0x1FF:
-                        d0 -= 0x400
-            elif c3 == 3:
-                dnib = (w3 >> 30) & 0x3
-                if dnib == 0:
-                    d0 = (w3 >> 24) & 0x3F
-                    if d0 > 0x1F:
-                        d0 -= 0x40
-                elif dnib == 1:
-                    d0 = (w3 >> 25) & 0x1F
-                    if d0 > 0xF:
-                        d0 -= 0x20
-                elif dnib == 2:
-                    d0 = (w3 >> 24) & 0xF
-                    if d0 > 0x7:
-                        d0 -= 0x10
+        self.__rec = memoryview(buf)[: self.size]
+        (crc,) = _UINT32LE.unpack_from(buf, _MS3_CRC_IDX)
+        # the CRC field counts as zero
+        value = _crc32c(self.__rec[:_MS3_CRC_IDX])
+        value = _crc32c(_ZEROS[:4], value)
+        if crc != _crc32c(self.__rec[_MS3_CRC_IDX + 4 :], value):
+            raise MSeedError("CRC mismatch")
+
+        self.__header = None
+        self.__data = None
+        self.__frame = None
+
+        try:
+            self.__sid = bytes(
+                self.__rec[_MS3HEAD_LEN : _MS3HEAD_LEN + sidlen]
+            ).decode("utf-8")
+
+        except UnicodeDecodeError:
+            raise MSeedError("invalid source identifier")
+
+        (self.net, self.sta, self.loc, self.cha) = _split_sid(self.__sid)
+        self.rectype = _QUALITY.get(pubversion, "D")
+        self.recno = 0
+
+        self.__extra = None
+        self.__extra_idx = _MS3HEAD_LEN + sidlen
+        self.time_quality = -1
+        if extralen > 0:
+            tq = self.extra.get("FDSN", {}).get("Time", {}).get("Quality")
+            if isinstance(tq, int):
+                self.time_quality = tq
+
+        # map the flags to SEED 2.x activity, I/O and data quality flags
+        self.aflgs = flags & 0x01
+        self.cflgs = 0x20 if flags & 0x04 else 0
+        self.qflgs = 0x80 if flags & 0x02 else 0
+        self.time_correction = 0
+        self.__num_blk = 0
+        self.__rec_len_exp_idx = None
+        self.__micros_idx = None
+        self.__nframes_idx = None
+
+        self.byteorder = 1 if self.encoding in _STEIM_ENCODINGS else 0
+        if self.encoding in _STEIM_ENCODINGS:
+            self.nframes = datalen // _FRAME_LEN
+        else:
+            self.nframes = 0
+
+        if rate < 0:
+            rate = -1.0 / rate
+
+        (self.sr_factor, self.sr_mult, self.samprate_num, self.samprate_denom) = (
+            _factmult(rate)
+        )
+
+        if second > 59:
+            self.leap = second - 59
+            second = 59
+        else:
+            self.leap = 0
+
+        if (
+            year < 1
+            or year > 9999
+            or doy < 1
+            or doy > 365 + _is_leap(year)
+            or hour > 23
+            or minute > 59
+            or nanosec > 999999999
+        ):
+            raise MSeedError(
+                f"invalid time: {year},{doy},"
+                f"{hour:02d}:{minute:02d}:{second:02d}.{nanosec:09d}"
+            )
+
+        self.__begin_ns = _btime2ns(year, doy, hour, minute, second, 0) + nanosec
+        self.__end_ns = self.__begin_ns + _span_ns(
+            self.nsamp, self.samprate_num, self.samprate_denom
+        )
+        self.__begin_time = None
+        self.__end_time = None
+
+        if not lazy:
+            self.__decode_frame()
+
+    def __decode_frame(self):
+        """Decode X0, Xn and X[-1] from the first data frame."""
+        if self.size - self.__pdata < _FRAMEHEAD_LEN:
+            self.__frame = [None, None, None]
+            return
+
+        (w0, X0, Xn, w3) = _FRAMEHEAD.unpack_from(self.__rec, self.__pdata)
+
+        d0 = _steim_d0(self.encoding, (w0 >> 24) & 0x3, w3)
 
         if d0 is not None:
-            self.X_minus1 = self.X0 - d0
+            X_minus1 = X0 - d0
         else:
-            self.X_minus1 = None
+            X_minus1 = None
 
-        if (self.nframes is None) or (self.nframes == 0):
-            i = 0
-            self.nframes = 0
-            while i < len(self.data):
-                if self.data[i] == "\0":
-                    break
+        self.__frame = [X0, Xn, X_minus1]
+
+    @property
+    def fsamp(self):
+        """Sampling rate in Hz."""
+        return float(self.samprate_num) / float(self.samprate_denom)
+
+    @property
+    def begin_ns(self):
+        """Start time of the record in nanoseconds since the epoch."""
+        return self.__begin_ns
+
+    @begin_ns.setter
+    def begin_ns(self, value):
+        self.__begin_ns = value
+        self.__begin_time = None
+
+    @property
+    def end_ns(self):
+        """End time of the record in nanoseconds since the epoch."""
+        return self.__end_ns
+
+    @end_ns.setter
+    def end_ns(self, value):
+        self.__end_ns = value
+        self.__end_time = None
+
+    @property
+    def begin_time(self):
+        """Start time of the record as datetime."""
+        if self.__begin_time is None:
+            self.__begin_time = _ns2dt(self.__begin_ns)
+
+        return self.__begin_time
+
+    @begin_time.setter
+    def begin_time(self, value):
+        self.__begin_ns = _dt2ns(value)
+        self.__begin_time = value
+
+    @property
+    def end_time(self):
+        """End time of the record as datetime."""
+        if self.__end_time is None:
+            self.__end_time = _ns2dt(self.__end_ns)
+
+        return self.__end_time
+
+    @end_time.setter
+    def end_time(self, value):
+        self.__end_ns = _dt2ns(value)
+        self.__end_time = value
+
+    @property
+    def X0(self):
+        """First sample of the record (Steim)."""
+        if self.__frame is None:
+            self.__decode_frame()
+
+        return self.__frame[0]
+
+    @X0.setter
+    def X0(self, value):
+        if self.__frame is None:
+            self.__decode_frame()
+
+        self.__frame[0] = value
+
+    @property
+    def Xn(self):
+        """Last sample of the record (Steim)."""
+        if self.__frame is None:
+            self.__decode_frame()
+
+        return self.__frame[1]
+
+    @Xn.setter
+    def Xn(self, value):
+        if self.__frame is None:
+            self.__decode_frame()
+
+        self.__frame[1] = value
+
+    @property
+    def X_minus1(self):
+        """Last sample of the previous record (Steim), None if unknown."""
+        if self.__frame is None:
+            self.__decode_frame()
+
+        return self.__frame[2]
+
+    @property
+    def header(self):
+        """Fixed header and blockettes of the record as bytes."""
+        if self.__header is None:
+            self.__header = bytes(self.__rec[: self.__pdata])
+
+        return self.__header
+
+    @header.setter
+    def header(self, value):
+        self.__header = value
+
+    @property
+    def data(self):
+        """Data section of the record as bytes."""
+        if self.__data is None:
+            self.__data = bytes(self.__rec[self.__pdata :])
+
+        return self.__data
+
+    @data.setter
+    def data(self, value):
+        self.__data = value
+
+    @property
+    def payload(self):
+        """Data section of the record as memoryview, without copying."""
+        if self.__data is None:
+            return self.__rec[self.__pdata :]
+
+        return memoryview(self.__data)
+
+    @property
+    def raw(self):
+        """Record as read from the source, as memoryview without copying.
+
+        Modified header fields or data are not reflected; use write() or
+        pack_into() to serialize a modified record.
+        """
+        return self.__rec
+
+    @property
+    def sid(self):
+        """FDSN source identifier of the record."""
+        if self.__sid is None:
+            if len(self.cha) == 3:
+                cha = "_".join(self.cha)
+            else:
+                cha = self.cha
+
+            return f"FDSN:{self.net}_{self.sta}_{self.loc}_{cha}"
+
+        return self.__sid
 
-                i += 64
-                self.nframes += 1
+    @property
+    def extra(self):
+        """Extra headers of a miniSEED 3 record as dict."""
+        if self.__extra is None:
+            self.__extra = {}
+            if self.format == 3 and self.__pdata > self.__extra_idx:
+                try:
+                    self.__extra = json.loads(
+                        bytes(self.__rec[self.__extra_idx : self.__pdata])
+                    )
+
+                except ValueError:
+                    raise MSeedError("invalid extra headers")
+
+        return self.__extra
 
     def merge(self, rec):
         """Caller is expected to check for contiguity of data.
 
-        Check if rec.nframes * 64 <= len(data)?
+        Check if rec.nframes * 64 <= len(data)? The merged record may grow up
+        to the maximum record length of 65536 bytes.
         """
         (self.Xn,) = struct.unpack(">l", rec.data[8:12])
-        self.data += rec.data[: rec.nframes * 64]
+        self.data += rec.data[: rec.nframes * _FRAME_LEN]
         self.nframes += rec.nframes
         self.nsamp += rec.nsamp
         self.size = len(self.header) + len(self.data)
-        self.end_time = rec.end_time
+        self.end_ns = rec.end_ns
 
-    def write(self, fd, rec_len_exp):
-        """Write the record to an already opened file."""
-        if self.size > (1 << rec_len_exp):
+    def pack_into(self, buf, offset, rec_len_exp):
+        """Serialize the record into buf at offset.
+
+        The record is padded to 2^rec_len_exp bytes. Blockette fields are
+        patched in place. Returns the number of bytes written.
+        """
+        reclen = 1 << rec_len_exp
+        if self.format == 3:
+            return self.__pack_v2_into(buf, offset, rec_len_exp)
+
+        if self.size > reclen:
             raise MSeedError(
-                f"record is larger than requested write size: {self.size} > {1 << rec_len_exp}"
+                f"record is larger than requested write size: {self.size} > {reclen}"
             )
 
-        recno_str = bytes(("%06d" % (self.recno,)).encode("utf-8"))
-        sta = bytes(("%-5.5s" % (self.sta,)).encode("utf-8"))
-        loc = bytes(("%-2.2s" % (self.loc,)).encode("utf-8"))
-        cha = bytes(("%-3.3s" % (self.cha,)).encode("utf-8"))
-        net = bytes(("%-2.2s" % (self.net,)).encode("utf-8"))
-        bt_year = self.begin_time.year
-        bt_doy = _mdy2dy(
-            self.begin_time.month, self.begin_time.day, self.begin_time.year
-        )
-        bt_hour = self.begin_time.hour
-        bt_minute = self.begin_time.minute
-        bt_second = self.begin_time.second + self.leap
-        bt_tms = self.begin_time.microsecond // 100
-        micros = self.begin_time.microsecond % 100
-
-        # This is just to make it Python 2 AND 3 compatible (str vs. bytes)
-        rectype = (
-            self.rectype.encode("utf-8") if sys.version_info[0] > 2 else self.rectype
+        (bt_year, bt_doy, bt_hour, bt_minute, bt_second, bt_tms, micros) = _ns2btime(
+            self.__begin_ns
         )
+        bt_second += self.leap
 
-        buf = struct.pack(
-            ">6s2c5s2s3s2s2H3Bx2H2h4Bl2H",
-            recno_str,
-            rectype,
+        _FIXHEAD_OUT.pack_into(
+            buf,
+            offset,
+            ("%06d" % (self.recno,)).encode("utf-8"),
+            self.rectype.encode("utf-8"),
             b" ",
-            sta,
-            loc,
-            cha,
-            net,
+            ("%-5.5s" % (self.sta,)).encode("utf-8"),
+            ("%-2.2s" % (self.loc,)).encode("utf-8"),
+            ("%-3.3s" % (self.cha,)).encode("utf-8"),
+            ("%-2.2s" % (self.net,)).encode("utf-8"),
             bt_year,
             bt_doy,
             bt_hour,
@@ -437,49 +1189,550 @@ class Record(object):
             self.__pdata,
             self.__pblk,
         )
-        fd.write(buf)
 
-        buf = list(self.header[_FIXHEAD_LEN:])
+        if self.__header is None:
+            buf[offset + _FIXHEAD_LEN : offset + self.__pdata] = self.__rec[
+                _FIXHEAD_LEN : self.__pdata
+            ]
+        else:
+            buf[offset + _FIXHEAD_LEN : offset + self.__pdata] = self.__header[
+                _FIXHEAD_LEN:
+            ]
 
         if self.__rec_len_exp_idx is not None:
-            buf[self.__rec_len_exp_idx - _FIXHEAD_LEN] = struct.pack(">B", rec_len_exp)
+            _UBYTE.pack_into(buf, offset + self.__rec_len_exp_idx, rec_len_exp)
 
         if self.__micros_idx is not None:
-            buf[self.__micros_idx - _FIXHEAD_LEN] = struct.pack(">b", micros)
+            _BYTE.pack_into(buf, offset + self.__micros_idx, micros)
 
         if self.__nframes_idx is not None:
-            buf[self.__nframes_idx - _FIXHEAD_LEN] = struct.pack(">B", self.nframes)
+            _UBYTE.pack_into(
+                buf, offset + self.__nframes_idx, _frame_count(self.nframes)
+            )
 
-        ba = bytearray()
-        for b in buf:
-            try:
-                ba.append(b)
-            except Exception:
-                ba.append(int.from_bytes(b, byteorder="big"))
-        fd.write(ba)
-
-        buf = (
-            self.data[:4]
-            + struct.pack(">ll", self.X0, self.Xn)
-            + self.data[12:]
-            + ((1 << rec_len_exp) - self.size) * b"\0"
+        return self.__pack_payload(buf, offset, self.__pdata, reclen)
+
+    def __pack_v2_into(self, buf, offset, rec_len_exp):
+        """Serialize a miniSEED 3 record as SEED 2.x record."""
+        reclen = 1 << rec_len_exp
+        pdata = _FIXHEAD_LEN + 2 * _BLKHEAD_LEN + _BLK1000_LEN + _BLK1001_LEN
+        size = pdata + len(self.payload)
+        if size > reclen:
+            raise MSeedError(
+                f"record is larger than requested write size: {size} > {reclen}"
+            )
+
+        buf[offset : offset + pdata] = _pack_header(
+            self.recno,
+            self.rectype,
+            self.net,
+            self.sta,
+            self.loc,
+            self.cha,
+            self.__begin_ns,
+            self.nsamp,
+            self.sr_factor,
+            self.sr_mult,
+            self.encoding,
+            rec_len_exp,
+            self.nframes,
+            self.byteorder,
+            (self.aflgs, self.cflgs, self.qflgs),
+            max(self.time_quality, 0),
         )
 
+        if self.leap:
+            _UBYTE.pack_into(buf, offset + 24, 59 + self.leap)
+
+        return self.__pack_payload(buf, offset, pdata, reclen)
+
+    def __pack_payload(self, buf, offset, pdata, reclen):
+        """Copy the data section to buf, patch X0/Xn and pad to reclen."""
+        pos = offset + pdata
+        data = self.payload
+        buf[pos : pos + len(data)] = data
+        if self.X0 is not None:
+            _X0XN.pack_into(buf, pos + 4, self.X0, self.Xn)
+
+        pos += len(data)
+        buf[pos : offset + reclen] = _ZEROS[: offset + reclen - pos]
+
+        return reclen
+
+    def pack_v3(self):
+        """Serialize the record as miniSEED 3 record and return it as bytes.
+
+        Uncompressed samples are converted to little-endian byte order and
+        the CRC-32C checksum is computed over the complete record.
+        """
+        sid = self.sid.encode("utf-8")
+
+        if self.format == 3 and self.__extra is None:
+            extra = bytes(self.__rec[self.__extra_idx : self.__pdata])
+
+        else:
+            if self.format == 3:
+                extra = self.__extra
+            elif self.time_quality > 0:
+                extra = {"FDSN": {"Time": {"Quality": self.time_quality}}}
+            else:
+                extra = None
+
+            if extra:
+                extra = json.dumps(extra, separators=(",", ":")).encode("utf-8")
+            else:
+                extra = b""
+
+        if self.encoding in _STEIM_ENCODINGS:
+            data = bytearray(self.payload[: self.nframes * _FRAME_LEN])
+            if self.X0 is not None and len(data) >= _FRAMEHEAD_LEN:
+                _X0XN.pack_into(data, 4, self.X0, self.Xn)
+
+        elif self.byteorder == 1 and self.encoding in _SAMPLE_SIZE:
+            samples = array.array(_SAMPLE_SIZE[self.encoding])
+            samples.frombytes(
+                self.payload[: self.nsamp * samples.itemsize].tobytes()
+            )
+            if sys.byteorder == "little":
+                samples.byteswap()
+
+            data = samples.tobytes()
+
+        elif self.encoding in _SAMPLE_SIZE:
+            data = self.payload[
+                : self.nsamp * struct.calcsize(_SAMPLE_SIZE[self.encoding])
+            ].tobytes()
+
+        else:
+            data = self.payload.tobytes()
+
+        if self.sr_factor == 0 or self.sr_mult == 0:
+            rate = 0.0
+        else:
+            rate = self.samprate_num / self.samprate_denom
+            if 0 < rate < 1:
+                rate = -self.samprate_denom / self.samprate_num
+
+        (year, doy, hour, minute, second, tms, micros) = _ns2btime(self.__begin_ns)
+        flags = (
+            (self.aflgs & 0x01)
+            | (0x02 if self.qflgs & 0x80 else 0)
+            | (0x04 if self.cflgs & 0x20 else 0)
+        )
+
+        rec = bytearray(_MS3HEAD_LEN + len(sid) + len(extra) + len(data))
+        _MS3HEAD.pack_into(
+            rec,
+            0,
+            b"MS",
+            3,
+            flags,
+            self.__begin_ns % 1000000000,
+            year,
+            doy,
+            hour,
+            minute,
+            second + self.leap,
+            self.encoding,
+            rate,
+            self.nsamp,
+            0,
+            _PUBVERSION.get(self.rectype, 1),
+            len(sid),
+            len(extra),
+            len(data),
+        )
+
+        pos = _MS3HEAD_LEN
+        rec[pos : pos + len(sid)] = sid
+        pos += len(sid)
+        rec[pos : pos + len(extra)] = extra
+        pos += len(extra)
+        rec[pos:] = data
+        _UINT32LE.pack_into(rec, _MS3_CRC_IDX, _crc32c(rec))
+
+        return bytes(rec)
+
+    def patch_time(self, buf, offset=0):
+        """Write the begin time into a copy of the raw record at offset.
+
+        Only the start time of the fixed header and the microseconds of
+        blockette 1001 are changed, so that a record shifted in time can be
+        written from its raw bytes without being serialized again.
+        """
+        if self.format == 3:
+            raise MSeedError("cannot patch the time of a miniSEED 3 record")
+
+        (bt_year, bt_doy, bt_hour, bt_minute, bt_second, bt_tms, micros) = _ns2btime(
+            self.__begin_ns
+        )
+        _BTIME.pack_into(
+            buf,
+            offset + 20,
+            bt_year,
+            bt_doy,
+            bt_hour,
+            bt_minute,
+            bt_second + self.leap,
+            bt_tms,
+        )
+
+        if self.__micros_idx is not None:
+            _BYTE.pack_into(buf, offset + self.__micros_idx, micros)
+
+    def write(self, fd, rec_len_exp):
+        """Write the record to an already opened file."""
+        buf = bytearray(1 << rec_len_exp)
+        self.pack_into(buf, 0, rec_len_exp)
         fd.write(buf)
 
+    def write_v3(self, fd):
+        """Write the record to an already opened file as miniSEED 3."""
+        fd.write(self.pack_v3())
+
+
+class RecordWriter(object):
+    """Write records to a file through a preallocated buffer.
+
+    Records are serialized directly into the buffer, which is written to the
+    file in one call whenever it is full.
+    """
+
+    def __init__(self, fd, bufsize=1 << 20):
+        """Create the writer for the file handle passed as parameter."""
+        self.__fd = fd
+        self.__buf = bytearray(max(bufsize, _MAX_RECLEN))
+        self.__pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def write(self, rec, rec_len_exp):
+        """Add a record, padded to 2^rec_len_exp bytes."""
+        if self.__pos + (1 << rec_len_exp) > len(self.__buf):
+            self.flush()
+
+        self.__pos += rec.pack_into(self.__buf, self.__pos, rec_len_exp)
+
+    def write_raw(self, rec):
+        """Add the raw bytes of a miniSEED 2 record with its begin time.
+
+        The record is copied unchanged except for the time fields, see
+        Record.patch_time().
+        """
+        if self.__pos + rec.size > len(self.__buf):
+            self.flush()
+
+        self.__buf[self.__pos : self.__pos + rec.size] = rec.raw
+        rec.patch_time(self.__buf, self.__pos)
+        self.__pos += rec.size
+
+    def write_v3(self, rec):
+        """Add a record in miniSEED 3 format (variable length)."""
+        data = rec.pack_v3()
+        if self.__pos + len(data) > len(self.__buf):
+            self.flush()
+
+        if len(data) > len(self.__buf):
+            self.__fd.write(data)
+
+        else:
+            self.__buf[self.__pos : self.__pos + len(data)] = data
+            self.__pos += len(data)
+
+    def flush(self):
+        """Write the buffered records to the file."""
+        if self.__pos > 0:
+            self.__fd.write(memoryview(self.__buf)[: self.__pos])
+            self.__pos = 0
+
+
+class RecordFilter(object):
+    """Select records by stream, time window, record type and sample rate.
+
+    streams is a pattern or a list of patterns NET.STA.LOC.CHA with
+    shell-style wildcards. Records overlapping [start_ns, end_ns) are
+    selected; None means unbounded. rectypes is a string of accepted
+    record types, e.g. "DQ", and fsamp the sample rate in Hz.
+
+    accept() works on the raw fixed header of a record, so that rejected
+    records can be skipped without being parsed; match() is the exact check
+    of a parsed record.
+    """
+
+    # slack for the blockette 1001 microseconds ignored by accept()
+    _SLACK_NS = 100000
+
+    # size limit of the cache of raw stream codes
+    _MAX_CODES = 100000
+
+    def __init__(
+        self, streams=None, start_ns=None, end_ns=None, rectypes=None, fsamp=None
+    ):
+        if isinstance(streams, str):
+            streams = [streams]
+
+        self.streams = streams
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.rectypes = rectypes
+        self.fsamp = fsamp
+
+        self.__rx = None
+        self.__codes = {}
+        if streams is not None:
+            self.__rx = re.compile(
+                "|".join(f"(?:{fnmatch.translate(p)})" for p in streams).encode(
+                    "utf-8"
+                )
+            )
+
+    def __match_rate(self, num, denom):
+        if num == 0:
+            return self.fsamp == 0
+
+        return abs(num / denom - self.fsamp) <= 1e-6 * max(self.fsamp, 1.0)
+
+    def __match_time(self, begin_ns, end_ns, slack):
+        return (self.start_ns is None or end_ns + slack > self.start_ns) and (
+            self.end_ns is None or begin_ns - slack < self.end_ns
+        )
+
+    def accept(self, buf, offset):
+        """Check the raw header of the record at offset.
+
+        Returns False only if the record is certainly not selected; records
+        with an incomplete or invalid header are accepted, so that the
+        parser can handle them.
+        """
+        try:
+            if buf[offset : offset + 3] == b"MS\x03":
+                return self.__accept_v3(buf, offset)
+
+            if len(buf) - offset < _FIXHEAD_LEN:
+                return True
+
+            rectype = bytes(buf[offset + 6 : offset + 7])
+            if rectype not in (b"D", b"R", b"Q", b"M"):
+                return True
+
+            if self.rectypes is not None and rectype.decode() not in self.rectypes:
+                return False
+
+            if self.__rx is not None:
+                # station, location, channel and network codes as in the header
+                raw = bytes(buf[offset + 8 : offset + 20])
+                selected = self.__codes.get(raw)
+                if selected is None:
+                    if len(self.__codes) >= self._MAX_CODES:
+                        self.__codes.clear()
+
+                    nslc = b".".join(
+                        (
+                            raw[10:12].strip(),
+                            raw[:5].strip(),
+                            raw[5:7].strip(),
+                            raw[7:10].strip(),
+                        )
+                    )
+                    selected = self.__codes[raw] = bool(self.__rx.match(nslc))
+
+                if not selected:
+                    return False
+
+            if self.fsamp is None and self.start_ns is None and self.end_ns is None:
+                return True
+
+            (nsamp, sr_factor, sr_mult) = _NSAMP_RATE.unpack_from(buf, offset + 30)
+            (num, denom) = _samprate(sr_factor, sr_mult)
+            if self.fsamp is not None and not self.__match_rate(num, denom):
+                return False
+
+            if self.start_ns is None and self.end_ns is None:
+                return True
+
+            (year, doy, hour, minute, second, tms) = _BTIME.unpack_from(
+                buf, offset + 20
+            )
+            begin_ns = _btime2ns(year, doy, hour, minute, min(second, 59), tms)
+            return self.__match_time(
+                begin_ns, begin_ns + _span_ns(nsamp, num, denom), self._SLACK_NS
+            )
+
+        except (ValueError, IndexError, struct.error, UnicodeDecodeError):
+            return True
+
+    def __accept_v3(self, buf, offset):
+        if len(buf) - offset < _MS3HEAD_LEN:
+            return True
+
+        (
+            _,
+            _,
+            _,
+            nanosec,
+            year,
+            doy,
+            hour,
+            minute,
+            second,
+            _,
+            rate,
+            nsamp,
+            _,
+            pubversion,
+            sidlen,
+            _,
+            _,
+        ) = _MS3HEAD.unpack_from(buf, offset)
+
+        if self.rectypes is not None and _QUALITY.get(pubversion, "D") not in (
+            self.rectypes
+        ):
+            return False
+
+        if self.__rx is not None:
+            if len(buf) - offset < _MS3HEAD_LEN + sidlen:
+                return True
+
+            sid = bytes(buf[offset + _MS3HEAD_LEN : offset + _MS3HEAD_LEN + sidlen])
+            nslc = ".".join(_split_sid(sid.decode("utf-8")))
+            if not self.__rx.match(nslc.encode("utf-8")):
+                return False
+
+        if rate < 0:
+            rate = -1.0 / rate
+
+        if self.fsamp is not None and not self.__match_rate(rate, 1):
+            return False
+
+        if self.start_ns is None and self.end_ns is None:
+            return True
+
+        begin_ns = _btime2ns(year, doy, hour, minute, min(second, 59), 0) + nanosec
+        end_ns = begin_ns + (int(nsamp * 1e9 / rate) if rate > 0 else 0)
+        return self.__match_time(begin_ns, end_ns, self._SLACK_NS)
+
+    def match(self, rec):
+        """Check a parsed record."""
+        if self.rectypes is not None and rec.rectype not in self.rectypes:
+            return False
+
+        if self.__rx is not None and not self.__rx.match(
+            f"{rec.net}.{rec.sta}.{rec.loc}.{rec.cha}".encode("utf-8")
+        ):
+            return False
+
+        if self.fsamp is not None and not self.__match_rate(
+            rec.samprate_num, rec.samprate_denom
+        ):
+            return False
+
+        return self.__match_time(rec.begin_ns, rec.end_ns, 0)
+
+
+class _Prefixed(object):
+    """File wrapper returning bytes already read before the rest."""
+
+    def __init__(self, head, fd):
+        self.__head = head
+        self.__fd = fd
+
+    def read(self, n):
+        if not self.__head:
+            return self.__fd.read(n)
+
+        data = self.__head[:n]
+        self.__head = self.__head[n:]
+        if len(data) < n:
+            data += self.__fd.read(n - len(data))
+
+        return data
+
 
 class Input(object):
     """Iterate over the available Mini-SEED records."""
 
-    def __init__(self, fd):
-        """Create the iterable from the file handle passed as parameter."""
+    def __init__(self, fd, lazy=False, resync=False, select=None):
+        """Create the iterable from the file handle passed as parameter.
+
+        If lazy is True, records are created in lazy header-only mode. If
+        resync is True, corrupt records are skipped and parsing resumes at
+        the next plausible header; skipped_bytes and skipped_records count
+        the data that was skipped. If select is a RecordFilter, only
+        matching records are returned; the others are skipped after reading
+        their fixed header and counted in filtered_records.
+        """
         self.__fd = fd
+        self.__lazy = lazy
+        self.__resync = resync
+        self.__select = select
+        self.skipped_bytes = 0
+        self.skipped_records = 0
+        self.filtered_records = 0
+
+    def __skip(self, head):
+        """Skip a rejected record whose first bytes are in head.
+
+        Returns False if the record length cannot be determined.
+        """
+        fd = self.__fd
+        if not _fill(head, fd, _FIXHEAD_LEN):
+            return False
+
+        if head[:3] != b"MS\x03":
+            (pdata,) = _UINT16.unpack_from(head, 44)
+            _fill(head, fd, max(pdata, _FIXHEAD_LEN + _BLKHEAD_LEN + _BLK1000_LEN))
+
+        (_, length) = _record_length(memoryview(head), 0)
+        if length is None or length < len(head):
+            return False
+
+        n = length - len(head)
+        try:
+            fd.seek(n, os.SEEK_CUR)
+
+        except (AttributeError, OSError, ValueError):
+            while n > 0:
+                chunk = fd.read(min(n, _RESYNC_CHUNK))
+                if not chunk:
+                    break
+
+                n -= len(chunk)
+
+        self.filtered_records += 1
+        return True
 
     def __iter__(self):
         """Define the iterator."""
+        select = self.__select
+        if self.__resync:
+            for (_, rec) in _resync(b"", self.__fd, self.__lazy, self, select):
+                yield rec
+
+            return
+
         while True:
             try:
-                yield Record(self.__fd)
+                if select is None:
+                    yield Record(self.__fd, lazy=self.__lazy)
+                    continue
+
+                head = bytearray(self.__fd.read(_FIXHEAD_LEN))
+                if head[:3] == b"MS\x03" and len(head) >= _MS3HEAD_LEN:
+                    _fill(head, self.__fd, _MS3HEAD_LEN + head[33])
+
+                if not select.accept(head, 0) and self.__skip(head):
+                    continue
+
+                rec = Record(_Prefixed(bytes(head), self.__fd), lazy=self.__lazy)
+                if select.match(rec):
+                    yield rec
+                else:
+                    self.filtered_records += 1
 
             except EndOfData:
                 # This change follows new PEP-479, where it is explicitly forbidden to
@@ -489,3 +1742,158 @@ class Input(object):
 
             except MSeedNoData:
                 pass
+
+
+class MappedInput(object):
+    """Iterate over the Mini-SEED records of a memory-mapped file.
+
+    Records are parsed in place and refer to the mapping instead of holding
+    a copy of their bytes. The next record is found using the record length
+    of blockette 1000, so no system call is needed per record. Data records
+    can also be accessed by index.
+    """
+
+    def __init__(self, path, lazy=False, resync=False, select=None):
+        """Map the file with the given path.
+
+        If lazy is True, records are created in lazy header-only mode. If
+        resync is True, corrupt records are skipped as with Input. If select
+        is a RecordFilter, records rejected by their raw header are skipped
+        using the record length only.
+        """
+        self.__lazy = lazy
+        self.__resync = resync
+        self.__select = select
+        self.skipped_bytes = 0
+        self.skipped_records = 0
+        self.filtered_records = 0
+
+        with open(path, "rb") as fd:
+            if os.fstat(fd.fileno()).st_size > 0:
+                self.__map = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.__map = b""
+
+        self.__offsets = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Release the mapping.
+
+        Records still referring to the mapping keep it alive until they
+        are deleted.
+        """
+        if isinstance(self.__map, mmap.mmap):
+            try:
+                self.__map.close()
+            except BufferError:
+                pass
+
+        self.__map = b""
+        self.__offsets = None
+
+    def __next_offset(self, offset):
+        """Offset of the record following the one at offset."""
+        (_, length) = _record_length(memoryview(self.__map), offset)
+        return offset + (length or _DEFAULT_RECLEN)
+
+    def offsets(self):
+        """Return the offsets of all data records in the file.
+
+        Only the headers are scanned; the result is cached.
+        """
+        if self.__offsets is None:
+            buf = memoryview(self.__map)
+            offsets = array.array("q")
+            offset = 0
+            while len(buf) - offset >= _FIXHEAD_LEN:
+                (rectype, length) = _record_length(buf, offset)
+                if rectype in ("D", "R", "Q", "M"):
+                    offsets.append(offset)
+
+                offset += length or _DEFAULT_RECLEN
+
+            self.__offsets = offsets
+
+        return self.__offsets
+
+    def __len__(self):
+        return len(self.offsets())
+
+    def __getitem__(self, idx):
+        """Return the data record with index idx."""
+        return Record(self.__map, self.offsets()[idx], self.__lazy)
+
+    def items(self):
+        """Iterate over (offset, record) pairs of the data records."""
+        select = self.__select
+        if self.__resync:
+            for item in _resync(self.__map, None, self.__lazy, self, select):
+                yield item
+
+            return
+
+        buf = memoryview(self.__map)
+        offset = 0
+        while True:
+            if select is not None and not select.accept(buf, offset):
+                (_, length) = _record_length(buf, offset)
+                if length is not None:
+                    self.filtered_records += 1
+                    offset += length
+                    continue
+
+            try:
+                rec = Record(self.__map, offset, self.__lazy)
+
+            except EndOfData:
+                return
+
+            except MSeedNoData:
+                offset = self.__next_offset(offset)
+                continue
+
+            if select is None or select.match(rec):
+                yield (offset, rec)
+            else:
+                self.filtered_records += 1
+
+            offset += rec.size
+
+    def __iter__(self):
+        """Define the iterator."""
+        for (_, rec) in self.items():
+            yield rec
+
+
+def merge_inputs(inputs):
+    """Merge several record sources into one stream ordered by end time.
+
+    Every source (Input, MappedInput or any iterable of records) must itself
+    be ordered by end time, e.g. a file holding a single stream sorted by
+    time. Only the next record of each source is kept in memory. Records
+    with equal end time are returned in the order of the sources.
+    """
+    heap = []
+    for (idx, src) in enumerate(inputs):
+        it = iter(src)
+        for rec in it:
+            heap.append((rec.end_ns, idx, rec, it))
+            break
+
+    heapq.heapify(heap)
+    while heap:
+        (_, idx, rec, it) = heap[0]
+        yield rec
+
+        for rec in it:
+            heapq.heapreplace(heap, (rec.end_ns, idx, rec, it))
+            break
+
+        else:
+            heapq.heappop(heap)
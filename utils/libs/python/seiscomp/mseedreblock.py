@@ -0,0 +1,373 @@
+"""Re-blocking of Mini-SEED data into maximally filled records.
+
+Contiguous Steim records of a stream are combined into records of a chosen
+length. By default the Steim frames of the input records are concatenated
+without decoding; in repack mode the samples are decoded and compressed
+again (requires NumPy), which also fills the last frames of every record.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+   :License:
+       GPLv3
+   :Platform:
+       Linux
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from seiscomp.mseedlite import (
+    MSeedError,
+    Record,
+    _BLKHEAD,
+    _BLKHEAD_LEN,
+    _FRAME_LEN,
+    _GAP_TOLERANCE,
+    _PTRS,
+    _STEIM_ENCODINGS,
+    _X0XN,
+    _pack_header,
+    _span_ns,
+)
+
+_HEAD_LEN = 64
+
+# largest sample count of the 16-bit header field
+_MAX_NSAMP = 65535
+
+# samples buffered per stream in repack mode before records are packed
+_REPACK_SAMPLES = 1 << 16
+
+
+def min_gap_ns(rec):
+    """Largest time difference of contiguous records in nanoseconds.
+
+    This is mseedlite._GAP_TOLERANCE sample periods.
+    """
+    if rec.samprate_num == 0:
+        return 0
+
+    return int(
+        _GAP_TOLERANCE * 1000000000 * rec.samprate_denom // rec.samprate_num
+    )
+
+
+def plain(rec):
+    """Check if the header of rec holds no more than a rebuilt header.
+
+    Rebuilt headers have no time correction and no blockettes other than
+    1000 and 1001; miniSEED 3 extra headers are not kept either.
+    """
+    if rec.format == 3:
+        return not rec.extra
+
+    if rec.time_correction != 0:
+        return False
+
+    header = rec.header
+    (_, pos) = _PTRS.unpack_from(header, 44)
+    while 0 < pos and pos + _BLKHEAD_LEN <= len(header):
+        (blktype, pos) = _BLKHEAD.unpack_from(header, pos)
+        if blktype not in (1000, 1001):
+            return False
+
+    return True
+
+
+def contiguous(prev, rec, check_samples=True):
+    """Check if rec continues the data of prev.
+
+    Both records must be Steim compressed with the same encoding and sample
+    rate, and rec must start at the end of prev within a tenth of the sample
+    period. If check_samples is True, the last sample of prev must also be
+    the sample preceding rec (X[-1]), so that the frames of rec can be
+    appended to prev without decoding.
+    """
+    if (
+        rec.encoding not in _STEIM_ENCODINGS
+        or rec.encoding != prev.encoding
+        or rec.samprate_num == 0
+        or (rec.samprate_num, rec.samprate_denom)
+        != (prev.samprate_num, prev.samprate_denom)
+        or rec.rectype != prev.rectype
+    ):
+        return False
+
+    if abs(rec.begin_ns - prev.end_ns) > min_gap_ns(rec):
+        return False
+
+    if check_samples:
+        return rec.X_minus1 is not None and rec.X_minus1 == prev.Xn
+
+    return True
+
+
+def concat_frames(recs, reclen, recno=1):
+    """Create one record of reclen bytes from the frames of contiguous recs.
+
+    The Steim frames are copied unchanged except for the X0/Xn words of the
+    first frame of every appended record, which are cleared; their control
+    word nibbles already mark them as containing no differences.
+    """
+    rec_len_exp = reclen.bit_length() - 1
+    first = recs[0]
+    nframes = sum(rec.nframes for rec in recs)
+    if _HEAD_LEN + nframes * _FRAME_LEN > reclen:
+        raise MSeedError(f"{nframes} frames do not fit into {reclen} bytes")
+
+    nsamp = sum(rec.nsamp for rec in recs)
+    if nsamp > _MAX_NSAMP:
+        raise MSeedError(f"{nsamp} samples do not fit into one record")
+
+    buf = bytearray(reclen)
+    buf[:_HEAD_LEN] = _pack_header(
+        recno,
+        first.rectype,
+        first.net,
+        first.sta,
+        first.loc,
+        first.cha,
+        first.begin_ns,
+        nsamp,
+        first.sr_factor,
+        first.sr_mult,
+        first.encoding,
+        rec_len_exp,
+        nframes,
+        1,
+        (first.aflgs, first.cflgs, first.qflgs),
+        max(first.time_quality, 0),
+    )
+
+    pos = _HEAD_LEN
+    for (i, rec) in enumerate(recs):
+        n = rec.nframes * _FRAME_LEN
+        buf[pos : pos + n] = rec.payload[:n]
+        if i > 0:
+            _X0XN.pack_into(buf, pos + 4, 0, 0)
+
+        pos += n
+
+    _X0XN.pack_into(buf, _HEAD_LEN + 4, first.X0, recs[-1].Xn)
+    return Record(buf)
+
+
+class _Pending(object):
+    """Data of one stream waiting for output."""
+
+    def __init__(self, rec, recno):
+        self.recs = [rec]
+        self.nframes = rec.nframes
+        self.samples = []
+        self.nsamp = rec.nsamp
+        self.begin_ns = rec.begin_ns
+        self.consumed = 0
+        self.X_minus1 = rec.X_minus1
+        self.recno = recno
+
+
+class Reblocker(object):
+    """Combine the records of every stream into records of reclen bytes.
+
+    Records must be passed to feed() ordered by time within each stream;
+    streams may be multiplexed. Records that cannot be combined (not Steim
+    compressed, larger than reclen in frame mode, or with header information
+    that a rebuilt header would lose, see plain()) are passed through
+    unchanged. records_in and records_out count the records.
+    """
+
+    def __init__(self, reclen=512, repack=False):
+        rec_len_exp = reclen.bit_length() - 1
+        if reclen != 1 << rec_len_exp or reclen < 2 * _HEAD_LEN:
+            raise MSeedError(f"invalid record length {reclen}")
+
+        self.reclen = reclen
+        self.repack = repack
+        self.records_in = 0
+        self.records_out = 0
+        self.__max_frames = (reclen - _HEAD_LEN) // _FRAME_LEN
+        self.__streams = {}
+
+        if repack:
+            # pylint: disable=C0415
+            from seiscomp import mseedcodec
+
+            self.__codec = mseedcodec
+
+    def feed(self, rec):
+        """Add a record and return a list of completed output records."""
+        self.records_in += 1
+        key = (rec.net, rec.sta, rec.loc, rec.cha)
+        pending = self.__streams.get(key)
+        if pending is not None and not pending.recs:
+            pending = None
+
+        out = []
+
+        if (
+            rec.encoding not in _STEIM_ENCODINGS
+            or rec.samprate_num == 0
+            or (not self.repack and rec.nframes > self.__max_frames)
+            or not plain(rec)
+        ):
+            if pending is not None:
+                out += self.__flush(key)
+
+            out.append(rec)
+            self.records_out += 1
+            return out
+
+        samples = None
+        if self.repack:
+            try:
+                samples = self.__codec.decode(rec)
+
+            except MSeedError:
+                if pending is not None:
+                    out += self.__flush(key)
+
+                out.append(rec)
+                self.records_out += 1
+                return out
+
+        if pending is not None and not contiguous(
+            pending.recs[-1], rec, not self.repack
+        ):
+            out += self.__flush(key)
+            pending = None
+
+        if pending is None:
+            # keep the sequence numbers of the stream
+            prev = self.__streams.get(key)
+            recno = 1 if prev is None else prev.recno
+            pending = self.__streams[key] = _Pending(rec, recno)
+            if samples is not None:
+                pending.samples.append(samples)
+                pending.nsamp = len(samples)
+
+            return out
+
+        if self.repack:
+            # only the first and the last record are needed
+            if len(pending.recs) > 1:
+                pending.recs[-1] = rec
+            else:
+                pending.recs.append(rec)
+
+            pending.samples.append(samples)
+            pending.nsamp += len(samples)
+            if pending.nsamp >= _REPACK_SAMPLES:
+                out += self.__pack(pending, False)
+
+        elif (
+            pending.nframes + rec.nframes <= self.__max_frames
+            and pending.nsamp + rec.nsamp <= _MAX_NSAMP
+        ):
+            pending.recs.append(rec)
+            pending.nframes += rec.nframes
+            pending.nsamp += rec.nsamp
+
+        else:
+            out += self.__emit(pending)
+            pending.recs = [rec]
+            pending.nframes = rec.nframes
+            pending.nsamp = rec.nsamp
+
+        return out
+
+    def flush(self):
+        """Return the output records of all pending data."""
+        out = []
+        for key in list(self.__streams):
+            out += self.__flush(key)
+
+        return out
+
+    def __flush(self, key):
+        pending = self.__streams[key]
+        if self.repack:
+            out = self.__pack(pending, True)
+        else:
+            out = self.__emit(pending)
+
+        pending.recs = []
+        pending.samples = []
+        pending.nsamp = 0
+        pending.nframes = 0
+        return out
+
+    def __emit(self, pending):
+        """Concatenate the frames of the pending records."""
+        if not pending.recs:
+            return []
+
+        if len(pending.recs) == 1 and pending.recs[0].size == self.reclen:
+            rec = pending.recs[0]
+        else:
+            rec = concat_frames(pending.recs, self.reclen, pending.recno)
+
+        pending.recno += 1
+        self.records_out += 1
+        return [rec]
+
+    def __pack(self, pending, final):
+        """Compress the pending samples into records.
+
+        Unless final is True, the samples of the last, partially filled
+        record are kept for the next call.
+        """
+        if pending.nsamp == 0:
+            return []
+
+        import numpy as np  # pylint: disable=C0415
+
+        first = pending.recs[0]
+        samples = np.concatenate(pending.samples)
+        # the header times are truncated to microseconds, so the start is
+        # computed from the exact start of the stream to avoid drift
+        begin_ns = pending.begin_ns + _span_ns(
+            pending.consumed, first.samprate_num, first.samprate_denom
+        )
+        out = list(
+            self.__codec.pack_records(
+                first.net,
+                first.sta,
+                first.loc,
+                first.cha,
+                first.fsamp,
+                begin_ns,
+                samples,
+                encoding=first.encoding,
+                reclen=self.reclen,
+                recno=pending.recno,
+                X_minus1=pending.X_minus1,
+                rectype=first.rectype,
+            )
+        )
+
+        if not final and len(out) > 1:
+            last = out.pop()
+            pending.samples = [samples[-last.nsamp :]]
+            pending.nsamp = last.nsamp
+            pending.consumed += len(samples) - last.nsamp
+            pending.X_minus1 = int(samples[-last.nsamp - 1])
+
+        elif not final:
+            return []
+
+        pending.recno += len(out)
+        self.records_out += len(out)
+        return out
+
+
+def reblock(recs, reclen=512, repack=False):
+    """Iterate over recs combined into maximally filled records."""
+    reblocker = Reblocker(reclen, repack)
+    for rec in recs:
+        for out in reblocker.feed(rec):
+            yield out
+
+    for out in reblocker.flush():
+        yield out
@@ -0,0 +1,186 @@
+"""Parallel scanning of many Mini-SEED files with mseedlite.
+
+Files are parsed in a process pool. Each worker applies a function to one
+file and the per-file results are returned to, or merged in, the parent.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+   :License:
+       GPLv3
+   :Platform:
+       Linux
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import fnmatch
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from seiscomp.mseedindex import index_path
+from seiscomp.mseedlite import MappedInput
+
+RecordInfo = collections.namedtuple(
+    "RecordInfo",
+    ("offset", "net", "sta", "loc", "cha", "begin_ns", "end_ns", "nsamp", "size"),
+)
+
+# suffixes of record indexes and their temporary files
+_SIDECARS = (index_path(""), index_path("") + ".tmp")
+
+
+def expand_paths(paths, pattern="*"):
+    """Expand a glob pattern or a directory into a sorted list of files.
+
+    A list of paths is returned unchanged. Of a directory only the names
+    matching pattern are taken; hidden files and record indexes are
+    skipped.
+    """
+    if not isinstance(paths, str):
+        return list(paths)
+
+    if os.path.isdir(paths):
+        return sorted(
+            os.path.join(root, name)
+            for (root, _, names) in os.walk(paths)
+            for name in names
+            if fnmatch.fnmatch(name, pattern)
+            and not name.startswith(".")
+            and not name.endswith(_SIDECARS)
+        )
+
+    return sorted(p for p in glob.glob(paths, recursive=True) if os.path.isfile(p))
+
+
+def record_summaries(path):
+    """Return a RecordInfo tuple for every data record of a file."""
+    with MappedInput(path, lazy=True) as inp:
+        return [
+            RecordInfo(
+                offset,
+                rec.net,
+                rec.sta,
+                rec.loc,
+                rec.cha,
+                rec.begin_ns,
+                rec.end_ns,
+                rec.nsamp,
+                rec.size,
+            )
+            for (offset, rec) in inp.items()
+        ]
+
+
+def stream_spans(path):
+    """Return the time span of every stream in a file.
+
+    The result maps (net, sta, loc, cha) to a tuple
+    (begin_ns, end_ns, number of records, number of samples).
+    """
+    spans = {}
+    with MappedInput(path, lazy=True) as inp:
+        for rec in inp:
+            key = (rec.net, rec.sta, rec.loc, rec.cha)
+            span = spans.get(key)
+            if span is None:
+                spans[key] = (rec.begin_ns, rec.end_ns, 1, rec.nsamp)
+            else:
+                spans[key] = (
+                    min(span[0], rec.begin_ns),
+                    max(span[1], rec.end_ns),
+                    span[2] + 1,
+                    span[3] + rec.nsamp,
+                )
+
+    return spans
+
+
+def merge_spans(acc, spans):
+    """Merge the result of stream_spans into acc and return acc.
+
+    acc may be None, so that scan() works without an initial value.
+    """
+    if acc is None:
+        acc = {}
+
+    for (key, span) in spans.items():
+        cur = acc.get(key)
+        if cur is None:
+            acc[key] = span
+        else:
+            acc[key] = (
+                min(cur[0], span[0]),
+                max(cur[1], span[1]),
+                cur[2] + span[2],
+                cur[3] + span[3],
+            )
+
+    return acc
+
+
+def _apply(func, path):
+    try:
+        return (path, func(path), None)
+
+    except Exception as e:
+        return (path, None, e)
+
+
+def _results(paths, func, workers):
+    """Yield (path, result, error) tuples in order of completion."""
+    if workers == 1:
+        for path in paths:
+            yield _apply(func, path)
+
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_apply, func, path) for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def scan(
+    paths,
+    func=stream_spans,
+    reduce=None,
+    initial=None,
+    workers=None,
+    errors=None,
+    pattern="*",
+):
+    """Apply func to many files in a process pool.
+
+    paths is a list of files, a directory or a glob pattern; of a directory
+    the files matching pattern are scanned, see expand_paths(). func must be
+    picklable, i.e. defined at module level. Without reduce, a dict mapping
+    every path to its result is returned. Otherwise results are folded in
+    the parent as they arrive, acc = reduce(acc, result), starting with
+    initial, and the final value is returned.
+
+    If errors is a dict, exceptions raised for a file are stored there
+    under its path; otherwise the first one is raised. workers defaults to
+    the number of CPUs; with workers=1 no pool is used.
+    """
+    results = {}
+    acc = initial
+
+    for (path, result, error) in _results(expand_paths(paths, pattern), func, workers):
+        if error is not None:
+            if errors is None:
+                raise error
+
+            errors[path] = error
+
+        elif reduce is None:
+            results[path] = result
+
+        else:
+            acc = reduce(acc, result)
+
+    return results if reduce is None else acc
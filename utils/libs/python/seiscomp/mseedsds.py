@@ -0,0 +1,321 @@
+"""SeisComP Data Structure (SDS) archive layout for mseedlite records.
+
+Records are stored in day files
+YEAR/NET/STA/CHA.D/NET.STA.LOC.CHA.D.YEAR.DOY below the archive root. Many
+input files can be demultiplexed in parallel; every worker writes to its own
+staging tree, which are merged into the archive in time order at the end.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+   :License:
+       GPLv3
+   :Platform:
+       Linux
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import collections
+import datetime
+import fnmatch
+import heapq
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from seiscomp.mseedlite import MappedInput
+
+_DAY_NS = 86400 * 1000000000
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def day_of(ns):
+    """Day number since 1970-01-01 of a time in nanoseconds."""
+    return ns // _DAY_NS
+
+
+def sds_path(root, net, sta, loc, cha, day):
+    """Path of the SDS day file of a stream for a day number."""
+    date = datetime.date.fromordinal(_EPOCH_ORDINAL + day)
+    (year, doy) = (date.year, date.timetuple().tm_yday)
+    return os.path.join(
+        root,
+        f"{year:04d}",
+        net,
+        sta,
+        f"{cha}.D",
+        f"{net}.{sta}.{loc}.{cha}.D.{year:04d}.{doy:03d}",
+    )
+
+
+def sds_streams(root, start_ns=None, end_ns=None, streams=None):
+    """Find the day files of the streams of an SDS archive.
+
+    Returns a dict mapping (net, sta, loc, cha) to the paths of the day
+    files sorted by day. Only days that may hold data overlapping
+    [start_ns, end_ns) are included, with the day before start_ns for
+    records crossing midnight. streams is a list of patterns NET.STA.LOC.CHA
+    with shell-style wildcards.
+    """
+    first = None if start_ns is None else day_of(start_ns) - 1
+    last = None if end_ns is None else day_of(end_ns - 1)
+    first_year = None if first is None else _year_of(first)
+    last_year = None if last is None else _year_of(last)
+
+    found = {}
+    for year in sorted(os.listdir(root)):
+        if not (len(year) == 4 and year.isdigit()):
+            continue
+
+        if (first_year is not None and int(year) < first_year) or (
+            last_year is not None and int(year) > last_year
+        ):
+            continue
+
+        base = os.path.join(root, year)
+        for (d, _, names) in os.walk(base):
+            for name in names:
+                parts = name.split(".")
+                if (
+                    len(parts) != 7
+                    or parts[4] != "D"
+                    or not parts[5].isdigit()
+                    or not parts[6].isdigit()
+                ):
+                    continue
+
+                (net, sta, loc, cha) = parts[:4]
+                if streams is not None and not any(
+                    fnmatch.fnmatchcase(".".join(parts[:4]), p) for p in streams
+                ):
+                    continue
+
+                day = (
+                    datetime.date(int(parts[5]), 1, 1).toordinal()
+                    - _EPOCH_ORDINAL
+                    + int(parts[6])
+                    - 1
+                )
+                if (first is not None and day < first) or (
+                    last is not None and day > last
+                ):
+                    continue
+
+                found.setdefault((net, sta, loc, cha), []).append(
+                    (day, os.path.join(d, name))
+                )
+
+    return {key: [path for (_, path) in sorted(days)] for (key, days) in found.items()}
+
+
+def _year_of(day):
+    return datetime.date.fromordinal(_EPOCH_ORDINAL + day).year
+
+
+class SDSWriter(object):
+    """Demultiplex records into the day files of an SDS archive.
+
+    Records are appended to the day file of their begin time. Data is
+    buffered per file and written in blocks of bufsize bytes, or when more
+    than maxbuffered bytes are buffered in total. At most max_open files
+    are kept open; the least recently used file is closed when another one
+    is needed.
+    """
+
+    def __init__(self, root, max_open=256, bufsize=1 << 16, maxbuffered=64 << 20):
+        self.root = root
+        self.max_open = max_open
+        self.bufsize = bufsize
+        self.maxbuffered = maxbuffered
+        self.files_opened = 0
+        self.__handles = collections.OrderedDict()
+        self.__buffers = {}
+        self.__buffered = 0
+        self.__paths = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def path(self, rec):
+        """Return the path of the day file of a record."""
+        key = (rec.net, rec.sta, rec.loc, rec.cha)
+        day = day_of(rec.begin_ns)
+        cached = self.__paths.get(key)
+        if cached is None or cached[0] != day:
+            cached = self.__paths[key] = (day, sds_path(self.root, *(key + (day,))))
+
+        return cached[1]
+
+    def write(self, rec):
+        """Append a record to its day file."""
+        self.write_raw(self.path(rec), rec.raw)
+
+    def write_raw(self, path, data):
+        """Append bytes to a file of the archive."""
+        buf = self.__buffers.get(path)
+        if buf is None:
+            buf = self.__buffers[path] = bytearray()
+
+        buf += data
+        self.__buffered += len(data)
+        if len(buf) >= self.bufsize:
+            self.__flush(path)
+
+        elif self.__buffered > self.maxbuffered:
+            self.flush()
+
+    def __handle(self, path):
+        fd = self.__handles.get(path)
+        if fd is not None:
+            self.__handles.move_to_end(path)
+            return fd
+
+        if len(self.__handles) >= self.max_open:
+            (_, old) = self.__handles.popitem(last=False)
+            old.close()
+
+        try:
+            fd = open(path, "ab")
+
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = open(path, "ab")
+
+        self.files_opened += 1
+        self.__handles[path] = fd
+        return fd
+
+    def __flush(self, path):
+        buf = self.__buffers.pop(path)
+        if buf:
+            self.__handle(path).write(buf)
+            self.__buffered -= len(buf)
+
+    def flush(self):
+        """Write all buffered data, in path order."""
+        for path in sorted(self.__buffers):
+            self.__flush(path)
+
+    def close(self):
+        """Write all buffered data and close the files."""
+        self.flush()
+        while self.__handles:
+            (_, fd) = self.__handles.popitem()
+            fd.close()
+
+
+def _stage(path, stageroot, max_open, bufsize):
+    """Demultiplex one file into a staging tree; return the files written."""
+    with SDSWriter(stageroot, max_open, bufsize) as writer:
+        with MappedInput(path) as inp:
+            for rec in inp:
+                writer.write(rec)
+
+    return [
+        os.path.relpath(os.path.join(d, name), stageroot)
+        for (d, _, names) in os.walk(stageroot)
+        for name in names
+    ]
+
+
+def _begin_ns(rec):
+    return rec.begin_ns
+
+
+def _write_merged(fd, inputs):
+    """Write the records of inputs merged by begin time.
+
+    Returns False as soon as a record goes backwards, i.e. if one of the
+    inputs is not in time order.
+    """
+    prev = None
+    for rec in heapq.merge(*inputs, key=_begin_ns):
+        if prev is not None and rec.begin_ns < prev:
+            return False
+
+        prev = rec.begin_ns
+        fd.write(rec.raw)
+
+    return True
+
+
+def _merge_day(relpath, stagepaths, root):
+    """Merge staged parts of one day file into the archive, sorted by time.
+
+    The parts are merged k-way in one pass, so only the next record of every
+    part is held in memory. Only if a part is not in time order, the parts
+    are sorted in memory and merged again. Records with equal begin time
+    keep the order of the archived file and the parts.
+    """
+    dest = os.path.join(root, relpath)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if len(stagepaths) == 1 and not os.path.exists(dest):
+        os.replace(stagepaths[0], dest)
+        return
+
+    sources = [dest] if os.path.exists(dest) else []
+    sources += stagepaths
+    inputs = [MappedInput(p, lazy=True) for p in sources]
+    try:
+        with open(dest + ".tmp", "wb") as fd:
+            if not _write_merged(fd, inputs):
+                # a part out of order, unlike usual; start again with every
+                # part sorted in memory
+                fd.seek(0)
+                fd.truncate()
+                _write_merged(fd, [sorted(inp, key=_begin_ns) for inp in inputs])
+
+    finally:
+        for inp in inputs:
+            inp.close()
+
+    os.replace(dest + ".tmp", dest)
+
+
+def demultiplex(paths, root, workers=None, max_open=256, bufsize=1 << 16):
+    """Demultiplex many files into an SDS archive using a process pool.
+
+    Every file is demultiplexed by a worker into a staging tree below root.
+    Day files written by several workers, or already present in the archive,
+    are then merged in the pool, sorted by begin time; a day file written by
+    a single worker is moved into place unchanged.
+    """
+    os.makedirs(root, exist_ok=True)
+    stagedir = tempfile.mkdtemp(prefix=".stage-", dir=root)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            stageroots = [os.path.join(stagedir, str(i)) for i in range(len(paths))]
+            parts = {}
+            for (stageroot, relpaths) in zip(
+                stageroots,
+                pool.map(
+                    _stage,
+                    paths,
+                    stageroots,
+                    [max_open] * len(paths),
+                    [bufsize] * len(paths),
+                ),
+            ):
+                for relpath in relpaths:
+                    parts.setdefault(relpath, []).append(
+                        os.path.join(stageroot, relpath)
+                    )
+
+            relpaths = sorted(parts)
+            for _ in pool.map(
+                _merge_day,
+                relpaths,
+                [parts[p] for p in relpaths],
+                [root] * len(relpaths),
+            ):
+                pass
+
+    finally:
+        shutil.rmtree(stagedir, ignore_errors=True)
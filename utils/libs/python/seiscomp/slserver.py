@@ -0,0 +1,465 @@
+"""SeedLink v3 server for mseedlite records.
+
+Records are published with consecutive sequence numbers into a ring buffer
+and sent to the connected SeedLink clients. Clients negotiate stations and
+selectors with HELLO, STATION, SELECT, DATA, FETCH and END and may resume
+from a sequence number within the buffer. INFO answers the levels ID,
+STATIONS and STREAMS; time windows (TIME) are not supported. New data is
+sent to every client in batches, with one write per wake-up.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+   :License:
+       GPLv3
+   :Platform:
+       Linux
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+import collections
+import fnmatch
+import itertools
+import time
+from xml.sax.saxutils import quoteattr
+
+from seiscomp.mseedlite import MSeedError, Record, _ns2dt, _pack_header
+
+_RECLEN = 512
+_REC_LEN_EXP = 9
+_SEQ_MASK = 0xFFFFFF
+
+# ASCII text of INFO records, after the 64-byte header
+_INFO_TEXT_LEN = _RECLEN - 64
+_INFO_LEVELS = ("ID", "STATIONS", "STREAMS")
+
+
+def _info_time(rec_time):
+    """Time in the format of SeedLink INFO responses."""
+    return rec_time.strftime("%Y/%m/%d %H:%M:%S.%f")[:-2]
+
+
+def _selector(pattern):
+    """Parse a selector [!][LL]CCC[.T] into (negate, loc, cha, type)."""
+    negate = pattern.startswith("!")
+    if negate:
+        pattern = pattern[1:]
+
+    (chan, _, rectype) = pattern.partition(".")
+    if len(chan) > 3:
+        (loc, cha) = (chan[:-3].replace("-", " "), chan[-3:])
+    else:
+        (loc, cha) = ("*", chan.ljust(3, "?"))
+
+    return (negate, loc, cha, rectype or "*")
+
+
+def _selected(selectors, loc, cha, rectype):
+    """Check a stream against a list of parsed selectors."""
+    loc = loc.ljust(2)
+    positive = False
+    matched = False
+    for (negate, lpat, cpat, tpat) in selectors:
+        if not negate:
+            positive = True
+
+        if (
+            fnmatch.fnmatchcase(loc, lpat)
+            and fnmatch.fnmatchcase(cha, cpat)
+            and fnmatch.fnmatchcase(rectype, tpat)
+        ):
+            if negate:
+                return False
+
+            matched = True
+
+    return matched or not positive
+
+
+class _Station(object):
+    """A STATION request of a client in multi-station mode."""
+
+    def __init__(self, net, sta):
+        self.net = net
+        self.sta = sta
+        self.selectors = []
+        self.start = None
+
+
+class _Session(object):
+    """State of one client connection."""
+
+    def __init__(self):
+        self.stations = []
+        self.selectors = []
+        self.start = None
+        self.cursor = 0
+        self.dialup = False
+        self.closed = False
+        self.wake = asyncio.Event()
+        self.cache = {}
+
+    def accepts(self, n, net, sta, loc, cha, rectype):
+        key = (net, sta, loc, cha, rectype)
+        station = self.cache.get(key)
+        if station is None:
+            station = self.cache[key] = self.__match(*key)
+
+        return station is not False and n >= station.start
+
+    def __match(self, net, sta, loc, cha, rectype):
+        if not self.stations:
+            if _selected(self.selectors, loc, cha, rectype):
+                return self
+
+            return False
+
+        for station in self.stations:
+            if (
+                fnmatch.fnmatchcase(net, station.net)
+                and fnmatch.fnmatchcase(sta, station.sta)
+                and _selected(station.selectors, loc, cha, rectype)
+            ):
+                return station
+
+        return False
+
+
+class SeedLinkServer(object):
+    """Serve records to SeedLink v3 clients.
+
+    Records passed to publish() are kept as 512-byte SeedLink packets in a
+    ring buffer of capacity packets. Clients requesting DATA without a
+    sequence number receive new packets only. publish() and close() must
+    be called from the event loop of the server. packets_sent and
+    packets_lost count the packets sent to all clients and the packets
+    dropped from the buffer before a client could receive them.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=18000,
+        capacity=10000,
+        software="msrtsimul",
+        organization="SeisComP",
+    ):
+        self.host = host
+        self.port = port
+        self.software = software
+        self.organization = organization
+        self.packets_published = 0
+        self.packets_sent = 0
+        self.packets_lost = 0
+        self.records_skipped = 0
+        self.__buffer = collections.deque(maxlen=capacity)
+        self.__next = 0
+        self.__sessions = set()
+        self.__handlers = {}
+        self.__server = None
+        self.__started = None
+
+    @property
+    def clients(self):
+        """Number of clients receiving data."""
+        return len(self.__sessions)
+
+    async def start(self):
+        """Start listening; port 0 selects a free port."""
+        self.__server = await asyncio.start_server(self.__handle, self.host, self.port)
+        self.port = self.__server.sockets[0].getsockname()[1]
+        self.__started = time.time_ns()
+
+    async def close(self):
+        """Stop listening and disconnect all clients."""
+        if self.__server is not None:
+            self.__server.close()
+            for session in self.__sessions:
+                session.closed = True
+                session.wake.set()
+
+            # also clients still negotiating, waiting for a command
+            handlers = list(self.__handlers.items())
+            for (task, writer) in handlers:
+                writer.close()
+                task.cancel()
+
+            await asyncio.gather(
+                *(task for (task, _) in handlers), return_exceptions=True
+            )
+            await self.__server.wait_closed()
+            self.__server = None
+
+    def publish(self, recs):
+        """Add records to the buffer and wake up the clients.
+
+        512-byte miniSEED 2 records are copied with only their time fields
+        patched. Records not fitting into 512 bytes are skipped.
+        """
+        for rec in recs:
+            packet = bytearray(8 + _RECLEN)
+            try:
+                if rec.format == 2 and rec.size == _RECLEN:
+                    packet[8:] = rec.raw
+                    rec.patch_time(packet, 8)
+                else:
+                    rec.pack_into(packet, 8, _REC_LEN_EXP)
+
+            except MSeedError:
+                self.records_skipped += 1
+                continue
+
+            packet[:8] = b"SL%06X" % (self.__next & _SEQ_MASK)
+            self.__buffer.append(
+                (self.__next, rec.net, rec.sta, rec.loc, rec.cha, rec.rectype, packet)
+            )
+            self.__next += 1
+            self.packets_published += 1
+
+        for session in self.__sessions:
+            session.wake.set()
+
+    def __resume(self, seq):
+        """Buffer position following the packet with sequence number seq."""
+        n = self.__next - ((self.__next - (int(seq, 16) + 1)) & _SEQ_MASK)
+        if self.__buffer and n < self.__buffer[0][0]:
+            n = self.__buffer[0][0]
+
+        return n
+
+    async def __handle(self, reader, writer):
+        task = asyncio.current_task()
+        self.__handlers[task] = writer
+        session = _Session()
+        try:
+            if await self.__negotiate(session, reader, writer):
+                await self.__stream(session, reader, writer)
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            del self.__handlers[task]
+            writer.close()
+
+    async def __negotiate(self, session, reader, writer):
+        """Handle commands until data is requested; False on BYE or EOF."""
+        station = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                return False
+
+            words = line.decode("ascii", "replace").split()
+            if not words:
+                continue
+
+            (cmd, args) = (words[0].upper(), words[1:])
+            reply = b"OK\r\n"
+            if cmd == "HELLO":
+                reply = (
+                    f"SeedLink v3.1 ({self.software}) :: SLPROTO:3.1\r\n"
+                    f"{self.organization}\r\n"
+                ).encode("ascii", "replace")
+
+            elif cmd == "STATION" and 1 <= len(args) <= 2:
+                station = _Station(args[1] if len(args) > 1 else "*", args[0])
+                session.stations.append(station)
+
+            elif cmd == "SELECT":
+                selectors = station.selectors if station else session.selectors
+                if args:
+                    selectors.append(_selector(args[0]))
+                else:
+                    del selectors[:]
+
+            elif cmd in ("DATA", "FETCH"):
+                try:
+                    if args:
+                        start = self.__resume(args[0])
+                    else:
+                        start = self.__next
+
+                except ValueError:
+                    reply = b"ERROR\r\n"
+
+                else:
+                    session.dialup = cmd == "FETCH"
+                    if station is None:
+                        # uni-station mode: transfer starts immediately
+                        session.start = start
+                        return True
+
+                    station.start = start
+
+            elif cmd == "END" and session.stations:
+                return True
+
+            elif cmd == "CAPABILITIES":
+                # capabilities of the client do not change the protocol
+                pass
+
+            elif cmd == "INFO" and len(args) == 1 and args[0].upper() in _INFO_LEVELS:
+                reply = self.__info(args[0].upper())
+
+            elif cmd == "BYE":
+                return False
+
+            else:
+                reply = b"ERROR\r\n"
+
+            writer.write(reply)
+            await writer.drain()
+
+    def __info(self, level):
+        """INFO response as SeedLink packets of ASCII log records."""
+        lines = [
+            '<?xml version="1.0"?>',
+            "<seedlink software=%s organization=%s started=%s>"
+            % (
+                quoteattr(f"SeedLink v3.1 ({self.software})"),
+                quoteattr(self.organization),
+                quoteattr(_info_time(_ns2dt(self.__started))),
+            ),
+        ]
+        if level != "ID":
+            stations = {}
+            for (n, net, sta, loc, cha, rectype, packet) in self.__buffer:
+                station = stations.setdefault((net, sta), [n, n, {}])
+                station[1] = n
+                if level == "STREAMS":
+                    rec = Record(packet, 8, lazy=True)
+                    stream = station[2].setdefault(
+                        (loc, cha, rectype), [rec.begin_time, rec.end_time]
+                    )
+                    stream[0] = min(stream[0], rec.begin_time)
+                    stream[1] = max(stream[1], rec.end_time)
+
+            for ((net, sta), (first, last, streams)) in sorted(stations.items()):
+                lines.append(
+                    "<station name=%s network=%s description=%s "
+                    "begin_seq=%s end_seq=%s>"
+                    % (
+                        quoteattr(sta),
+                        quoteattr(net),
+                        quoteattr(""),
+                        quoteattr("%06X" % (first & _SEQ_MASK)),
+                        quoteattr("%06X" % (last & _SEQ_MASK)),
+                    )
+                )
+                for ((loc, cha, rectype), (begin, end)) in sorted(streams.items()):
+                    lines.append(
+                        "<stream location=%s seedname=%s type=%s "
+                        "begin_time=%s end_time=%s/>"
+                        % (
+                            quoteattr(loc),
+                            quoteattr(cha),
+                            quoteattr(rectype),
+                            quoteattr(_info_time(begin)),
+                            quoteattr(_info_time(end)),
+                        )
+                    )
+
+                lines.append("</station>")
+
+        lines.append("</seedlink>")
+        text = "\n".join(lines).encode("utf-8")
+        now_ns = time.time_ns()
+        packets = []
+        for pos in range(0, len(text), _INFO_TEXT_LEN):
+            chunk = text[pos : pos + _INFO_TEXT_LEN]
+            packet = bytearray(8 + _RECLEN)
+            packet[8:72] = _pack_header(
+                0,
+                "D",
+                "",
+                "INFO",
+                "",
+                "LOG",
+                now_ns,
+                len(chunk),
+                0,
+                0,
+                0,
+                _REC_LEN_EXP,
+                0,
+            )
+            packet[72 : 72 + len(chunk)] = chunk
+            packet[:8] = b"SLINFO *"
+            packets.append(packet)
+
+        packets[-1][:8] = b"SLINFO  "
+        return b"".join(packets)
+
+    async def __stream(self, session, reader, writer):
+        """Send packets until the client disconnects."""
+        for station in session.stations:
+            if station.start is None:
+                station.start = self.__next
+
+        session.cursor = min(
+            [session.start if session.start is not None else self.__next]
+            + [station.start for station in session.stations]
+        )
+
+        watcher = asyncio.ensure_future(self.__watch(session, reader))
+        self.__sessions.add(session)
+        try:
+            while not session.closed:
+                session.wake.clear()
+                chunks = self.__collect(session)
+                if chunks:
+                    writer.write(b"".join(chunks))
+                    await writer.drain()
+                    self.packets_sent += len(chunks)
+
+                elif session.dialup:
+                    writer.write(b"END")
+                    await writer.drain()
+                    break
+
+                else:
+                    await session.wake.wait()
+
+        finally:
+            self.__sessions.discard(session)
+            watcher.cancel()
+
+    async def __watch(self, session, reader):
+        """Read and ignore commands while streaming to detect disconnects."""
+        try:
+            while await reader.readline():
+                pass
+
+        except ConnectionError:
+            pass
+
+        session.closed = True
+        session.wake.set()
+
+    def __collect(self, session):
+        """Packets of the buffer the client has not received yet."""
+        if not self.__buffer:
+            return []
+
+        oldest = self.__buffer[0][0]
+        if session.cursor < oldest:
+            self.packets_lost += oldest - session.cursor
+            session.cursor = oldest
+
+        # walk back from the newest packet, so that a wake-up costs the
+        # number of new packets rather than the size of the buffer
+        chunks = [
+            item[6]
+            for item in itertools.islice(
+                reversed(self.__buffer), self.__next - session.cursor
+            )
+            if session.accepts(*item[:6])
+        ]
+        chunks.reverse()
+        session.cursor = self.__next
+        return chunks
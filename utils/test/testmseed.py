@@ -1,7 +1,9 @@
 """Test for the mseedlite library."""
 import unittest
 import os
-from seiscomp.mseedlite import Input, Record
+from io import BytesIO
+from seiscomp.mseedlite import Input, MappedInput, Record, RecordFilter, \
+    RecordWriter, MSeedError, merge_inputs, _crc32c, _crc32c_py
 from math import log
 
 
@@ -40,6 +42,47 @@ class MSeedLiteTests(unittest.TestCase):
         os.remove('delete.me')
 
 
+    def testRecordWriter(self):
+        """Write an MSEED file through a buffered writer"""
+
+        fout = BytesIO()
+        with open('waveform.mseed', 'rb') as fin:
+            with RecordWriter(fout, bufsize=2048) as writer:
+                for rec in Input(fin):
+                    writer.write(rec, int(log(rec.size, 2)))
+
+        with open('waveform.mseed', 'rb') as orig:
+            msg = 'The copy of the waveform differs from original!'
+            self.assertEqual(orig.read(), fout.getvalue(), msg)
+
+
+    def testPatchTime(self):
+        """Write time-shifted records from their raw bytes"""
+
+        shift = 86400 * 10**9 + 123456789
+        packed = BytesIO()
+        patched = BytesIO()
+        with MappedInput('waveform.mseed') as inp:
+            with RecordWriter(packed) as writer1, \
+                    RecordWriter(patched, bufsize=2048) as writer2:
+                for rec in inp:
+                    rec.begin_ns += shift
+                    writer1.write(rec, int(log(rec.size, 2)))
+                    writer2.write_raw(rec)
+
+        msg = 'Patched records differ from packed records!'
+        self.assertEqual(packed.getvalue(), patched.getvalue(), msg)
+
+        recs = list(Input(BytesIO(patched.getvalue())))
+        with open('waveform.mseed', 'rb') as fin:
+            for (rec, orig) in zip(recs, Input(fin)):
+                # BTIME and blockette 1001 keep the microseconds
+                self.assertEqual(rec.begin_ns,
+                                 orig.begin_ns + shift // 1000 * 1000,
+                                 'Wrong begin time!')
+                self.assertEqual(rec.data, orig.data, 'Wrong data!')
+
+
     def testRecord(self):
         """Read MSEED record from string"""
 
@@ -66,6 +109,124 @@ class MSeedLiteTests(unittest.TestCase):
         os.remove('delete.me')
 
 
+    def testRecordFromBuffer(self):
+        """Read MSEED records in place from a larger buffer"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            data = fin.read()
+
+        with open('waveform.mseed', 'rb') as fin:
+            offset = 0
+            for rec in Input(fin):
+                brec = Record(memoryview(data), offset)
+                self.assertEqual(brec.header, rec.header, 'Wrong header!')
+                self.assertEqual(brec.data, rec.data, 'Wrong data!')
+                self.assertEqual(brec.begin_time, rec.begin_time, 'Wrong time!')
+                self.assertEqual(brec.X_minus1, rec.X_minus1, 'Wrong X[-1]!')
+                offset += brec.size
+
+        self.assertEqual(offset, len(data), 'Wrong total size!')
+
+
+    def testMappedInput(self):
+        """Read a memory-mapped MSEED file"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        with MappedInput('waveform.mseed') as inp:
+            mrecs = list(inp)
+            self.assertEqual(len(inp), len(recs), 'Wrong number of records!')
+            self.assertEqual(len(mrecs), len(recs), 'Wrong number of records!')
+            for rec, mrec in zip(recs, mrecs):
+                self.assertEqual(mrec.header + mrec.data, rec.header + rec.data,
+                                 'Wrong record!')
+
+            self.assertEqual(inp[-1].begin_time, recs[-1].begin_time,
+                             'Wrong record at index!')
+            self.assertEqual(inp[5].data, recs[5].data, 'Wrong record at index!')
+
+
+    def testLazy(self):
+        """Read MSEED records in lazy header-only mode"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        with open('waveform.mseed', 'rb') as fin:
+            lrecs = list(Input(fin, lazy=True))
+
+        self.assertEqual(len(lrecs), len(recs), 'Wrong number of records!')
+        for rec, lrec in zip(recs, lrecs):
+            self.assertEqual(lrec.begin_ns, rec.begin_ns, 'Wrong begin time!')
+            self.assertEqual(lrec.end_ns, rec.end_ns, 'Wrong end time!')
+            self.assertEqual(lrec.begin_time, rec.begin_time, 'Wrong begin time!')
+            self.assertEqual(lrec.end_time, rec.end_time, 'Wrong end time!')
+            self.assertEqual(lrec.X_minus1, rec.X_minus1, 'Wrong X[-1]!')
+            self.assertEqual(lrec.data, rec.data, 'Wrong data!')
+
+        # 2008-01-01 00:00:00.309886
+        self.assertEqual(lrecs[0].begin_ns, 1199145600309886000, 'Wrong time!')
+
+
+    def testTimes(self):
+        """Shift the begin time of MSEED records"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin, lazy=True))
+
+        rec = recs[0]
+        rec.begin_ns += 366 * 86400 * 1000000000
+        self.assertEqual(rec.begin_time.year, 2009, 'Wrong year!')
+        self.assertEqual(rec.begin_time.microsecond, 309886,
+                         'Wrong microseconds!')
+
+        fout = BytesIO()
+        rec.write(fout, int(log(rec.size, 2)))
+        shifted = Record(fout.getvalue())
+        self.assertEqual(shifted.begin_ns, rec.begin_ns, 'Wrong begin time!')
+        self.assertEqual(shifted.header[20:30], b'\x07\xd9\x00\x01\x00\x00\x00\x00\x0c\x1a',
+                         'Wrong BTIME!')
+
+
+    def testResync(self):
+        """Skip corrupt data in an MSEED stream"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            data = fin.read()
+
+        # garbage between records 2 and 3, destroyed header of record 5
+        corrupt = data[:1024] + b'\xff' * 100 + data[1024:2560] + \
+            b'X' * 48 + data[2608:]
+
+        class Trickle(object):
+            """File returning short reads"""
+            def __init__(self, data):
+                self.fd = BytesIO(data)
+
+            def read(self, size):
+                return self.fd.read(min(size, 97))
+
+        for fd in (BytesIO(corrupt), Trickle(corrupt)):
+            inp = Input(fd, resync=True)
+            recs = list(inp)
+            self.assertEqual(len(recs), 19, 'Wrong number of records!')
+            self.assertEqual(inp.skipped_records, 2, 'Wrong number of records!')
+            self.assertEqual(inp.skipped_bytes, 100 + 512,
+                             'Wrong number of bytes!')
+            self.assertEqual(recs[-1].data, data[-512 + 64:], 'Wrong data!')
+
+        with open('delete.me', 'wb') as fout:
+            fout.write(corrupt)
+
+        with MappedInput('delete.me', resync=True) as inp:
+            self.assertEqual(len(list(inp)), 19, 'Wrong number of records!')
+            self.assertEqual(inp.skipped_bytes, 100 + 512,
+                             'Wrong number of bytes!')
+
+        os.remove('delete.me')
+
+
     def testModifying(self):
         """Modify and write an MSEED file"""
 
@@ -117,6 +278,235 @@ class MSeedLiteTests(unittest.TestCase):
         os.remove('delete.me')
 
 
+    def testLargeRecords(self):
+        """Merge MSEED records into records larger than 4096 bytes"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        for rec_len_exp in (13, 16):
+            out_rec = Record(recs[0].header + recs[0].data)
+            used = recs[:1]
+            for rec in recs[1:]:
+                if out_rec.size + rec.nframes * 64 > 1 << rec_len_exp:
+                    break
+
+                out_rec.merge(rec)
+                used.append(rec)
+
+            fout = BytesIO()
+            out_rec.write(fout, rec_len_exp)
+            self.assertEqual(len(fout.getvalue()), 1 << rec_len_exp,
+                             'Wrong record size!')
+
+            fout.seek(0)
+            merged = list(Input(fout))
+            self.assertEqual(len(merged), 1, 'Wrong number of records!')
+            self.assertEqual(merged[0].size, 1 << rec_len_exp,
+                             'Wrong record size!')
+            self.assertEqual(merged[0].nsamp, sum(rec.nsamp for rec in used),
+                             'Wrong number of samples!')
+            self.assertEqual(merged[0].nframes, 7 * len(used),
+                             'Wrong number of frames!')
+            self.assertEqual(merged[0].end_ns, used[-1].end_ns,
+                             'Wrong end time!')
+            self.assertEqual(merged[0].Xn, used[-1].Xn, 'Wrong last sample!')
+
+
+    def testFrameCount(self):
+        """Count the frames of records without a frame count"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            raw = bytearray(next(iter(Input(fin))).raw)
+
+        # no frame count in blockette 1001, last two frames zero padding
+        raw[63] = 0
+        raw[-128:] = bytes(128)
+        self.assertEqual(Record(raw).nframes, 5, 'Wrong number of frames!')
+
+        # zero samples of other encodings are data
+        raw[52] = 3
+        raw[64:] = bytes(448)
+        self.assertEqual(Record(raw).nframes, 7, 'Wrong number of frames!')
+
+
+    def testMSeed3(self):
+        """Convert MSEED records to miniSEED 3 and back"""
+
+        self.assertEqual(_crc32c(b'123456789'), 0xE3069283, 'Wrong CRC!')
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        v3 = BytesIO()
+        with RecordWriter(v3) as writer:
+            for rec in recs:
+                writer.write_v3(rec)
+
+        data = v3.getvalue()
+        self.assertEqual(data[:3], b'MS\x03', 'Wrong record indicator!')
+        size = Record(data).size
+        self.assertEqual(_crc32c(data[:28] + bytes(4) + data[32:size]),
+                         int.from_bytes(data[28:32], 'little'), 'Wrong CRC!')
+
+        v3.seek(0)
+        converted = list(Input(v3))
+        self.assertEqual(len(converted), len(recs), 'Wrong number of records!')
+        for (rec, rec3) in zip(recs, converted):
+            self.assertEqual(rec3.format, 3, 'Wrong format!')
+            self.assertEqual(rec3.sid, 'FDSN:GE_APE__B_H_Z', 'Wrong SID!')
+            self.assertEqual((rec3.net, rec3.sta, rec3.loc, rec3.cha),
+                             (rec.net, rec.sta, rec.loc, rec.cha),
+                             'Wrong stream!')
+            self.assertEqual(rec3.begin_ns, rec.begin_ns, 'Wrong begin time!')
+            self.assertEqual(rec3.end_ns, rec.end_ns, 'Wrong end time!')
+            self.assertEqual(rec3.X0, rec.X0, 'Wrong first sample!')
+            self.assertEqual(rec3.Xn, rec.Xn, 'Wrong last sample!')
+
+        fout = BytesIO()
+        with RecordWriter(fout) as writer:
+            for rec3 in converted:
+                writer.write(rec3, 9)
+
+        fout.seek(0)
+        for (rec, rec2) in zip(recs, Input(fout)):
+            self.assertEqual(rec2.format, 2, 'Wrong format!')
+            self.assertEqual(rec2.begin_ns, rec.begin_ns, 'Wrong begin time!')
+            self.assertEqual(rec2.nsamp, rec.nsamp, 'Wrong sample count!')
+            self.assertEqual(rec2.payload[:rec.nframes * 64],
+                             rec.payload[:rec.nframes * 64], 'Wrong data!')
+
+        # mixed formats in one file
+        mixed = BytesIO()
+        mixed.write(recs[0].header + recs[0].data)
+        mixed.write(converted[1].pack_v3())
+        mixed.write(recs[2].header + recs[2].data)
+        mixed.seek(0)
+        self.assertEqual([rec.format for rec in Input(mixed)], [2, 3, 2],
+                         'Wrong formats!')
+
+        with open('delete.me', 'wb') as fout:
+            fout.write(mixed.getvalue())
+
+        with MappedInput('delete.me') as inp:
+            self.assertEqual([rec.begin_ns for rec in inp],
+                             [rec.begin_ns for rec in recs[:3]],
+                             'Wrong begin times!')
+
+        os.remove('delete.me')
+
+
+    def testCRC(self):
+        """Compute and verify the CRC of miniSEED 3 records"""
+
+        self.assertEqual(_crc32c_py(b'123456789'), 0xE3069283, 'Wrong CRC!')
+
+        # bytewise reference for all chunk and tail lengths
+        table = []
+        for i in range(256):
+            c = i
+            for _ in range(8):
+                c = (c >> 1) ^ 0x82F63B78 if c & 1 else c >> 1
+
+            table.append(c)
+
+        for n in range(70):
+            data = os.urandom(n)
+            crc = 0xFFFFFFFF
+            for b in data:
+                crc = table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+
+            self.assertEqual(_crc32c_py(data), crc ^ 0xFFFFFFFF, 'Wrong CRC!')
+            self.assertEqual(_crc32c(data), crc ^ 0xFFFFFFFF, 'Wrong CRC!')
+
+            # continued over two pieces
+            k = n // 3
+            self.assertEqual(_crc32c_py(data[k:], _crc32c_py(data[:k])),
+                             crc ^ 0xFFFFFFFF, 'Wrong CRC!')
+            self.assertEqual(_crc32c(data[k:], _crc32c(data[:k])),
+                             crc ^ 0xFFFFFFFF, 'Wrong CRC!')
+
+        with open('waveform.mseed', 'rb') as fin:
+            good = next(iter(Input(fin))).pack_v3()
+
+        data = bytearray(good)
+        data[-1] ^= 1
+        with self.assertRaises(MSeedError):
+            Record(data)
+
+        inp = Input(BytesIO(bytes(data) + good), resync=True)
+        recs = list(inp)
+        self.assertEqual(len(recs), 1, 'Wrong number of records!')
+        self.assertEqual(inp.skipped_records, 1, 'Wrong number of records!')
+
+
+    def testMergeInputs(self):
+        """Merge several MSEED inputs by end time"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        with open('outputref.mseed', 'rb') as fin:
+            other = list(Input(fin))
+
+        with MappedInput('waveform.mseed') as inp1:
+            with MappedInput('outputref.mseed') as inp2:
+                merged = list(merge_inputs([inp1, inp2, []]))
+
+        self.assertEqual(len(merged), len(recs) + len(other),
+                         'Wrong number of records!')
+        self.assertEqual([rec.end_ns for rec in merged],
+                         sorted(rec.end_ns for rec in recs + other),
+                         'Records not ordered by end time!')
+        self.assertEqual([rec.begin_ns for rec in merged if rec.sta == 'APE'],
+                         [rec.begin_ns for rec in recs],
+                         'Wrong order within a stream!')
+
+
+    def testFilter(self):
+        """Select MSEED records by their raw header"""
+
+        recs = []
+        for name in ('waveform.mseed', 'outputref.mseed'):
+            with open(name, 'rb') as fin:
+                recs += list(Input(fin))
+
+        data = b''.join(bytes(rec.raw) for rec in recs) + recs[3].pack_v3()
+        recs.append(Record(recs[3].pack_v3()))
+        with open('delete.me', 'wb') as fout:
+            fout.write(data)
+
+        class Pipe(object):
+            """Non-seekable file"""
+            def __init__(self, data):
+                self.fd = BytesIO(data)
+
+            def read(self, n):
+                return self.fd.read(n)
+
+        start = recs[5].begin_ns + 1
+        end = recs[8].begin_ns
+        for select in (RecordFilter('GE.*'),
+                       RecordFilter(['XX.*', '*.APEX.*.X?Z']),
+                       RecordFilter(start_ns=start, end_ns=end),
+                       RecordFilter('GE.APE..BHZ', start_ns=start),
+                       RecordFilter(rectypes='R'),
+                       RecordFilter(fsamp=recs[0].fsamp),
+                       RecordFilter(fsamp=1.0)):
+            expected = [rec.begin_ns for rec in recs if select.match(rec)]
+            for inp in (Input(BytesIO(data), select=select),
+                        Input(Pipe(data), select=select),
+                        Input(BytesIO(data), resync=True, select=select),
+                        MappedInput('delete.me', select=select)):
+                self.assertEqual([rec.begin_ns for rec in inp], expected,
+                                 'Wrong records selected!')
+                self.assertEqual(inp.filtered_records,
+                                 len(recs) - len(expected),
+                                 'Wrong number of filtered records!')
+
+        os.remove('delete.me')
+
+
 def main():
     unittest.main()
 
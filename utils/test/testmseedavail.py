@@ -0,0 +1,98 @@
+"""Test for the mseedavail library."""
+import unittest
+from seiscomp.mseedlite import Input
+from seiscomp.mseedavail import Availability, file_availability, \
+    merge_availability
+from seiscomp.mseedscan import scan
+
+
+class MSeedAvailTests(unittest.TestCase):
+    """Test the functionality of mseedavail.py"""
+
+    def setUp(self):
+        with open('waveform.mseed', 'rb') as fin:
+            self.recs = list(Input(fin))
+
+
+    def testContinuous(self):
+        """Merge contiguous records into one segment"""
+
+        avail = Availability()
+        avail.add_records(self.recs)
+        (summary,) = avail.summaries()
+        self.assertEqual((summary.net, summary.sta, summary.loc, summary.cha),
+                         ('GE', 'APE', '', 'BHZ'), 'Wrong stream!')
+        self.assertEqual(summary.segments, 1, 'Wrong number of segments!')
+        self.assertEqual(summary.gaps, 0, 'Wrong number of gaps!')
+        self.assertEqual(summary.overlaps, 0, 'Wrong number of overlaps!')
+        self.assertEqual(summary.coverage, 100.0, 'Wrong coverage!')
+        self.assertEqual(summary.records, len(self.recs),
+                         'Wrong number of records!')
+        self.assertEqual(summary.begin_ns, self.recs[0].begin_ns,
+                         'Wrong begin time!')
+
+
+    def testGaps(self):
+        """Detect gaps and overlaps, also in unordered input"""
+
+        recs = self.recs
+        avail = Availability()
+        avail.add_records(recs[10:] + recs[3:4] + recs[:2] + recs[2:3] +
+                          recs[5:8] + recs[6:7])
+        summary = avail.summaries()[0]
+        self.assertEqual(summary.segments, 3, 'Wrong number of segments!')
+        self.assertEqual(summary.gaps, 2, 'Wrong number of gaps!')
+        self.assertEqual(summary.overlaps, 1, 'Wrong number of overlaps!')
+
+        stream = avail.streams[('GE', 'APE', '', 'BHZ')]
+        self.assertEqual(list(stream.begins), [recs[0].begin_ns,
+                                               recs[5].begin_ns,
+                                               recs[10].begin_ns],
+                         'Wrong segments!')
+
+        missing = sum(rec.end_ns - rec.begin_ns for rec in recs[4:5] +
+                      recs[8:10])
+        total = recs[-1].end_ns - recs[0].begin_ns
+        self.assertAlmostEqual(summary.coverage,
+                               100.0 * (total - missing) / total, 3,
+                               'Wrong coverage!')
+
+        # window within the second segment
+        summary = stream.summary(recs[6].begin_ns, recs[7].end_ns)
+        self.assertEqual((summary.segments, summary.gaps, summary.coverage),
+                         (1, 0, 100.0), 'Wrong window summary!')
+
+
+    def testMerge(self):
+        """Merge availability of several files"""
+
+        part1 = Availability()
+        part1.add_records(self.recs[:8])
+        part2 = Availability()
+        part2.add_records(self.recs[8:])
+        merged = merge_availability(merge_availability(None, part1), part2)
+        self.assertEqual(merged.summaries()[0].segments, 1, 'Not merged!')
+
+        # streams taken over from another Availability are copies
+        part1 = Availability()
+        part1.add_records(self.recs[:8])
+        merged = Availability()
+        merged.update(part1)
+        merged.update(part2)
+        self.assertEqual(merged.summaries()[0].segments, 1, 'Not merged!')
+        stream = part1.streams[('GE', 'APE', '', 'BHZ')]
+        self.assertEqual((len(stream.begins), stream.records),
+                         (1, 8), 'Merged into the other Availability!')
+
+        avail = scan(['waveform.mseed', 'outputref.mseed'],
+                     func=file_availability, reduce=merge_availability,
+                     workers=2)
+        self.assertEqual(len(avail.summaries()), 2, 'Wrong number of streams!')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Test for the mseedcodec library."""
+import unittest
+import numpy as np
+from seiscomp.mseedlite import Input, Record, MSeedError, _pack_header
+from seiscomp.mseedcodec import decode, decode_records, decode_streams, \
+    pack_records, ENC_INT32, ENC_STEIM1, ENC_STEIM2
+
+
+class MSeedCodecTests(unittest.TestCase):
+    """Test the functionality of mseedcodec.py"""
+
+    def testDecoding(self):
+        """Decode Steim-2 records"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        samples = decode_records(recs)
+        self.assertEqual(len(samples), len(recs), 'Wrong number of records!')
+        for rec, smp in zip(recs, samples):
+            self.assertEqual(len(smp), rec.nsamp, 'Wrong number of samples!')
+            self.assertEqual(smp[0], rec.X0, 'Wrong first sample!')
+            self.assertEqual(smp[-1], rec.Xn, 'Wrong last sample!')
+
+        self.assertTrue(np.array_equal(decode(recs[3]), samples[3]),
+                        'Single record decoding differs from batch!')
+
+
+    def testMerged(self):
+        """Decode merged Steim-2 records"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            orig = np.concatenate(decode_records(Input(fin)))
+
+        with open('mergeref.mseed', 'rb') as fin:
+            merged = np.concatenate(decode_records(Input(fin)))
+
+        self.assertTrue(np.array_equal(orig, merged),
+                        'Merged records decode differently!')
+
+
+    def testStreams(self):
+        """Assemble segments with gaps"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        streams = decode_streams(recs)
+        self.assertEqual(len(streams), 1, 'Wrong number of streams!')
+        stream = streams[('GE', 'APE', '', 'BHZ')]
+        self.assertEqual(len(stream.segments), 1, 'Wrong number of segments!')
+        self.assertEqual(len(stream.segments[0].samples),
+                         sum(rec.nsamp for rec in recs),
+                         'Wrong number of samples!')
+
+        del recs[10]
+        stream = decode_streams(reversed(recs))[('GE', 'APE', '', 'BHZ')]
+        self.assertEqual(len(stream.segments), 2, 'Wrong number of segments!')
+        self.assertEqual(len(stream.gaps), 1, 'Wrong number of gaps!')
+        self.assertEqual(stream.overlaps, [], 'Unexpected overlap!')
+        self.assertEqual(stream.segments[1].begin_ns, recs[10].begin_ns,
+                         'Wrong segment start!')
+
+
+    def testPacking(self):
+        """Compress and pack samples into new records"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        orig = np.concatenate(decode_records(recs))
+        for encoding in (ENC_STEIM1, ENC_STEIM2):
+            for reclen in (512, 4096):
+                packed = list(pack_records('GE', 'APE', '', 'BHZ', 20.0,
+                                           recs[0].begin_ns, orig,
+                                           encoding=encoding, reclen=reclen,
+                                           X_minus1=recs[0].X_minus1))
+                for rec in packed:
+                    self.assertEqual(rec.size, reclen, 'Wrong record size!')
+                    self.assertEqual(rec.encoding, encoding, 'Wrong encoding!')
+
+                self.assertEqual(packed[0].begin_time, recs[0].begin_time,
+                                 'Wrong begin time!')
+                self.assertEqual(packed[-1].end_time, recs[-1].end_time,
+                                 'Wrong end time!')
+                self.assertEqual(packed[0].X_minus1, recs[0].X_minus1,
+                                 'Wrong X[-1]!')
+                self.assertTrue(np.array_equal(
+                    np.concatenate(decode_records(packed)), orig),
+                    'Packed samples differ from original!')
+
+        self.assertEqual(len(list(pack_records('GE', 'APE', '', 'BHZ', 20.0,
+                                               recs[0].begin_ns, orig,
+                                               reclen=4096))), 3,
+                         'Records not filled completely!')
+
+
+    def testSampleLimit(self):
+        """Limit the samples per record to the 16-bit header field"""
+
+        samples = np.zeros(200000, dtype=np.int64)
+        packed = list(pack_records('GE', 'APE', '', 'BHZ', 20.0, 0, samples,
+                                   reclen=65536))
+        for rec in packed:
+            self.assertLessEqual(rec.nsamp, 65535, 'Too many samples!')
+
+        self.assertEqual(sum(rec.nsamp for rec in packed), len(samples),
+                         'Wrong number of samples!')
+        self.assertEqual(packed[1].begin_ns, packed[0].end_ns,
+                         'Records not contiguous!')
+        self.assertTrue(np.array_equal(
+            np.concatenate(decode_records(packed)), samples),
+            'Packed samples differ from original!')
+
+
+    def testMSeed3(self):
+        """Decode miniSEED 3 records"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        recs3 = [Record(rec.pack_v3()) for rec in recs]
+        self.assertTrue(np.array_equal(np.concatenate(decode_records(recs)),
+                                       np.concatenate(decode_records(recs3))),
+                        'miniSEED 3 records decode differently!')
+
+        rec = Record(_pack_header(1, 'D', 'GE', 'APE', '', 'BHZ',
+                                  recs[0].begin_ns, 100, 20, 1, ENC_INT32, 9,
+                                  0) + np.arange(100, dtype='>i4').tobytes()
+                     + bytes(48))
+        recs3 = [Record(rec.pack_v3())]
+        self.assertEqual(recs3[0].byteorder, 0, 'Wrong byte order!')
+        self.assertTrue(np.array_equal(np.concatenate(decode_records(recs3)),
+                                       np.arange(100)),
+                        'Wrong uncompressed samples!')
+
+
+    def testShortPayload(self):
+        """Reject uncompressed records with too little data"""
+
+        # 200 samples do not fit into the 448 bytes of data
+        rec = Record(_pack_header(1, 'D', 'GE', 'APE', '', 'BHZ', 0, 200, 20,
+                                  1, ENC_INT32, 9, 0)
+                     + np.arange(112, dtype='>i4').tobytes())
+        with self.assertRaises(MSeedError):
+            decode(rec)
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Test for the mseedindex library."""
+import unittest
+import os
+import shutil
+import tempfile
+from seiscomp.mseedlite import Input
+from seiscomp.mseedindex import RecordIndex, index_path, open_index, \
+    read_window
+
+
+class MSeedIndexTests(unittest.TestCase):
+    """Test the functionality of mseedindex.py"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'waveform.mseed')
+        shutil.copy('waveform.mseed', self.path)
+        with open(self.path, 'rb') as fin:
+            self.recs = list(Input(fin))
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def testBuild(self):
+        """Build, save and load an index"""
+
+        idx = open_index(self.path)
+        self.assertTrue(os.path.exists(index_path(self.path)),
+                        'Index not saved!')
+        self.assertEqual(len(idx), len(self.recs), 'Wrong number of entries!')
+        self.assertEqual(idx.streams, [('GE', 'APE', '', 'BHZ')],
+                         'Wrong streams!')
+
+        loaded = RecordIndex.load(index_path(self.path))
+        self.assertFalse(loaded.is_stale(self.path), 'Index is stale!')
+        for name in ('offsets', 'begin_ns', 'end_ns', 'nsamp', 'stream'):
+            self.assertEqual(getattr(loaded, name), getattr(idx, name),
+                             'Wrong column %s!' % name)
+
+
+    def testQuery(self):
+        """Query time windows"""
+
+        idx = open_index(self.path)
+        recs = self.recs
+        self.assertEqual(len(idx.query()), len(recs), 'Wrong full query!')
+        self.assertEqual(idx.query(cha='HH?'), [], 'Wrong stream selection!')
+
+        for (start, end) in ((recs[3].begin_ns, recs[5].end_ns),
+                             (recs[3].begin_ns + 1, recs[5].begin_ns + 1),
+                             (recs[3].end_ns, recs[4].end_ns),
+                             (recs[-1].end_ns, None),
+                             (None, recs[0].begin_ns)):
+            expected = [rec.begin_ns for rec in recs
+                        if (start is None or rec.end_ns > start) and
+                        (end is None or rec.begin_ns < end)]
+            found = [rec.begin_ns for rec in read_window(self.path, start, end,
+                                                         net='GE')]
+            self.assertEqual(found, expected, 'Wrong records in window!')
+
+
+    def testStale(self):
+        """Rebuild a stale index"""
+
+        idx = open_index(self.path)
+        with open(self.path, 'ab') as fout:
+            fout.write(self.recs[0].header + self.recs[0].data)
+
+        self.assertTrue(idx.is_stale(self.path), 'Index is not stale!')
+        idx = open_index(self.path)
+        self.assertEqual(len(idx), len(self.recs) + 1,
+                         'Index not rebuilt!')
+        self.assertFalse(RecordIndex.load(index_path(self.path))
+                         .is_stale(self.path), 'Index not saved!')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
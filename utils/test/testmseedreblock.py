@@ -0,0 +1,155 @@
+"""Test for the mseedreblock library."""
+import struct
+import unittest
+import numpy as np
+from seiscomp.mseedlite import Input, Record
+from seiscomp.mseedcodec import decode_records, pack_records
+from seiscomp.mseedreblock import Reblocker, contiguous, plain, reblock
+
+
+class MSeedReblockTests(unittest.TestCase):
+    """Test the functionality of mseedreblock.py"""
+
+    def setUp(self):
+        with open('waveform.mseed', 'rb') as fin:
+            self.recs = list(Input(fin))
+
+        self.samples = np.concatenate(decode_records(self.recs))
+
+
+    def testFrames(self):
+        """Concatenate Steim frames into larger records"""
+
+        for reclen in (4096, 8192):
+            out = list(reblock(self.recs, reclen))
+            self.assertEqual(len(out), -(-len(self.recs) * 7 // (reclen // 64 - 1)),
+                             'Wrong number of records!')
+            for rec in out:
+                self.assertEqual(rec.size, reclen, 'Wrong record size!')
+
+            self.assertEqual([rec.recno for rec in out],
+                             list(range(1, len(out) + 1)),
+                             'Wrong sequence numbers!')
+            self.assertEqual(out[0].begin_ns, self.recs[0].begin_ns,
+                             'Wrong begin time!')
+            self.assertEqual(sum(rec.nsamp for rec in out),
+                             sum(rec.nsamp for rec in self.recs),
+                             'Wrong number of samples!')
+            self.assertTrue(np.array_equal(
+                np.concatenate(decode_records(out)), self.samples),
+                'Reblocked samples differ from original!')
+
+
+    def testRepack(self):
+        """Repack samples into fully filled records"""
+
+        out = list(reblock(self.recs, 512, repack=True))
+        self.assertTrue(np.array_equal(
+            np.concatenate(decode_records(out)), self.samples),
+            'Repacked samples differ from original!')
+        self.assertEqual(out[0].X_minus1, self.recs[0].X_minus1,
+                         'Wrong X[-1]!')
+
+
+    def testGaps(self):
+        """Split at discontinuities"""
+
+        recs = self.recs[:5] + self.recs[6:]
+        self.assertTrue(contiguous(recs[3], recs[4]), 'Not contiguous!')
+        self.assertFalse(contiguous(recs[4], recs[5]), 'Gap not detected!')
+
+        reblocker = Reblocker(4096)
+        out = []
+        for rec in recs:
+            out += reblocker.feed(rec)
+
+        out += reblocker.flush()
+        self.assertEqual(reblocker.records_in, len(recs),
+                         'Wrong number of input records!')
+        self.assertEqual(reblocker.records_out, len(out),
+                         'Wrong number of output records!')
+        self.assertEqual([rec.nsamp for rec in out[:1]],
+                         [sum(rec.nsamp for rec in recs[:5])],
+                         'Not split at gap!')
+        self.assertEqual(out[1].begin_ns, recs[5].begin_ns,
+                         'Wrong begin time after gap!')
+
+
+
+    def testPassThrough(self):
+        """Keep records with a time correction or other blockettes"""
+
+        # time correction in the fixed header
+        corrected = bytearray(self.recs[3].raw)
+        struct.pack_into('>l', corrected, 40, 1500)
+
+        # blockette 100 after blockettes 1000 and 1001, data at offset 128
+        raw = self.recs[1].raw
+        extended = bytearray(1024)
+        extended[:64] = raw[:64]
+        extended[39] = 3
+        struct.pack_into('>H', extended, 44, 128)
+        extended[54] = 10
+        struct.pack_into('>H', extended, 58, 64)
+        extended[64:76] = struct.pack('>2HfB3x', 100, 0, 20.0, 0)
+        extended[128:576] = raw[64:]
+
+        recs = list(self.recs)
+        recs[1] = Record(bytes(extended))
+        recs[3] = Record(bytes(corrected))
+        self.assertTrue(plain(self.recs[1]), 'Plain record not detected!')
+        for rec in recs[1], recs[3]:
+            self.assertFalse(plain(rec), 'Extra header not detected!')
+
+        for repack in (False, True):
+            out = list(reblock(recs, 4096, repack))
+            self.assertEqual(out[1].raw, recs[1].raw, 'Record changed!')
+            self.assertEqual(out[3].raw, recs[3].raw, 'Record changed!')
+            self.assertTrue(np.array_equal(
+                np.concatenate(decode_records(out)), self.samples),
+                'Reblocked samples differ from original!')
+
+
+    def testSampleLimit(self):
+        """Limit the samples per record to the 16-bit header field"""
+
+        samples = np.zeros(200000, dtype=np.int64)
+        recs = list(pack_records('GE', 'APE', '', 'BHZ', 20.0, 0, samples,
+                                 reclen=4096))
+
+        for repack in (False, True):
+            out = list(reblock(recs, 65536, repack))
+            for rec in out:
+                self.assertLessEqual(rec.nsamp, 65535, 'Too many samples!')
+
+            self.assertGreater(len(out), 3, 'Wrong number of records!')
+            self.assertTrue(np.array_equal(
+                np.concatenate(decode_records(out)), samples),
+                'Reblocked samples differ from original!')
+
+
+    def testDrift(self):
+        """Keep the exact start time when repacking a long stream"""
+
+        # 3 Hz: the header times are truncated to microseconds
+        samples = np.arange(2000000, dtype=np.int64) % 200 - 100
+        begin_ns = 1200000000000000000
+        recs = list(pack_records('GE', 'APE', '', 'BHZ', 3.0, begin_ns,
+                                 samples, reclen=4096))
+
+        nsamp = 0
+        for rec in reblock(recs, 512, True):
+            expected = begin_ns + (nsamp * 1000000000 + 1) // 3
+            self.assertLess(abs(Record(rec.raw).begin_ns - expected), 1000,
+                            'Start time drifts!')
+            nsamp += rec.nsamp
+
+        self.assertEqual(nsamp, len(samples), 'Wrong number of samples!')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Test for the mseedscan library."""
+import os
+import shutil
+import tempfile
+import unittest
+from seiscomp.mseedlite import Input
+from seiscomp.mseedindex import open_index
+from seiscomp.mseedscan import scan, expand_paths, record_summaries, \
+    merge_spans
+
+
+class MSeedScanTests(unittest.TestCase):
+    """Test the functionality of mseedscan.py"""
+
+    def testScan(self):
+        """Scan MSEED files in a process pool"""
+
+        files = ['waveform.mseed', 'mergeref.mseed', 'outputref.mseed']
+        results = scan(files, workers=2)
+        self.assertEqual(sorted(results), sorted(files), 'Wrong files!')
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        span = results['waveform.mseed'][('GE', 'APE', '', 'BHZ')]
+        self.assertEqual(span, (recs[0].begin_ns, recs[-1].end_ns, len(recs),
+                                sum(rec.nsamp for rec in recs)),
+                         'Wrong stream span!')
+
+        spans = scan(files, reduce=merge_spans, initial={}, workers=2)
+        self.assertEqual(sorted(spans), [('GE', 'APE', '', 'BHZ'),
+                                         ('GX', 'APEX', '01', 'XHZ')],
+                         'Wrong streams!')
+        self.assertEqual(spans[('GE', 'APE', '', 'BHZ')][2], 23,
+                         'Wrong number of records!')
+
+
+    def testSummaries(self):
+        """Summarize the records of a file"""
+
+        infos = scan('*.mseed', func=record_summaries, workers=1)
+        self.assertEqual(len(infos['mergeref.mseed']), 3,
+                         'Wrong number of records!')
+        self.assertEqual([info.offset for info in infos['mergeref.mseed']],
+                         [0, 4096, 8192], 'Wrong offsets!')
+
+
+    def testDirectory(self):
+        """Scan the Mini-SEED files of a directory"""
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        for name in ('waveform.mseed', 'outputref.mseed'):
+            shutil.copy(name, tmpdir)
+
+        open_index(os.path.join(tmpdir, 'waveform.mseed'))
+        with open(os.path.join(tmpdir, 'README.txt'), 'w') as fout:
+            fout.write('test data\n')
+
+        with open(os.path.join(tmpdir, '.lock'), 'w') as fout:
+            pass
+
+        names = [os.path.basename(path) for path in expand_paths(tmpdir)]
+        self.assertEqual(names, ['README.txt', 'outputref.mseed',
+                                 'waveform.mseed'], 'Wrong files!')
+
+        spans = scan(tmpdir, reduce=merge_spans, workers=1,
+                     pattern='*.mseed')
+        self.assertEqual(sorted(spans), [('GE', 'APE', '', 'BHZ'),
+                                         ('GX', 'APEX', '01', 'XHZ')],
+                         'Wrong streams!')
+
+
+    def testErrors(self):
+        """Collect errors of unreadable files"""
+
+        errors = {}
+        results = scan(['waveform.mseed', 'missing.mseed'], workers=2,
+                       errors=errors)
+        self.assertEqual(list(results), ['waveform.mseed'], 'Wrong results!')
+        self.assertEqual(list(errors), ['missing.mseed'], 'Wrong errors!')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Test for the mseedsds library."""
+import unittest
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from seiscomp.mseedlite import Input, Record
+from seiscomp.mseedsds import (SDSWriter, day_of, demultiplex, sds_path,
+                               sds_streams)
+
+
+class MSeedSDSTests(unittest.TestCase):
+    """Test the functionality of mseedsds.py"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+
+    def testPath(self):
+        """Build SDS day file paths"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            rec = next(iter(Input(fin)))
+
+        self.assertEqual(sds_path('sds', 'GE', 'APE', '', 'BHZ',
+                                  day_of(rec.begin_ns)),
+                         os.path.join('sds', '2008', 'GE', 'APE', 'BHZ.D',
+                                      'GE.APE..BHZ.D.2008.001'),
+                         'Wrong path!')
+
+
+    def testWriter(self):
+        """Demultiplex records into day files"""
+
+        recs = []
+        for name in ('waveform.mseed', 'outputref.mseed'):
+            with open(name, 'rb') as fin:
+                recs += list(Input(fin))
+
+        # move the second half of the first stream to the next day
+        for rec in recs[10:20]:
+            rec.begin_ns += 86400 * 10**9
+            fout = BytesIO()
+            rec.write(fout, 9)
+            recs[recs.index(rec)] = Record(fout.getvalue())
+
+        # interleave the streams
+        recs = [rec for pair in zip(recs[:20], recs[20:]) for rec in pair]
+
+        with SDSWriter(self.root, max_open=1, bufsize=512) as writer:
+            for rec in recs:
+                writer.write(rec)
+
+        self.assertGreater(writer.files_opened, 3, 'Files not reopened!')
+
+        files = {}
+        for rec in recs:
+            files.setdefault(writer.path(rec), []).append(bytes(rec.raw))
+
+        self.assertEqual(len(files), 3, 'Wrong number of day files!')
+        for (path, data) in files.items():
+            with open(path, 'rb') as fin:
+                self.assertEqual(fin.read(), b''.join(data),
+                                 'Wrong content of %s!' % path)
+
+
+    def testDemultiplex(self):
+        """Demultiplex several files in parallel"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            recs = list(Input(fin))
+
+        # two inputs holding alternate records of the same stream
+        paths = []
+        for i in range(2):
+            paths.append(os.path.join(self.root, 'in%d.mseed' % i))
+            with open(paths[-1], 'wb') as fout:
+                for rec in recs[i::2]:
+                    fout.write(rec.raw)
+
+        archive = os.path.join(self.root, 'sds')
+        demultiplex(paths + ['outputref.mseed'], archive, workers=2)
+
+        with open(sds_path(archive, 'GE', 'APE', '', 'BHZ',
+                           day_of(recs[0].begin_ns)), 'rb') as fin:
+            self.assertEqual(fin.read(), b''.join(rec.raw for rec in recs),
+                             'Records not merged in time order!')
+
+        self.assertEqual(sorted(os.listdir(archive)), ['2008'],
+                         'Staging directory not removed!')
+
+        # add the records in reverse order to the existing day file
+        with open(paths[0], 'wb') as fout:
+            for rec in reversed(recs):
+                fout.write(rec.raw)
+
+        demultiplex(paths[:1], archive, workers=1)
+        with open(sds_path(archive, 'GE', 'APE', '', 'BHZ',
+                           day_of(recs[0].begin_ns)), 'rb') as fin:
+            self.assertEqual(fin.read(),
+                             b''.join(bytes(rec.raw) * 2 for rec in recs),
+                             'Records not merged in time order!')
+
+
+
+    def testStreams(self):
+        """Find the day files of a time window"""
+
+        archive = os.path.join(self.root, 'sds')
+        demultiplex(['waveform.mseed', 'outputref.mseed'], archive, workers=1)
+
+        with open('waveform.mseed', 'rb') as fin:
+            rec = next(iter(Input(fin)))
+
+        streams = sds_streams(archive)
+        self.assertEqual(sorted(streams), [('GE', 'APE', '', 'BHZ'),
+                                           ('GX', 'APEX', '01', 'XHZ')],
+                         'Wrong streams!')
+
+        streams = sds_streams(archive, rec.begin_ns, rec.end_ns, ['GE.*'])
+        self.assertEqual(streams, {('GE', 'APE', '', 'BHZ'): [
+            sds_path(archive, 'GE', 'APE', '', 'BHZ', day_of(rec.begin_ns))]},
+                         'Wrong day files!')
+
+        day = 86400 * 10**9
+        self.assertEqual(sds_streams(archive, rec.begin_ns + 2 * day), {},
+                         'Day files outside of the time window!')
+
+        # files not named like day files are ignored
+        day_file = sds_path(archive, 'GE', 'APE', '', 'BHZ',
+                            day_of(rec.begin_ns))
+        for suffix in ('.2008.1a', '.yyyy.001', '.2008.001.bak'):
+            shutil.copy(day_file, day_file.rsplit('.', 2)[0] + suffix)
+
+        self.assertEqual(sds_streams(archive)[('GE', 'APE', '', 'BHZ')],
+                         [day_file], 'Wrong day files!')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+"""Test for the msrtsimul application."""
+import asyncio
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from io import BytesIO, StringIO
+from unittest import mock
+from seiscomp.mseedlite import Input, Record
+
+# the application is not a module on the path
+spec = importlib.util.spec_from_file_location('msrtsimul',
+                                              '../apps/msrtsimul.py')
+msrtsimul = importlib.util.module_from_spec(spec)
+sys.modules['msrtsimul'] = msrtsimul
+spec.loader.exec_module(msrtsimul)
+
+
+class FakeClock(object):
+    """Monotonic clock advancing only when sleeping"""
+
+    def __init__(self, oversleep=0.0):
+        self.now = 1000000000
+        self.oversleep = oversleep
+        self.sleeps = []
+
+    def monotonic_ns(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += round((seconds + self.oversleep) * 1000000000)
+
+
+class SlowOutput(object):
+    """Output collecting batches, blocked until the gate is opened"""
+
+    def __init__(self, name, gated=False):
+        self.name = name
+        self.batches = []
+        self.sending = threading.Event()
+        self.gate = threading.Event()
+        if not gated:
+            self.gate.set()
+
+    async def start(self):
+        pass
+
+    async def send(self, recs):
+        self.sending.set()
+        await asyncio.get_running_loop().run_in_executor(None, self.gate.wait)
+        self.batches.append(recs)
+
+    async def close(self):
+        pass
+
+
+class FakeRecord(object):
+    """Record with an end time only"""
+
+    def __init__(self, ms):
+        self.ms = ms
+        self.end_ns = ms * 1000000
+
+
+class MSRTSimulTests(unittest.TestCase):
+    """Test the functionality of msrtsimul.py"""
+
+    def schedule(self, times, oversleep=0.0, **kwargs):
+        """Schedule records ending at the given times in ms.
+
+        Returns the batches of end times and the clock.
+        """
+        clock = FakeClock(oversleep)
+        recs = [FakeRecord(ms) for ms in times]
+        with mock.patch.object(msrtsimul, 'time', clock):
+            batches = [[rec.ms for rec in batch]
+                       for batch in msrtsimul.rt_batches(recs, **kwargs)]
+
+        return (batches, clock)
+
+
+    def testTick(self):
+        """Send records due within a tick in one batch"""
+
+        (batches, clock) = self.schedule([0, 5, 8, 20, 29, 31, 100],
+                                         tick=0.01)
+        self.assertEqual(batches, [[0, 5, 8], [20, 29], [31], [100]],
+                         'Wrong batches!')
+        self.assertEqual(clock.sleeps, [0.02, 0.011, 0.069],
+                         'Wrong sleep times!')
+
+        (batches, clock) = self.schedule([0, 5, 8], tick=0.0)
+        self.assertEqual(batches, [[0], [5], [8]], 'Wrong batches!')
+
+
+    def testSpeed(self):
+        """Scale the release times by the speed"""
+
+        (batches, clock) = self.schedule([0, 1000, 2000, 3000], speed=2.0,
+                                         tick=0.0)
+        self.assertEqual(batches, [[0], [1000], [2000], [3000]],
+                         'Wrong batches!')
+        self.assertEqual(clock.sleeps, [0.5] * 3, 'Wrong sleep times!')
+        self.assertEqual(clock.now, 2500000000, 'Wrong end time!')
+
+        # records due within a tick at high speed
+        (batches, clock) = self.schedule([0, 1000, 2000, 3000], speed=200.0,
+                                         tick=0.01)
+        self.assertEqual(batches, [[0, 1000, 2000], [3000]],
+                         'Wrong batches!')
+        self.assertEqual(clock.sleeps, [0.015], 'Wrong sleep times!')
+
+
+    def testJump(self):
+        """Skip the records within the first minutes"""
+
+        (batches, clock) = self.schedule(
+            [0, 10000, 20000, 30000, 40000], jump=0.5, tick=0.0)
+        self.assertEqual(batches, [[30000], [40000]], 'Wrong batches!')
+        self.assertEqual(clock.sleeps, [10.0], 'Wrong sleep times!')
+
+        (batches, clock) = self.schedule([0, 10000], jump=1.0)
+        self.assertEqual(batches, [], 'Records not skipped!')
+
+        (batches, clock) = self.schedule([])
+        self.assertEqual(batches, [], 'Wrong batches!')
+
+
+    def testDriftStats(self):
+        """Report the lateness of the records"""
+
+        stats = msrtsimul.DriftStats()
+        self.assertEqual(str(stats), 'no records sent', 'Wrong report!')
+
+        (batches, clock) = self.schedule([0, 1000, 1005], oversleep=0.002,
+                                         tick=0.01, stats=stats)
+        self.assertEqual(batches, [[0], [1000, 1005]], 'Wrong batches!')
+        self.assertEqual(stats.records, 3, 'Wrong number of records!')
+        self.assertEqual(stats.batches, 2, 'Wrong number of batches!')
+        self.assertEqual(stats.min_ns, -3000000, 'Wrong minimum!')
+        self.assertEqual(stats.max_ns, 2000000, 'Wrong maximum!')
+        self.assertEqual(stats.mean_ns, -333334, 'Wrong mean!')
+        self.assertEqual(str(stats), '3 records in 2 batches, lateness mean '
+                         '-0.333 ms, min -3.000 ms, max 2.000 ms',
+                         'Wrong report!')
+
+        stats.add(4000000, 3)
+        self.assertEqual(stats.records, 6, 'Wrong number of records!')
+        self.assertEqual(stats.mean_ns, 1833333, 'Wrong mean!')
+        self.assertEqual(stats.max_ns, 4000000, 'Wrong maximum!')
+
+
+    def testSources(self):
+        """Merge the release times of several sources"""
+
+        recs = []
+        for name in ('waveform.mseed', 'outputref.mseed'):
+            with open(name, 'rb') as fin:
+                recs.append(list(Input(fin)))
+
+        # one stream in consecutive files
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        paths = [os.path.join(tmpdir, name) for name in ('1', '2')]
+        for (path, part) in zip(paths, (recs[0][:10], recs[0][10:])):
+            with open(path, 'wb') as fout:
+                for rec in part:
+                    fout.write(rec.raw)
+
+        stream = list(msrtsimul.stream_records(paths))
+        self.assertEqual([rec.begin_ns for rec in stream],
+                         [rec.begin_ns for rec in recs[0]],
+                         'Wrong records!')
+
+        delays = {'GE.APE': 2.5, 'default': 1.0}
+        times = [t for (t, _) in msrtsimul.release_times(stream, delays, True)]
+        self.assertEqual(times, [rec.end_ns + 2500000000 for rec in recs[0]],
+                         'Wrong release times!')
+
+        merged = list(msrtsimul.merge_sources(
+            [msrtsimul.release_times(part, delays) for part in recs]))
+        self.assertEqual([t for (t, _) in merged],
+                         sorted([rec.end_ns + 2500000000 for rec in recs[0]] +
+                                [rec.end_ns + 1000000000 for rec in recs[1]]),
+                         'Wrong order!')
+
+
+    def testParseTime(self):
+        """Parse the time window and reject malformed times"""
+
+        self.assertEqual(msrtsimul.parse_time('2024-01-01T12:00'),
+                         1704110400000000000, 'Wrong time!')
+        self.assertEqual(msrtsimul.parse_time('2024-01-01T12:00:00.5Z'),
+                         1704110400500000000, 'Wrong time!')
+        self.assertEqual(msrtsimul.parse_time('2024-01-01T13:00:00+01:00'),
+                         1704110400000000000, 'Wrong time!')
+
+        # malformed times are usage errors
+        for argv in (['--start', '2024-13-01'], ['--end', 'yesterday']):
+            (out, err) = (StringIO(), StringIO())
+            with mock.patch.object(sys, 'argv', ['msrtsimul'] + argv), \
+                    mock.patch.object(sys, 'stdout', out), \
+                    mock.patch.object(sys, 'stderr', err):
+                self.assertEqual(msrtsimul.main(), 1, 'Wrong exit code!')
+
+            self.assertEqual(err.getvalue(),
+                             f"invalid time for {argv[0]}: '{argv[1]}'\n",
+                             'Wrong error message!')
+            self.assertTrue(out.getvalue().startswith('Usage:'),
+                            'Usage not printed!')
+
+
+    def testFanOutDrop(self):
+        """Drop batches for a slow output only"""
+
+        (slow, fast) = (SlowOutput('slow', True), SlowOutput('fast'))
+        self.addCleanup(slow.gate.set)
+        fanout = msrtsimul.FanOut([slow, fast], maxsize=1, policy='drop')
+        fanout.write([0, 1])
+        self.assertTrue(slow.sending.wait(5), 'Batch not sent!')
+
+        # one batch is queued for the slow output, the others are dropped
+        for i in range(2, 10, 2):
+            fanout.write([i, i + 1])
+            deadline = time.monotonic() + 5
+            while len(fast.batches) <= i // 2 and time.monotonic() < deadline:
+                time.sleep(0.001)
+
+        self.assertEqual(fast.batches, [[i, i + 1] for i in range(0, 10, 2)],
+                         'Other output not fed!')
+        self.assertEqual(slow.batches, [], 'Slow output not blocked!')
+
+        slow.gate.set()
+        fanout.close()
+        self.assertEqual(slow.batches, [[0, 1], [2, 3]], 'Wrong batches!')
+
+        (slow_stats, fast_stats) = fanout.stats
+        self.assertEqual(slow_stats.dropped, 6, 'Wrong number of records!')
+        self.assertEqual(slow_stats.records, 4, 'Wrong number of records!')
+        self.assertEqual(slow_stats.batches, 2, 'Wrong number of batches!')
+        self.assertEqual(slow_stats.max_queued, 1, 'Wrong queue size!')
+        self.assertEqual(fast_stats.dropped, 0, 'Wrong number of records!')
+        self.assertEqual(fast_stats.records, 10, 'Wrong number of records!')
+        self.assertEqual(fast_stats.batches, 5, 'Wrong number of batches!')
+        self.assertTrue(str(slow_stats).startswith('slow: 4 records in 2 '
+                                                   'batches, lag mean'),
+                        'Wrong report!')
+        self.assertIn('6 records dropped', str(slow_stats), 'Wrong report!')
+
+
+    def testFanOutBlock(self):
+        """Block the playback while the queue of an output is full"""
+
+        (slow, fast) = (SlowOutput('slow', True), SlowOutput('fast'))
+        self.addCleanup(slow.gate.set)
+        fanout = msrtsimul.FanOut([slow, fast], maxsize=1, policy='block')
+        fanout.write([0])
+        self.assertTrue(slow.sending.wait(5), 'Batch not sent!')
+        fanout.write([1])
+
+        writer = threading.Thread(target=fanout.write, args=([2],))
+        writer.start()
+        writer.join(0.2)
+        self.assertTrue(writer.is_alive(), 'Playback not blocked!')
+
+        slow.gate.set()
+        writer.join(5)
+        self.assertFalse(writer.is_alive(), 'Playback still blocked!')
+        fanout.close()
+
+        for (output, stats) in zip((slow, fast), fanout.stats):
+            self.assertEqual(output.batches, [[0], [1], [2]],
+                             'Wrong batches!')
+            self.assertEqual(stats.dropped, 0, 'Wrong number of records!')
+            self.assertEqual(stats.records, 3, 'Wrong number of records!')
+
+        # the first batch waited for the gate
+        self.assertGreaterEqual(fanout.stats[0].max_ns, 200000000,
+                                'Wrong lag!')
+        self.assertLess(fanout.stats[1].min_ns, 200000000, 'Wrong lag!')
+
+
+    def testFileOutput(self):
+        """Close the output files, but not standard output"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            data = fin.read()
+
+        recs = list(Input(BytesIO(data)))
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'output.mseed')
+        stdout = mock.Mock(buffer=BytesIO())
+        with mock.patch('sys.stdout', stdout):
+            outputs = [msrtsimul.FileOutput(open(path, 'wb'), path),
+                       msrtsimul.FileOutput(stdout.buffer, 'stdout')]
+            fanout = msrtsimul.FanOut(outputs, maxsize=2, policy='block')
+            fanout.write(recs[:4])
+            fanout.write(recs[4:])
+            fanout.close()
+
+        self.assertTrue(outputs[0].fd.closed, 'File not closed!')
+        self.assertFalse(stdout.buffer.closed, 'Standard output closed!')
+        self.assertEqual(stdout.buffer.getvalue(), data, 'Wrong output!')
+        with open(path, 'rb') as fin:
+            self.assertEqual(fin.read(), data, 'Wrong output!')
+
+
+    def testBenchmark(self):
+        """Count the records, samples and bytes of a benchmark run"""
+
+        with open('waveform.mseed', 'rb') as fin:
+            data = fin.read()
+
+        # a 4096-byte record is only replayed with -u
+        large = Record(data[:512])
+        large.merge(Record(data[512:1024]))
+        fout = BytesIO()
+        large.write(fout, 12)
+        data += fout.getvalue()
+
+        for (ulimited, records, samples, nbytes) in (
+                (False, 20, 9086, 20 * 512),
+                (True, 21, 9086 + large.nsamp, 20 * 512 + 4096)):
+            for mode in ('realtime', 'historic'):
+                recs = list(Input(BytesIO(data)))
+                stats = msrtsimul.benchmark(
+                    msrtsimul.release_times(recs), mode, ulimited, chunk=7)
+                self.assertEqual(stats.records, records,
+                                 'Wrong number of records!')
+                self.assertEqual(stats.samples, samples,
+                                 'Wrong number of samples!')
+                self.assertEqual(stats.bytes, nbytes,
+                                 'Wrong number of bytes!')
+                self.assertEqual(list(stats.stages),
+                                 ['read', 'shift', 'write'], 'Wrong stages!')
+                self.assertTrue(all(ns >= 0 for ns in stats.stages.values()),
+                                'Wrong stage times!')
+                self.assertTrue(str(stats).startswith(
+                    f'{records} records, {samples} samples, '
+                    f'{nbytes / 1e6:.3f} MB in '), 'Wrong report!')
+
+                shifted = abs(recs[0].begin_ns - time.time_ns()) < 60000000000
+                self.assertEqual(shifted, mode == 'realtime',
+                                 'Wrong time shift!')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
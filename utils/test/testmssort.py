@@ -0,0 +1,109 @@
+"""Test for the mssort application."""
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from io import BytesIO
+from seiscomp.mseedlite import Input, MSeedError
+
+# the application is not a module on the path; the worker processes look
+# up its functions by module name
+spec = importlib.util.spec_from_file_location('mssort', '../apps/mssort.py')
+mssort = importlib.util.module_from_spec(spec)
+sys.modules['mssort'] = mssort
+spec.loader.exec_module(mssort)
+
+
+class MSSortTests(unittest.TestCase):
+    """Test the functionality of mssort.py"""
+
+    def setUp(self):
+        with open('waveform.mseed', 'rb') as fin:
+            self.data = fin.read()
+
+        self.raw = [bytes(rec.raw) for rec in Input(BytesIO(self.data))]
+        self.tmpdir = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+
+    def sort(self, raw, **kwargs):
+        """Sort records given as raw bytes; returns the output."""
+        path = os.path.join(self.tmpdir, 'input.mseed')
+        with open(path, 'wb') as fout:
+            fout.write(b''.join(raw))
+
+        runs = os.path.join(self.tmpdir, 'runs')
+        os.mkdir(runs)
+        out = BytesIO()
+        mssort.mssort([path], out, tmpdir=runs, **kwargs)
+        self.assertEqual(os.listdir(runs), [], 'Temporary files left!')
+        os.rmdir(runs)
+        return out.getvalue()
+
+
+    def testSplitRuns(self):
+        """Split a file into runs of bounded size"""
+
+        runs = mssort.split_runs(['waveform.mseed'], 2048)
+        self.assertEqual(len(runs), 5, 'Wrong number of runs!')
+        for (i, (path, offsets)) in enumerate(runs):
+            self.assertEqual(path, 'waveform.mseed', 'Wrong path!')
+            self.assertEqual(list(offsets),
+                             [512 * j for j in range(4 * i, 4 * i + 4)],
+                             'Wrong offsets!')
+
+        runs = mssort.split_runs(['waveform.mseed'], 1 << 20)
+        self.assertEqual(len(runs), 1, 'Wrong number of runs!')
+
+
+    def testSort(self):
+        """Sort in one run and in several runs and merge passes"""
+
+        shuffled = self.raw[1::2] + self.raw[-2::-2]
+        for (run_size, fanin) in ((1 << 20, 64), (2048, 64), (512, 3),
+                                  (1024, 2)):
+            for key in ('stream', 'time'):
+                self.assertEqual(
+                    self.sort(shuffled, key=key, run_size=run_size,
+                              fanin=fanin, workers=2),
+                    self.data, 'Wrong order!')
+
+
+    def testStableOrder(self):
+        """Keep the input order of records with equal keys"""
+
+        # same header as record 3, different data
+        dup = self.raw[3][:-1] + bytes([self.raw[3][-1] ^ 1])
+        for (first, second) in ((dup, self.raw[3]), (self.raw[3], dup)):
+            shuffled = self.raw[10:] + [first] + self.raw[9:3:-1] + \
+                self.raw[2::-1] + [second]
+            expected = self.raw[:3] + [first, second] + self.raw[4:]
+            for (run_size, fanin) in ((1 << 20, 64), (512, 2)):
+                self.assertEqual(
+                    self.sort(shuffled, run_size=run_size, fanin=fanin,
+                              workers=2),
+                    b''.join(expected), 'Wrong order of equal keys!')
+
+
+    def testCleanup(self):
+        """Remove the temporary files on errors"""
+
+        # the last record is truncated
+        with self.assertRaises(MSeedError):
+            self.sort(self.raw[:4] + [self.raw[4][:300]], run_size=512)
+
+        self.assertEqual(os.listdir(os.path.join(self.tmpdir, 'runs')), [],
+                         'Temporary files left!')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""Test for the slserver library."""
+import asyncio
+import unittest
+from xml.etree import ElementTree
+from seiscomp.mseedlite import Input, Record
+from seiscomp.slserver import SeedLinkServer
+
+
+class SeedLinkServerTests(unittest.TestCase):
+    """Test the functionality of slserver.py"""
+
+    def setUp(self):
+        recs = []
+        for name in ('waveform.mseed', 'outputref.mseed'):
+            with open(name, 'rb') as fin:
+                recs.append(list(Input(fin)))
+
+        # interleave the GE.APE and GX.APEX streams
+        self.recs = [rec for pair in zip(*recs) for rec in pair]
+
+
+    def run_session(self, commands, nlines, published, npackets,
+                    dialup=False):
+        """Publish records around a client session.
+
+        Returns the first nlines reply lines and the packets received.
+        """
+
+        async def session():
+            server = SeedLinkServer(host='127.0.0.1', port=0)
+            await server.start()
+            server.publish(published[0])
+
+            (reader, writer) = await asyncio.open_connection('127.0.0.1',
+                                                             server.port)
+            writer.write(''.join(cmd + '\r\n' for cmd in commands)
+                         .encode('ascii'))
+            replies = [await reader.readline() for _ in range(nlines)]
+
+            if not dialup:
+                # wait until the client is streaming
+                while server.clients == 0:
+                    await asyncio.sleep(0.01)
+
+                server.publish(published[1])
+
+            data = await reader.readexactly(npackets * 520)
+            if dialup:
+                replies.append(await reader.readexactly(3))
+
+            writer.close()
+            await server.close()
+            return (replies, data)
+
+        return asyncio.run(session())
+
+
+    def testStations(self):
+        """Negotiate stations and receive new data"""
+
+        (replies, data) = self.run_session(
+            ['HELLO', 'STATION APE GE', 'SELECT BHZ', 'DATA', 'END'], 5,
+            (self.recs[:4], self.recs[4:10]), 3)
+
+        self.assertTrue(replies[0].startswith(b'SeedLink v3.1'),
+                        'Wrong HELLO reply!')
+        self.assertEqual(replies[2:], [b'OK\r\n'] * 3, 'Wrong replies!')
+
+        for i in range(3):
+            packet = data[i * 520:(i + 1) * 520]
+            self.assertEqual(packet[:8], b'SL%06X' % (4 + 2 * i),
+                             'Wrong sequence number!')
+            self.assertEqual(packet[8:], bytes(self.recs[4 + 2 * i].raw),
+                             'Wrong record!')
+
+
+    def testResume(self):
+        """Resume from a sequence number within the buffer"""
+
+        (_, data) = self.run_session(
+            ['STATION APEX GX', 'SELECT !01XHE', 'DATA 000003', 'END'], 3,
+            (self.recs[:6], self.recs[6:8]), 2)
+
+        self.assertEqual(data[:8], b'SL000005', 'Wrong sequence number!')
+        self.assertEqual(data[8:520], bytes(self.recs[5].raw),
+                         'Wrong record!')
+        self.assertEqual(data[520:528], b'SL000007',
+                         'Wrong sequence number!')
+
+
+    def testFetch(self):
+        """Fetch buffered data in uni-station mode"""
+
+        (replies, data) = self.run_session(['SELECT 01???.D', 'FETCH 000001'],
+                                           1, (self.recs[:6], []), 2, True)
+
+        self.assertEqual(data[:8], b'SL000003', 'Wrong sequence number!')
+        self.assertEqual(data[528:], bytes(self.recs[5].raw), 'Wrong record!')
+        self.assertEqual(replies[-1], b'END', 'Transfer not ended!')
+
+
+    def testResumeOldest(self):
+        """Resume at the oldest packet for an unknown sequence number"""
+
+        # the sequence number is ahead of the server, e.g. after a restart
+        (replies, data) = self.run_session(['FETCH 000010'], 0,
+                                           (self.recs[:6], []), 6, True)
+
+        for i in range(6):
+            self.assertEqual(data[i * 520:i * 520 + 8], b'SL%06X' % i,
+                             'Wrong sequence number!')
+
+        self.assertEqual(replies[-1], b'END', 'Transfer not ended!')
+
+
+    def testInfo(self):
+        """Answer INFO and CAPABILITIES"""
+
+        async def session():
+            server = SeedLinkServer(host='127.0.0.1', port=0)
+            await server.start()
+            server.publish(self.recs[:6])
+            (reader, writer) = await asyncio.open_connection('127.0.0.1',
+                                                             server.port)
+            writer.write(b'CAPABILITIES SLPROTO:3.1\r\n')
+            replies = [await reader.readline()]
+            info = {}
+            for level in ('ID', 'STREAMS'):
+                writer.write(b'INFO %s\r\n' % level.encode('ascii'))
+                packets = []
+                while not packets or packets[-1][:8] != b'SLINFO  ':
+                    packets.append(await reader.readexactly(520))
+
+                info[level] = packets
+
+            writer.write(b'INFO GAPS\r\n')
+            replies.append(await reader.readline())
+            writer.close()
+            await server.close()
+            return (replies, info)
+
+        (replies, info) = asyncio.run(session())
+        self.assertEqual(replies, [b'OK\r\n', b'ERROR\r\n'],
+                         'Wrong replies!')
+
+        texts = {}
+        for (level, packets) in info.items():
+            self.assertTrue(all(p[:8] == b'SLINFO *' for p in packets[:-1]),
+                            'Wrong INFO header!')
+            recs = [Record(p[8:]) for p in packets]
+            self.assertEqual({(rec.sta, rec.encoding) for rec in recs},
+                             {('INFO', 0)}, 'Wrong INFO record!')
+            texts[level] = b''.join(p[72:72 + rec.nsamp]
+                                    for (p, rec) in zip(packets, recs))
+
+        root = ElementTree.fromstring(texts['ID'])
+        self.assertEqual(root.get('organization'), 'SeisComP',
+                         'Wrong organization!')
+        self.assertEqual(len(root), 0, 'Stations in INFO ID!')
+
+        root = ElementTree.fromstring(texts['STREAMS'])
+        stations = [(st.get('network'), st.get('name'), st.get('begin_seq'),
+                     st.get('end_seq'), len(st)) for st in root]
+        self.assertEqual(stations, [('GE', 'APE', '000000', '000004', 1),
+                                    ('GX', 'APEX', '000001', '000005', 1)],
+                         'Wrong stations!')
+        for stream in root.iter('stream'):
+            self.assertLess(stream.get('begin_time'), stream.get('end_time'),
+                            'Wrong stream times!')
+
+
+    def testClose(self):
+        """Disconnect clients still negotiating when closing"""
+
+        async def session():
+            server = SeedLinkServer(host='127.0.0.1', port=0)
+            await server.start()
+            (reader, writer) = await asyncio.open_connection('127.0.0.1',
+                                                             server.port)
+            writer.write(b'HELLO\r\nTIME 2024,1,1,0,0,0\r\n')
+            replies = [await reader.readline() for _ in range(3)]
+
+            await asyncio.wait_for(server.close(), 5)
+            rest = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return (replies, rest)
+
+        (replies, rest) = asyncio.run(session())
+        self.assertEqual(replies[2], b'ERROR\r\n', 'TIME not rejected!')
+        self.assertEqual(rest, b'', 'Client not disconnected!')
+
+
+def main():
+    unittest.main()
+
+
+if __name__ == '__main__':
+    main()